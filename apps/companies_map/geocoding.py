@@ -0,0 +1,183 @@
+import hashlib
+import logging
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+
+import requests
+from django.conf import settings
+from django.utils import timezone
+from requests.adapters import HTTPAdapter
+
+from apps.core.ratelimit import get_rate_limiter
+from .models import GeocodeCache
+
+logger = logging.getLogger(__name__)
+
+YANDEX_GEOCODER_URL = "https://geocode-maps.yandex.ru/1.x/"
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+MAX_RETRIES = 3
+RETRY_BASE_DELAY = 0.5
+
+_session = None
+_session_lock = threading.Lock()
+
+
+def get_session():
+    # Одна keep-alive сессия на процесс с пулом соединений под число потоков.
+    global _session
+    with _session_lock:
+        if _session is None:
+            _session = requests.Session()
+            adapter = HTTPAdapter(
+                pool_connections=1, pool_maxsize=settings.GEOCODER_CONCURRENCY
+            )
+            _session.mount("https://", adapter)
+        return _session
+
+
+def normalize_address(address):
+    address = re.sub(r"\s*,\s*", ", ", address.lower())
+    return re.sub(r"\s+", " ", address).strip(" ,")
+
+
+def address_hash(address):
+    return hashlib.sha256(normalize_address(address).encode("utf-8")).hexdigest()
+
+
+class YandexGeocoder:
+    def __init__(self, api_key):
+        self.api_key = api_key
+        self.session = get_session()
+        self.limiter = get_rate_limiter("yandex-geocoder", settings.GEOCODER_RATE_LIMIT)
+
+    def geocode(self, address):
+        geo_data = self._request(address)
+
+        feature_member = geo_data["response"]["GeoObjectCollection"]["featureMember"]
+        if not feature_member:
+            return None
+
+        point = feature_member[0]["GeoObject"]["Point"]["pos"]
+        lon, lat = point.split(" ")
+        return float(lat), float(lon)
+
+    def _request(self, address):
+        for attempt in range(MAX_RETRIES + 1):
+            self.limiter.acquire()
+            try:
+                response = self.session.get(
+                    YANDEX_GEOCODER_URL,
+                    params={
+                        "apikey": self.api_key,
+                        "geocode": address,
+                        "format": "json",
+                        "results": 1,
+                    },
+                    timeout=5,
+                )
+            except (requests.ConnectionError, requests.Timeout):
+                if attempt == MAX_RETRIES:
+                    raise
+                time.sleep(RETRY_BASE_DELAY * 2**attempt)
+                continue
+
+            if response.status_code in RETRY_STATUSES and attempt < MAX_RETRIES:
+                delay = RETRY_BASE_DELAY * 2**attempt
+                retry_after = response.headers.get("Retry-After", "")
+                if retry_after.isdigit():
+                    delay = max(delay, int(retry_after))
+                logger.warning(
+                    f"Геокодер вернул {response.status_code}, повтор через {delay} с"
+                )
+                time.sleep(delay)
+                continue
+
+            response.raise_for_status()
+            return response.json()
+
+
+class CachedGeocoder:
+    def __init__(self, geocoder):
+        self.geocoder = geocoder
+
+    def resolve(self, addresses):
+        # Возвращает {адрес: (lat, lon) или None}. Геокодер вызывается только для
+        # новых адресов и записей с истекшим сроком; при ошибке геокодера
+        # используется устаревшая запись, если она есть.
+        hashes = {address: address_hash(address) for address in set(addresses)}
+        cached = {
+            entry.address_hash: entry
+            for entry in GeocodeCache.objects.filter(address_hash__in=hashes.values())
+        }
+
+        now = timezone.now()
+        results = {}
+        to_resolve = []
+        for address, key in hashes.items():
+            entry = cached.get(key)
+            if entry and not self._is_expired(entry, now):
+                results[address] = (entry.lat, entry.lon) if entry.found else None
+            else:
+                to_resolve.append(address)
+
+        if not to_resolve:
+            return results
+
+        logger.info(f"Геокодирование {len(to_resolve)} новых или устаревших адресов")
+
+        # Промахи геокодируются параллельно; потоки не обращаются к БД,
+        # а map сохраняет исходный порядок адресов.
+        workers = min(settings.GEOCODER_CONCURRENCY, len(to_resolve))
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            outcomes = list(executor.map(self._geocode_safe, to_resolve))
+
+        now = timezone.now()
+        entries = []
+        for address, (ok, point) in zip(to_resolve, outcomes):
+            key = hashes[address]
+            if not ok:
+                entry = cached.get(key)
+                if entry and entry.found:
+                    results[address] = (entry.lat, entry.lon)
+                continue
+
+            results[address] = point
+            entries.append(
+                GeocodeCache(
+                    address_hash=key,
+                    address=address,
+                    lat=point[0] if point else None,
+                    lon=point[1] if point else None,
+                    found=point is not None,
+                    resolved_at=now,
+                )
+            )
+
+        GeocodeCache.objects.bulk_create(
+            entries,
+            batch_size=500,
+            update_conflicts=True,
+            unique_fields=["address_hash"],
+            update_fields=["address", "lat", "lon", "found", "resolved_at"],
+        )
+        return results
+
+    def _geocode_safe(self, address):
+        try:
+            point = self.geocoder.geocode(address)
+        except Exception as e:
+            logger.error(f"Ошибка геокодирования для адреса '{address}': {e}")
+            return False, None
+        if point is None:
+            logger.warning(f"Не удалось геокодировать адрес: {address}")
+        return True, point
+
+    def _is_expired(self, entry, now):
+        if entry.found:
+            ttl = timedelta(days=settings.GEOCODE_CACHE_TTL_DAYS)
+        else:
+            ttl = timedelta(hours=settings.GEOCODE_NEGATIVE_TTL_HOURS)
+        return now - entry.resolved_at > ttl
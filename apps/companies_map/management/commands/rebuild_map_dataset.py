@@ -0,0 +1,33 @@
+from django.core.management.base import BaseCommand
+
+from apps.companies_map.services import MapDatasetService
+from apps.core.bitrix import get_webhook_token
+
+
+class Command(BaseCommand):
+    help = "Пересобирает набор геокодированных точек для карты компаний"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--member-id",
+            type=str,
+            help="member_id портала (по умолчанию BITRIX_MEMBER_ID или портал, установивший приложение, с доменом webhook)",
+        )
+
+    def handle(self, *args, **options):
+        try:
+            token = get_webhook_token(options.get("member_id"))
+        except ValueError as e:
+            self.stdout.write(self.style.ERROR(str(e)))
+            return
+
+        service = MapDatasetService(token, member_id=options.get("member_id"))
+        self.stdout.write(f"Сборка точек карты портала {service.member_id}...")
+
+        try:
+            points_count = service.rebuild()
+        except ValueError as e:
+            self.stdout.write(self.style.ERROR(str(e)))
+            return
+
+        self.stdout.write(self.style.SUCCESS(f"Готово! Точек на карте: {points_count}"))
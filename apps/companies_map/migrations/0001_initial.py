@@ -0,0 +1,36 @@
+# Generated by Django 4.2 on 2026-10-18 11:53
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    initial = True
+
+    dependencies = []
+
+    operations = [
+        migrations.CreateModel(
+            name="GeocodeCache",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("address_hash", models.CharField(max_length=64, unique=True)),
+                ("address", models.TextField()),
+                ("lat", models.FloatField(blank=True, null=True)),
+                ("lon", models.FloatField(blank=True, null=True)),
+                ("found", models.BooleanField(default=False)),
+                ("resolved_at", models.DateTimeField(db_index=True)),
+            ],
+            options={
+                "verbose_name": "Геокод адреса",
+                "verbose_name_plural": "Кеш геокодера",
+            },
+        ),
+    ]
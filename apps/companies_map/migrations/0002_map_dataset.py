@@ -0,0 +1,64 @@
+# Generated by Django 4.2 on 2026-10-18 11:55
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("companies_map", "0001_initial"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="MapDataset",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("member_id", models.CharField(max_length=50, unique=True)),
+                ("version", models.CharField(max_length=32)),
+                ("points_count", models.PositiveIntegerField(default=0)),
+                ("built_at", models.DateTimeField()),
+            ],
+            options={
+                "verbose_name": "Набор данных карты",
+                "verbose_name_plural": "Наборы данных карты",
+            },
+        ),
+        migrations.CreateModel(
+            name="MapPoint",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("member_id", models.CharField(max_length=50)),
+                ("company_id", models.CharField(max_length=20)),
+                ("title", models.CharField(max_length=255)),
+                ("address", models.TextField()),
+                ("lat", models.FloatField()),
+                ("lon", models.FloatField()),
+            ],
+            options={
+                "verbose_name": "Точка на карте",
+                "verbose_name_plural": "Точки на карте",
+            },
+        ),
+        migrations.AddIndex(
+            model_name="mappoint",
+            index=models.Index(
+                fields=["member_id", "lat", "lon"], name="companies_map_point_bbox_idx"
+            ),
+        ),
+    ]
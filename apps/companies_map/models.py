@@ -1 +1,52 @@
-# Create your models here.
+from django.db import models
+
+
+class GeocodeCache(models.Model):
+    address_hash = models.CharField(max_length=64, unique=True)
+    address = models.TextField()
+    lat = models.FloatField(null=True, blank=True)
+    lon = models.FloatField(null=True, blank=True)
+    found = models.BooleanField(default=False)
+    resolved_at = models.DateTimeField(db_index=True)
+
+    class Meta:
+        verbose_name = "Геокод адреса"
+        verbose_name_plural = "Кеш геокодера"
+
+    def __str__(self):
+        return self.address
+
+
+class MapDataset(models.Model):
+    member_id = models.CharField(max_length=50, unique=True)
+    version = models.CharField(max_length=32)
+    points_count = models.PositiveIntegerField(default=0)
+    built_at = models.DateTimeField()
+
+    class Meta:
+        verbose_name = "Набор данных карты"
+        verbose_name_plural = "Наборы данных карты"
+
+    def __str__(self):
+        return f"Map dataset for {self.member_id}"
+
+
+class MapPoint(models.Model):
+    member_id = models.CharField(max_length=50)
+    company_id = models.CharField(max_length=20)
+    title = models.CharField(max_length=255)
+    address = models.TextField()
+    lat = models.FloatField()
+    lon = models.FloatField()
+
+    class Meta:
+        verbose_name = "Точка на карте"
+        verbose_name_plural = "Точки на карте"
+        indexes = [
+            models.Index(
+                fields=["member_id", "lat", "lon"], name="companies_map_point_bbox_idx"
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.title} ({self.lat}, {self.lon})"
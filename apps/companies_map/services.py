@@ -1,84 +1,91 @@
 import logging
 import os
-import requests
+import uuid
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Avg, Count, FloatField, Max, Min
+from django.db.models.functions import Cast, Floor
+from django.utils import timezone
+
+from apps.core.background import run_in_background
+from apps.core.batch import iter_list_pages
+from apps.core.bitrix import get_member_id
+from apps.core.companies import CompanyDirectoryService
+from .geocoding import CachedGeocoder, YandexGeocoder
+from .models import MapDataset, MapPoint
 
 logger = logging.getLogger(__name__)
 
+GEOCODE_CHUNK_SIZE = 1000
+POINTS_BATCH_SIZE = 1000
+# Ячейка кластера: 1/CLUSTER_GRID тайла текущего масштаба (~64px при тайле 256px).
+CLUSTER_GRID = 4
+CLUSTER_MAX_ZOOM = 16
+
+
+def get_yandex_api_key():
+    yandex_api_key = os.getenv("YANDEX_API_KEY")
+    if not yandex_api_key:
+        raise ValueError("API-ключ для Яндекс.Карт не найден. Добавьте YANDEX_API_KEY в .env файл.")
+    return yandex_api_key
+
+
 class CompaniesMapService:
     def __init__(self, bitrix_user_token):
         self.but = bitrix_user_token
 
-    def get_companies_data(self):
-        yandex_api_key = os.getenv("YANDEX_API_KEY")
-        if not yandex_api_key:
-            raise ValueError("API-ключ для Яндекс.Карт не найден. Добавьте YANDEX_API_KEY в .env файл.")
-
-        methods = [
-            ("companies", "crm.company.list", {"select": ["ID", "TITLE"]}),
-            ("addresses", "crm.address.list", {"filter": {"ENTITY_TYPE_ID": 4}}),
-        ]
-        batch_result = self.but.batch_api_call(methods=methods)
-
-        batch_successes = batch_result.successes
-        companies_result = batch_successes.get("companies", {}).get("result", [])
-        addresses_result = batch_successes.get("addresses", {}).get("result", [])
+    def iter_company_points(self, geocoder):
+        companies = CompanyDirectoryService(self.but)
+        logger.info(f"Получено {len(companies.ensure_complete())} компаний из Bitrix24.")
 
-        logger.info(
-            f"Получено {len(companies_result)} компаний и {len(addresses_result)} адресов из Bitrix24."
+        addresses = iter_list_pages(
+            self.but,
+            "crm.address.list",
+            {"filter": {"ENTITY_TYPE_ID": 4}, "order": {"ENTITY_ID": "ASC"}},
         )
 
-        companies_by_id = {str(c["ID"]): c for c in companies_result}
-
-        companies_data = []
-        for address_data in addresses_result:
+        # Адреса соединяются с компаниями по мере загрузки страниц и
+        # геокодируются порциями, без промежуточного полного списка.
+        located = []
+        addresses_count = 0
+        for address_data in addresses:
+            addresses_count += 1
             company_id = str(address_data.get("ENTITY_ID"))
-            company = companies_by_id.get(company_id)
-
-            if not company:
+            title = companies.get_title(company_id)
+            if title is None:
                 continue
 
             full_address = self._format_address(address_data)
             if not full_address:
                 continue
 
-            try:
-                response = requests.get(
-                    "https://geocode-maps.yandex.ru/1.x/",
-                    params={
-                        "apikey": yandex_api_key,
-                        "geocode": full_address,
-                        "format": "json",
-                        "results": 1,
-                    },
-                    timeout=5,
-                )
-                response.raise_for_status()
-                geo_data = response.json()
+            located.append((company_id, title, full_address))
+            if len(located) >= GEOCODE_CHUNK_SIZE:
+                yield from self._locate(geocoder, located)
+                located = []
 
-                feature_member = geo_data["response"]["GeoObjectCollection"][
-                    "featureMember"
-                ]
-                if not feature_member:
-                    logger.warning(f"Не удалось геокодировать адрес: {full_address}")
-                    continue
+        if located:
+            yield from self._locate(geocoder, located)
 
-                point = feature_member[0]["GeoObject"]["Point"]["pos"]
-                lon, lat = point.split(" ")
+        logger.info(f"Обработано {addresses_count} адресов компаний.")
 
-                companies_data.append(
-                    {
-                        "id": company["ID"],
-                        "title": company["TITLE"],
-                        "address": full_address,
-                        "lat": float(lat),
-                        "lon": float(lon),
-                    }
-                )
+    def _locate(self, geocoder, located):
+        points = geocoder.resolve([full_address for _, _, full_address in located])
+        for company_id, title, full_address in located:
+            point = points.get(full_address)
+            if not point:
+                continue
 
-            except Exception as e:
-                logger.error(f"Ошибка геокодирования для адреса '{full_address}': {e}")
-        
-        return companies_data, yandex_api_key
+            lat, lon = point
+            yield {
+                "id": company_id,
+                "title": title,
+                "address": full_address,
+                "lat": lat,
+                "lon": lon,
+            }
 
     def _format_address(self, address_data):
         parts = [
@@ -89,3 +96,119 @@ class CompaniesMapService:
             address_data.get("ADDRESS_2"),
         ]
         return ", ".join(filter(None, parts))
+
+
+class MapDatasetService:
+    def __init__(self, bitrix_token, member_id=None):
+        self.but = bitrix_token
+        self.member_id = member_id or get_member_id(bitrix_token)
+
+    def get_dataset(self):
+        return MapDataset.objects.filter(member_id=self.member_id).first()
+
+    def is_stale(self, dataset):
+        if dataset is None:
+            return True
+        max_age = timedelta(seconds=settings.MAP_DATASET_MAX_AGE)
+        return timezone.now() - dataset.built_at > max_age
+
+    def rebuild_in_background(self):
+        return run_in_background(f"map-dataset:{self.member_id}", self.rebuild)
+
+    def rebuild(self):
+        geocoder = CachedGeocoder(YandexGeocoder(get_yandex_api_key()))
+        points = CompaniesMapService(self.but).iter_company_points(geocoder)
+
+        # Точки собираются до транзакции, чтобы не держать ее открытой на время
+        # запросов к Bitrix24 и геокодеру.
+        new_points = [
+            MapPoint(
+                member_id=self.member_id,
+                company_id=str(point["id"]),
+                title=point["title"][:255],
+                address=point["address"],
+                lat=point["lat"],
+                lon=point["lon"],
+            )
+            for point in points
+        ]
+
+        with transaction.atomic():
+            MapPoint.objects.filter(member_id=self.member_id).delete()
+            MapPoint.objects.bulk_create(new_points, batch_size=POINTS_BATCH_SIZE)
+            MapDataset.objects.update_or_create(
+                member_id=self.member_id,
+                defaults={
+                    "version": uuid.uuid4().hex,
+                    "points_count": len(new_points),
+                    "built_at": timezone.now(),
+                },
+            )
+
+        logger.info(f"Набор данных карты пересобран: {len(new_points)} точек")
+        return len(new_points)
+
+    def get_bounds(self):
+        bounds = MapPoint.objects.filter(member_id=self.member_id).aggregate(
+            south=Min("lat"), west=Min("lon"), north=Max("lat"), east=Max("lon")
+        )
+        if bounds["south"] is None:
+            return None
+        return [[bounds["south"], bounds["west"]], [bounds["north"], bounds["east"]]]
+
+    def get_features(self, south, west, north, east, zoom):
+        points = MapPoint.objects.filter(
+            member_id=self.member_id,
+            lat__gte=south,
+            lat__lte=north,
+            lon__gte=west,
+            lon__lte=east,
+        )
+
+        if zoom >= CLUSTER_MAX_ZOOM:
+            return [
+                self._point_feature(p["lat"], p["lon"], p["company_id"], p["title"], p["address"])
+                for p in points.values("lat", "lon", "company_id", "title", "address")
+            ]
+
+        # Сетка кластеризации считается в БД: одна строка на ячейку.
+        cell = 360.0 / (2**zoom) / CLUSTER_GRID
+        cells = (
+            points.annotate(
+                cell_x=Floor(Cast("lon", FloatField()) / cell),
+                cell_y=Floor(Cast("lat", FloatField()) / cell),
+            )
+            .values("cell_x", "cell_y")
+            .annotate(
+                count=Count("pk"),
+                lat_avg=Avg("lat"),
+                lon_avg=Avg("lon"),
+                company_id=Max("company_id"),
+                title=Max("title"),
+                address=Max("address"),
+            )
+            .order_by()
+        )
+
+        features = []
+        for c in cells:
+            if c["count"] == 1:
+                features.append(
+                    self._point_feature(c["lat_avg"], c["lon_avg"], c["company_id"], c["title"], c["address"])
+                )
+            else:
+                features.append(
+                    {
+                        "type": "Feature",
+                        "geometry": {"type": "Point", "coordinates": [c["lon_avg"], c["lat_avg"]]},
+                        "properties": {"cluster": True, "count": c["count"]},
+                    }
+                )
+        return features
+
+    def _point_feature(self, lat, lon, company_id, title, address):
+        return {
+            "type": "Feature",
+            "geometry": {"type": "Point", "coordinates": [lon, lat]},
+            "properties": {"id": company_id, "title": title, "address": address},
+        }
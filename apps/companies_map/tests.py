@@ -1 +1,112 @@
-# Create your tests here.
+from datetime import timedelta
+
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.utils import timezone
+
+from .geocoding import CachedGeocoder, address_hash, normalize_address
+from .models import GeocodeCache, MapPoint
+from .services import CLUSTER_MAX_ZOOM, MapDatasetService
+
+
+class FakeGeocoder:
+    def __init__(self, points=None, error=None):
+        self.points = points or {}
+        self.error = error
+        self.calls = []
+
+    def geocode(self, address):
+        self.calls.append(address)
+        if self.error:
+            raise self.error
+        return self.points.get(address)
+
+
+class NormalizeAddressTests(SimpleTestCase):
+    def test_spacing_and_case_do_not_change_hash(self):
+        self.assertEqual(normalize_address("  Москва ,ул. Ленина,  1 "), "москва, ул. ленина, 1")
+        self.assertEqual(address_hash("Москва, ул. Ленина, 1"), address_hash("москва ,ул.  ленина,1,"))
+
+
+@override_settings(GEOCODE_CACHE_TTL_DAYS=90, GEOCODE_NEGATIVE_TTL_HOURS=24, GEOCODER_CONCURRENCY=2)
+class CachedGeocoderTests(TestCase):
+    def cache_entry(self, address, point, age):
+        GeocodeCache.objects.create(
+            address_hash=address_hash(address),
+            address=address,
+            lat=point[0] if point else None,
+            lon=point[1] if point else None,
+            found=point is not None,
+            resolved_at=timezone.now() - age,
+        )
+
+    def test_geocodes_only_misses_and_stores_them(self):
+        self.cache_entry("Москва", (55.75, 37.62), timedelta(days=1))
+        geocoder = FakeGeocoder({"Казань": (55.79, 49.12)})
+
+        results = CachedGeocoder(geocoder).resolve(["Москва", "Казань", "Нигде", "Казань"])
+
+        self.assertEqual(sorted(geocoder.calls), ["Казань", "Нигде"])
+        self.assertEqual(results, {"Москва": (55.75, 37.62), "Казань": (55.79, 49.12), "Нигде": None})
+        self.assertFalse(GeocodeCache.objects.get(address_hash=address_hash("Нигде")).found)
+
+        geocoder.calls = []
+        CachedGeocoder(geocoder).resolve(["Казань", "Нигде"])
+        self.assertEqual(geocoder.calls, [])
+
+    def test_expired_entries_are_refreshed(self):
+        self.cache_entry("Москва", (55.0, 37.0), timedelta(days=91))
+        self.cache_entry("Нигде", None, timedelta(hours=25))
+        geocoder = FakeGeocoder({"Москва": (55.75, 37.62)})
+
+        results = CachedGeocoder(geocoder).resolve(["Москва", "Нигде"])
+
+        self.assertEqual(sorted(geocoder.calls), ["Москва", "Нигде"])
+        self.assertEqual(results["Москва"], (55.75, 37.62))
+
+    def test_geocoder_error_falls_back_to_stale_entry(self):
+        self.cache_entry("Москва", (55.0, 37.0), timedelta(days=91))
+        geocoder = FakeGeocoder(error=ConnectionError("timeout"))
+
+        with self.assertLogs("apps.companies_map.geocoding", "ERROR"):
+            results = CachedGeocoder(geocoder).resolve(["Москва", "Казань"])
+
+        self.assertEqual(results, {"Москва": (55.0, 37.0)})
+        self.assertFalse(GeocodeCache.objects.filter(address_hash=address_hash("Казань")).exists())
+
+
+class MapFeaturesTests(TestCase):
+    def setUp(self):
+        self.service = MapDatasetService(None, member_id="test-map")
+        for company_id, lat, lon in (("1", 55.751, 37.617), ("2", 55.752, 37.618), ("3", 59.93, 30.33)):
+            MapPoint.objects.create(
+                member_id="test-map",
+                company_id=company_id,
+                title=f"Компания {company_id}",
+                address="адрес",
+                lat=lat,
+                lon=lon,
+            )
+        MapPoint.objects.create(
+            member_id="other", company_id="9", title="Чужая", address="адрес", lat=55.75, lon=37.61
+        )
+
+    def test_nearby_points_are_clustered(self):
+        features = self.service.get_features(50, 25, 65, 45, zoom=5)
+        clusters = [f for f in features if f["properties"].get("cluster")]
+        points = [f for f in features if not f["properties"].get("cluster")]
+
+        self.assertEqual([c["properties"]["count"] for c in clusters], [2])
+        self.assertEqual([p["properties"]["id"] for p in points], ["3"])
+        self.assertEqual(points[0]["geometry"]["coordinates"], [30.33, 59.93])
+
+    def test_max_zoom_returns_single_points(self):
+        features = self.service.get_features(50, 25, 65, 45, zoom=CLUSTER_MAX_ZOOM)
+        self.assertEqual(sorted(f["properties"]["id"] for f in features), ["1", "2", "3"])
+
+    def test_bounding_box_filters_points(self):
+        features = self.service.get_features(59, 30, 60, 31, zoom=CLUSTER_MAX_ZOOM)
+        self.assertEqual([f["properties"]["id"] for f in features], ["3"])
+
+    def test_bounds(self):
+        self.assertEqual(self.service.get_bounds(), [[55.751, 30.33], [59.93, 37.618]])
+        self.assertIsNone(MapDatasetService(None, member_id="empty").get_bounds())
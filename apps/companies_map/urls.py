@@ -6,4 +6,5 @@ app_name = "companies_map"
 
 urlpatterns = [
     path("", views.index, name="index"),
+    path("points/", views.points, name="points"),
 ]
@@ -1,26 +1,76 @@
 import json
 import logging
 
+from django.http import HttpResponse, HttpResponseNotModified, JsonResponse
 from django.shortcuts import render
+from django.views.decorators.gzip import gzip_page
 
 from apps.core.decorators import smart_auth
-from .services import CompaniesMapService
+from apps.core.http import etag_matches
+from .services import MapDatasetService, get_yandex_api_key
 
 logger = logging.getLogger(__name__)
 
+MAX_ZOOM = 21
+
 
 @smart_auth
 def index(request):
     try:
-        service = CompaniesMapService(request.bitrix_user_token)
-        companies_data, yandex_api_key = service.get_companies_data()
+        yandex_api_key = get_yandex_api_key()
+        service = MapDatasetService(request.bitrix_user_token)
+
+        # Страница не ждет геокодирования: набор точек пересобирается в фоне,
+        # а карта подгружает точки видимой области отдельными запросами.
+        dataset = service.get_dataset()
+        if service.is_stale(dataset):
+            service.rebuild_in_background()
 
         context = {
             "yandex_api_key": yandex_api_key,
-            "companies_json": json.dumps(companies_data),
+            "bounds_json": json.dumps(service.get_bounds() if dataset else None),
+            "building": dataset is None,
         }
         return render(request, "companies_map/index.html", context)
 
     except Exception as e:
         logger.error(f"Ошибка при получении данных для карты: {e}")
         return render(request, "companies_map/index.html", {"error": str(e)})
+
+
+@gzip_page
+@smart_auth
+def points(request):
+    try:
+        south, west, north, east = [float(v) for v in request.GET.get("bbox", "").split(",")]
+        zoom = min(max(int(request.GET.get("zoom", "")), 0), MAX_ZOOM)
+    except ValueError:
+        return JsonResponse(
+            {"error": "Параметры bbox=юг,запад,север,восток и zoom обязательны"}, status=400
+        )
+
+    try:
+        service = MapDatasetService(request.bitrix_user_token)
+        dataset = service.get_dataset()
+        if dataset is None:
+            return JsonResponse({"type": "FeatureCollection", "features": [], "building": True})
+
+        # Без запятых: If-None-Match — список тегов через запятую.
+        etag = f'"{dataset.version}:{south}_{west}_{north}_{east}:{zoom}"'
+        if etag_matches(request, etag):
+            return HttpResponseNotModified(headers={"ETag": etag})
+
+        data = {
+            "type": "FeatureCollection",
+            "features": service.get_features(south, west, north, east, zoom),
+        }
+        response = HttpResponse(
+            json.dumps(data, ensure_ascii=False), content_type="application/json"
+        )
+        response["ETag"] = etag
+        response["Cache-Control"] = "private, no-cache"
+        return response
+
+    except Exception as e:
+        logger.error(f"Ошибка получения точек карты: {e}")
+        return JsonResponse({"error": str(e)}, status=500)
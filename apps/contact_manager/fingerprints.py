@@ -0,0 +1,169 @@
+import logging
+import re
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from apps.core.bitrix import get_member_id
+from .models import ContactFingerprint, ContactIndexState
+
+logger = logging.getLogger(__name__)
+
+PAGE_SIZE = 50
+WATERMARK_OVERLAP = timedelta(minutes=5)
+
+
+def normalize_phone(value):
+    # Приведение к E.164 без внешних библиотек: 8XXXXXXXXXX и номера без кода
+    # страны считаются номерами страны PHONE_DEFAULT_COUNTRY_CODE.
+    raw = str(value or "").strip()
+    digits = re.sub(r"\D", "", raw)
+    if not digits:
+        return ""
+    if raw.startswith("+"):
+        return f"+{digits}"
+    if digits.startswith("00"):
+        return f"+{digits[2:]}"
+
+    country_code = settings.PHONE_DEFAULT_COUNTRY_CODE
+    if country_code == "7" and len(digits) == 11 and digits[0] == "8":
+        digits = "7" + digits[1:]
+    elif len(digits) == 10:
+        digits = country_code + digits
+    return f"+{digits}"
+
+
+def normalize_email(value):
+    return str(value or "").strip().lower()
+
+
+def contact_fingerprints(data):
+    fingerprints = set()
+    for phone in data.get("PHONE") or []:
+        value = normalize_phone(phone.get("VALUE"))
+        if value:
+            fingerprints.add((ContactFingerprint.KIND_PHONE, value))
+    for email in data.get("EMAIL") or []:
+        value = normalize_email(email.get("VALUE"))
+        if value:
+            fingerprints.add((ContactFingerprint.KIND_EMAIL, value))
+    return fingerprints
+
+
+class ContactFingerprintService:
+    def __init__(self, bitrix_token, member_id=None):
+        self.but = bitrix_token
+        self.member_id = member_id or get_member_id(bitrix_token)
+
+    def get_state(self):
+        state, _ = ContactIndexState.objects.get_or_create(member_id=self.member_id)
+        return state
+
+    def ensure_synced(self):
+        # Первый импорт портала строит индекс полностью, следующие догружают
+        # только контакты, измененные после прошлой синхронизации.
+        state = self.get_state()
+        return self.sync(full=state.last_full_sync_at is None)
+
+    def sync(self, full=False):
+        state = self.get_state()
+        watermark = None if full else state.last_date_modify
+        started_at = timezone.now()
+        max_date_modify = watermark
+        last_id = 0
+        synced = 0
+
+        while True:
+            contact_filter = {">ID": last_id}
+            if watermark:
+                contact_filter[">=DATE_MODIFY"] = watermark.isoformat()
+
+            response = self.but.call_api_method(
+                "crm.contact.list",
+                {
+                    "order": {"ID": "ASC"},
+                    "filter": contact_filter,
+                    "select": ["ID", "PHONE", "EMAIL", "DATE_MODIFY"],
+                    "start": -1,
+                },
+            )
+            page = response.get("result") or []
+            if not page:
+                break
+
+            self._replace(
+                [(int(contact["ID"]), contact_fingerprints(contact)) for contact in page]
+            )
+
+            synced += len(page)
+            last_id = max(int(contact["ID"]) for contact in page)
+            for contact in page:
+                date_modify = parse_datetime(contact.get("DATE_MODIFY") or "")
+                if date_modify and (max_date_modify is None or date_modify > max_date_modify):
+                    max_date_modify = date_modify
+
+            if len(page) < PAGE_SIZE:
+                break
+
+        if full:
+            # Удаленные контакты не попадают в выборку по DATE_MODIFY,
+            # поэтому их отпечатки чистятся только при полной синхронизации.
+            ContactFingerprint.objects.filter(
+                member_id=self.member_id, synced_at__lt=started_at
+            ).delete()
+            state.last_full_sync_at = started_at
+
+        if max_date_modify:
+            state.last_date_modify = min(max_date_modify, started_at - WATERMARK_OVERLAP)
+        state.last_synced_at = started_at
+        state.save()
+
+        logger.info(f"Индекс контактов обновлен: {synced} контактов (портал {self.member_id})")
+        return synced
+
+    def add_contacts(self, contacts):
+        self._replace(
+            [(int(contact_id), contact_fingerprints(fields)) for contact_id, fields in contacts],
+            delete=False,
+        )
+
+    def find(self, fingerprints):
+        # Поиск по уникальному индексу (member_id, kind, value): один запрос
+        # на порцию строк вместо выгрузки всех контактов портала.
+        if not fingerprints:
+            return {}
+        query = Q()
+        for kind in (ContactFingerprint.KIND_PHONE, ContactFingerprint.KIND_EMAIL):
+            values = [value for k, value in fingerprints if k == kind]
+            if values:
+                query |= Q(kind=kind, value__in=values)
+        matches = ContactFingerprint.objects.filter(query, member_id=self.member_id)
+        return {
+            (kind, value): contact_id
+            for kind, value, contact_id in matches.values_list("kind", "value", "contact_id")
+        }
+
+    def _replace(self, contacts, delete=True):
+        now = timezone.now()
+        fingerprints = [
+            ContactFingerprint(
+                member_id=self.member_id,
+                kind=kind,
+                value=value[:255],
+                contact_id=contact_id,
+                synced_at=now,
+            )
+            for contact_id, values in contacts
+            for kind, value in values
+        ]
+        with transaction.atomic():
+            if delete:
+                ContactFingerprint.objects.filter(
+                    member_id=self.member_id,
+                    contact_id__in=[contact_id for contact_id, _ in contacts],
+                ).delete()
+            ContactFingerprint.objects.bulk_create(fingerprints, ignore_conflicts=True)
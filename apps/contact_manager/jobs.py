@@ -0,0 +1,184 @@
+import itertools
+import logging
+import threading
+from contextlib import contextmanager
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from apps.core.background import run_in_background
+from apps.core.batch import BATCH_SIZE, chunked_iter, run_batches
+from apps.core.bitrix import get_member_id
+from .models import ContactImportJob
+from .services import ContactImportService
+
+logger = logging.getLogger(__name__)
+
+MAX_REPORT_DETAILS = 500
+STALE_JOB_TIMEOUT = timedelta(minutes=5)
+HEARTBEAT_INTERVAL = timedelta(minutes=1)
+
+
+class ContactImportJobService:
+    def __init__(self, bitrix_token, member_id=None):
+        self.but = bitrix_token
+        self.member_id = member_id or get_member_id(bitrix_token)
+
+    def create_job(self, file, user_id):
+        if not file.name.endswith((".csv", ".xlsx")):
+            raise ValueError("Неподдерживаемый формат файла. Пожалуйста, используйте CSV или XLSX.")
+        return ContactImportJob.objects.create(
+            member_id=self.member_id,
+            user_id=str(user_id),
+            file=file,
+            file_name=file.name,
+        )
+
+    def get_job(self, job_id):
+        return ContactImportJob.objects.filter(member_id=self.member_id, pk=job_id).first()
+
+    def process_in_background(self, job):
+        return run_in_background(f"contact-import:{job.pk}", self.process, job.pk)
+
+    def resume(self):
+        # Задачи, прерванные перезапуском процесса, продолжаются с последней
+        # сохраненной позиции.
+        processed = 0
+        while True:
+            job = self._claim()
+            if job is None:
+                break
+            self._run(job)
+            processed += 1
+        return processed
+
+    def process(self, job_id):
+        job = self._claim(job_id)
+        if job is None:
+            logger.info(f"Импорт {job_id} уже обрабатывается или завершен")
+            return None
+        return self._run(job)
+
+    def _claim(self, job_id=None):
+        # Задача «арендуется» обновлением updated_at: пока обработчик сохраняет
+        # прогресс, другой процесс ее не возьмет.
+        with transaction.atomic():
+            jobs = ContactImportJob.objects.select_for_update(skip_locked=True).filter(
+                Q(status=ContactImportJob.STATUS_PENDING)
+                | Q(
+                    status=ContactImportJob.STATUS_RUNNING,
+                    updated_at__lt=timezone.now() - STALE_JOB_TIMEOUT,
+                ),
+                member_id=self.member_id,
+            )
+            if job_id is not None:
+                jobs = jobs.filter(pk=job_id)
+            job = jobs.order_by("created_at").first()
+            if job is not None:
+                job.status = ContactImportJob.STATUS_RUNNING
+                job.save(update_fields=["status", "updated_at"])
+        return job
+
+    def _run(self, job):
+        try:
+            self._process(job)
+            job.status = ContactImportJob.STATUS_DONE
+        except Exception as e:
+            logger.error(f"Ошибка импорта контактов {job.pk}: {e}")
+            job.status = ContactImportJob.STATUS_FAILED
+            job.error = f"Произошла ошибка при обработке файла: {e}"
+
+        job.finished_at = timezone.now()
+        if job.file:
+            job.file.delete(save=False)
+        job.save()
+        logger.info(
+            f"Импорт {job.pk}: создано {job.success_count}, пропущено {job.skipped_count}, ошибок {job.error_count}"
+        )
+        return job
+
+    def _process(self, job):
+        service = ContactImportService(self.but, job.user_id, member_id=self.member_id)
+        with job.file.open("rb") as file:
+            header, rows = service.parse_file(file)
+            service.validate_headers(header)
+
+            # Первая синхронизация индекса и справочника компаний может идти
+            # дольше STALE_JOB_TIMEOUT: аренда продлевается, чтобы задачу не
+            # взял другой процесс.
+            with self._heartbeat(job):
+                service.fingerprints.ensure_synced()
+                service.companies.ensure_complete()
+
+            # Строки читаются из файла лениво порциями по 50 строк на каждый
+            # параллельный batch-запрос (одна команда на строку), после каждой
+            # порции прогресс сохраняется. При возобновлении уже обработанные
+            # строки пропускаются.
+            chunk_size = BATCH_SIZE * settings.BITRIX_BATCH_CONCURRENCY
+            rows = itertools.islice(rows, job.processed_rows, None)
+            for chunk in chunked_iter(rows, chunk_size):
+                start = job.processed_rows
+                batch_cmds, skipped_details = service.prepare_batch_commands(
+                    chunk, start=start
+                )
+                success_details, error_details = [], []
+                if batch_cmds:
+                    result = run_batches(self.but, batch_cmds, member_id=self.member_id)
+                    success_details, error_details = service.process_batch_results(result, batch_cmds)
+
+                job.processed_rows = start + len(chunk)
+                self._add_details(job, success_details, skipped_details, error_details)
+                job.save()
+
+        job.total_rows = job.processed_rows
+
+    @contextmanager
+    def _heartbeat(self, job):
+        stop = threading.Event()
+
+        def renew():
+            try:
+                while not stop.wait(HEARTBEAT_INTERVAL.total_seconds()):
+                    ContactImportJob.objects.filter(pk=job.pk).update(updated_at=timezone.now())
+            finally:
+                connection.close()
+
+        thread = threading.Thread(target=renew, name=f"contact-import-heartbeat:{job.pk}", daemon=True)
+        thread.start()
+        try:
+            yield
+        finally:
+            stop.set()
+            thread.join()
+
+    def _add_details(self, job, success_details, skipped_details, error_details):
+        job.success_count += len(success_details)
+        job.skipped_count += len(skipped_details)
+        job.error_count += len(error_details)
+        for details, new_details in (
+            (job.success_details, success_details),
+            (job.skipped_details, skipped_details),
+            (job.error_details, error_details),
+        ):
+            details.extend(new_details[:MAX_REPORT_DETAILS - len(details)])
+
+    def get_progress(self, job):
+        data = {
+            "id": job.pk,
+            "status": job.status,
+            "file_name": job.file_name,
+            "total_rows": job.total_rows,
+            "processed_rows": job.processed_rows,
+            "success_count": job.success_count,
+            "skipped_count": job.skipped_count,
+            "error_count": job.error_count,
+            "error": job.error,
+        }
+        if job.is_finished:
+            data["success_details"] = job.success_details
+            data["skipped_details"] = job.skipped_details
+            data["error_details"] = job.error_details
+        return data
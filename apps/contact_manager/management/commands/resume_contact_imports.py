@@ -0,0 +1,42 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from apps.contact_manager.jobs import ContactImportJobService
+from apps.core.bitrix import get_webhook_token
+
+
+class Command(BaseCommand):
+    help = "Обрабатывает ожидающие и прерванные задачи импорта контактов"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--member-id",
+            type=str,
+            help="member_id портала (по умолчанию BITRIX_MEMBER_ID или портал, установивший приложение, с доменом webhook)",
+        )
+        parser.add_argument(
+            "--loop", action="store_true", help="Работать постоянно, опрашивая задачи"
+        )
+        parser.add_argument(
+            "--interval", type=int, default=30, help="Пауза между опросами задач, сек"
+        )
+
+    def handle(self, *args, **options):
+        try:
+            token = get_webhook_token(options.get("member_id"))
+        except ValueError as e:
+            self.stdout.write(self.style.ERROR(str(e)))
+            return
+
+        service = ContactImportJobService(token, member_id=options.get("member_id"))
+
+        while True:
+            processed = service.resume()
+            if processed:
+                self.stdout.write(f"Обработано задач импорта: {processed}")
+            if not options["loop"]:
+                break
+            time.sleep(options["interval"])
+
+        self.stdout.write(self.style.SUCCESS("Готово!"))
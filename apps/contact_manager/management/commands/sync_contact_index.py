@@ -0,0 +1,34 @@
+from django.core.management.base import BaseCommand
+
+from apps.contact_manager.fingerprints import ContactFingerprintService
+from apps.core.bitrix import get_webhook_token
+
+
+class Command(BaseCommand):
+    help = "Обновляет локальный индекс телефонов и email контактов для поиска дубликатов"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--member-id",
+            type=str,
+            help="member_id портала (по умолчанию BITRIX_MEMBER_ID или портал, установивший приложение, с доменом webhook)",
+        )
+        parser.add_argument(
+            "--full",
+            action="store_true",
+            help="Полная синхронизация с удалением отпечатков удаленных контактов",
+        )
+
+    def handle(self, *args, **options):
+        try:
+            token = get_webhook_token(options.get("member_id"))
+        except ValueError as e:
+            self.stdout.write(self.style.ERROR(str(e)))
+            return
+
+        service = ContactFingerprintService(token, member_id=options.get("member_id"))
+        self.stdout.write(f"Обновление индекса контактов портала {service.member_id}...")
+
+        synced = service.sync(full=options["full"])
+
+        self.stdout.write(self.style.SUCCESS(f"Готово! Обработано контактов: {synced}"))
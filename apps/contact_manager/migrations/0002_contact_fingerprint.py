@@ -0,0 +1,76 @@
+# Generated by Django 4.2 on 2026-10-18 12:03
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("contact_manager", "0001_initial"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="ContactFingerprint",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("member_id", models.CharField(max_length=50)),
+                (
+                    "kind",
+                    models.CharField(
+                        choices=[("phone", "Телефон"), ("email", "Email")],
+                        max_length=10,
+                    ),
+                ),
+                ("value", models.CharField(max_length=255)),
+                ("contact_id", models.PositiveBigIntegerField()),
+                ("synced_at", models.DateTimeField()),
+            ],
+            options={
+                "verbose_name": "Отпечаток контакта",
+                "verbose_name_plural": "Отпечатки контактов",
+            },
+        ),
+        migrations.CreateModel(
+            name="ContactIndexState",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("member_id", models.CharField(max_length=50, unique=True)),
+                ("last_date_modify", models.DateTimeField(blank=True, null=True)),
+                ("last_synced_at", models.DateTimeField(blank=True, null=True)),
+                ("last_full_sync_at", models.DateTimeField(blank=True, null=True)),
+            ],
+            options={
+                "verbose_name": "Состояние индекса контактов",
+                "verbose_name_plural": "Состояния индекса контактов",
+            },
+        ),
+        migrations.AddIndex(
+            model_name="contactfingerprint",
+            index=models.Index(
+                fields=["member_id", "contact_id"], name="contact_fp_contact_idx"
+            ),
+        ),
+        migrations.AddConstraint(
+            model_name="contactfingerprint",
+            constraint=models.UniqueConstraint(
+                fields=("member_id", "kind", "value", "contact_id"),
+                name="contact_fp_unique",
+            ),
+        ),
+    ]
@@ -1,3 +1,98 @@
 from django.db import models
 
-# Create your models here.
+
+class ContactImportJob(models.Model):
+    STATUS_PENDING = "pending"
+    STATUS_RUNNING = "running"
+    STATUS_DONE = "done"
+    STATUS_FAILED = "failed"
+    STATUS_CHOICES = [
+        (STATUS_PENDING, "В очереди"),
+        (STATUS_RUNNING, "Выполняется"),
+        (STATUS_DONE, "Завершен"),
+        (STATUS_FAILED, "Ошибка"),
+    ]
+
+    member_id = models.CharField(max_length=50)
+    user_id = models.CharField(max_length=20)
+    file = models.FileField(upload_to="contact_imports/", blank=True)
+    file_name = models.CharField(max_length=255)
+    status = models.CharField(
+        max_length=10, choices=STATUS_CHOICES, default=STATUS_PENDING
+    )
+    total_rows = models.PositiveIntegerField(null=True, blank=True)
+    processed_rows = models.PositiveIntegerField(default=0)
+    success_count = models.PositiveIntegerField(default=0)
+    skipped_count = models.PositiveIntegerField(default=0)
+    error_count = models.PositiveIntegerField(default=0)
+    success_details = models.JSONField(default=list)
+    skipped_details = models.JSONField(default=list)
+    error_details = models.JSONField(default=list)
+    error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        ordering = ["-created_at"]
+        verbose_name = "Импорт контактов"
+        verbose_name_plural = "Импорты контактов"
+        indexes = [
+            models.Index(
+                fields=["status", "updated_at"], name="contact_import_job_due_idx"
+            ),
+        ]
+
+    def __str__(self):
+        return f"Import {self.pk} {self.file_name} ({self.status})"
+
+    @property
+    def is_finished(self):
+        return self.status in (self.STATUS_DONE, self.STATUS_FAILED)
+
+
+class ContactFingerprint(models.Model):
+    KIND_PHONE = "phone"
+    KIND_EMAIL = "email"
+    KIND_CHOICES = [
+        (KIND_PHONE, "Телефон"),
+        (KIND_EMAIL, "Email"),
+    ]
+
+    member_id = models.CharField(max_length=50)
+    kind = models.CharField(max_length=10, choices=KIND_CHOICES)
+    value = models.CharField(max_length=255)
+    contact_id = models.PositiveBigIntegerField()
+    synced_at = models.DateTimeField()
+
+    class Meta:
+        verbose_name = "Отпечаток контакта"
+        verbose_name_plural = "Отпечатки контактов"
+        constraints = [
+            models.UniqueConstraint(
+                fields=["member_id", "kind", "value", "contact_id"],
+                name="contact_fp_unique",
+            ),
+        ]
+        indexes = [
+            models.Index(
+                fields=["member_id", "contact_id"], name="contact_fp_contact_idx"
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.kind}:{self.value} -> {self.contact_id}"
+
+
+class ContactIndexState(models.Model):
+    member_id = models.CharField(max_length=50, unique=True)
+    last_date_modify = models.DateTimeField(null=True, blank=True)
+    last_synced_at = models.DateTimeField(null=True, blank=True)
+    last_full_sync_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        verbose_name = "Состояние индекса контактов"
+        verbose_name_plural = "Состояния индекса контактов"
+
+    def __str__(self):
+        return f"Contact index state for {self.member_id}"
@@ -1,84 +1,136 @@
 import csv
 import io
+import logging
+import tempfile
 
 import openpyxl
-from django.http import HttpResponse
+from django.http import FileResponse, StreamingHttpResponse
+
+from apps.core.batch import chunked_iter, iter_list_pages
+from apps.core.bitrix import get_batch_error, get_member_id
+from apps.core.companies import CompanyDirectoryService
+from .fingerprints import ContactFingerprintService, contact_fingerprints
+from .models import ContactFingerprint
+
+logger = logging.getLogger(__name__)
+
+EXPORT_HEADER = ["имя", "фамилия", "номер телефона", "почта", "компания"]
+EXPORT_CHUNK_SIZE = 2500
+XLSX_MAX_ROWS = 1048576
+
+
+class Echo:
+    def write(self, value):
+        return value
 
 
 class ContactExportService:
-    def __init__(self, bitrix_token):
+    def __init__(self, bitrix_token, member_id=None):
         self.but = bitrix_token
+        self.member_id = member_id or get_member_id(bitrix_token)
+        self.companies = CompanyDirectoryService(bitrix_token, member_id=self.member_id)
 
     def get_contacts(self):
-        return list(self.but.call_list_fast(
+        # Контакты читаются постранично и не накапливаются в памяти.
+        return iter_list_pages(
+            self.but,
             "crm.contact.list",
             {"select": ["ID", "NAME", "LAST_NAME", "COMPANY_ID", "PHONE", "EMAIL"]},
-        ))
-
-    def get_company_map(self):
-        companies_data = self.but.call_list_fast(
-            "crm.company.list", {"select": ["ID", "TITLE"]}
+            member_id=self.member_id,
         )
-        return {str(c["ID"]): c["TITLE"] for c in companies_data}
-
-    def export_to_xlsx(self, contacts, company_map):
-        workbook = openpyxl.Workbook()
-        sheet = workbook.active
-        sheet.title = "Contacts"
-        header = ["имя", "фамилия", "номер телефона", "почта", "компания"]
-        sheet.append(header)
-
-        for contact in contacts:
-            phone = contact.get("PHONE")[0]["VALUE"] if contact.get("PHONE") else ""
-            email = contact.get("EMAIL")[0]["VALUE"] if contact.get("EMAIL") else ""
-            company_name = company_map.get(str(contact.get("COMPANY_ID")), "")
-            sheet.append([
-                contact.get("NAME", ""),
-                contact.get("LAST_NAME", ""),
-                phone,
-                email,
-                company_name,
-            ])
-
-        buffer = io.BytesIO()
-        workbook.save(buffer)
-        buffer.seek(0)
-
-        response = HttpResponse(
-            buffer.getvalue(),
+
+    def iter_rows(self, contacts):
+        # Названия компаний подгружаются по мере чтения контактов и только
+        # для встретившихся COMPANY_ID.
+        company_map = {}
+        for group in chunked_iter(contacts, EXPORT_CHUNK_SIZE):
+            missing = {
+                str(c["COMPANY_ID"])
+                for c in group
+                if c.get("COMPANY_ID") and str(c["COMPANY_ID"]) not in company_map
+            }
+            if missing:
+                company_map.update(self.get_companies_by_id(missing))
+            for contact in group:
+                yield self.build_row(contact, company_map)
+
+    def get_companies_by_id(self, company_ids):
+        return self.companies.get_titles(company_ids)
+
+    def build_row(self, contact, company_map):
+        phone = contact.get("PHONE")[0]["VALUE"] if contact.get("PHONE") else ""
+        email = contact.get("EMAIL")[0]["VALUE"] if contact.get("EMAIL") else ""
+        company_name = company_map.get(str(contact.get("COMPANY_ID")), "")
+        return [
+            contact.get("NAME", ""),
+            contact.get("LAST_NAME", ""),
+            phone,
+            email,
+            company_name,
+        ]
+
+    def export_to_xlsx(self, contacts):
+        # Write-only книга пишет строки во временные файлы openpyxl, а готовый
+        # файл отдается с диска, так что память не растет с числом контактов.
+        # При превышении лимита Excel строки продолжаются на следующем листе.
+        workbook = openpyxl.Workbook(write_only=True)
+        sheet = None
+        sheet_rows = XLSX_MAX_ROWS
+        for row in self.iter_rows(contacts):
+            if sheet_rows >= XLSX_MAX_ROWS:
+                sheet = self._create_sheet(workbook)
+                sheet_rows = 1
+            sheet.append(row)
+            sheet_rows += 1
+        if sheet is None:
+            self._create_sheet(workbook)
+
+        file = tempfile.TemporaryFile()
+        workbook.save(file)
+        file.seek(0)
+
+        return FileResponse(
+            file,
+            as_attachment=True,
+            filename="contacts.xlsx",
             content_type="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
         )
-        response["Content-Disposition"] = 'attachment; filename="contacts.xlsx"'
-        return response
 
-    def export_to_csv(self, contacts, company_map):
-        response = HttpResponse(content_type="text/csv; charset=utf-8")
-        response["Content-Disposition"] = 'attachment; filename="contacts.csv"'
-        response.write("\ufeff".encode("utf8"))
-
-        writer = csv.writer(response)
-        header = ["имя", "фамилия", "номер телефона", "почта", "компания"]
-        writer.writerow(header)
-
-        for contact in contacts:
-            phone = contact.get("PHONE")[0]["VALUE"] if contact.get("PHONE") else ""
-            email = contact.get("EMAIL")[0]["VALUE"] if contact.get("EMAIL") else ""
-            company_name = company_map.get(str(contact.get("COMPANY_ID")), "")
-            writer.writerow([
-                contact.get("NAME", ""),
-                contact.get("LAST_NAME", ""),
-                phone,
-                email,
-                company_name,
-            ])
+    def _create_sheet(self, workbook):
+        number = len(workbook.worksheets) + 1
+        sheet = workbook.create_sheet("Contacts" if number == 1 else f"Contacts {number}")
+        sheet.append(EXPORT_HEADER)
+        return sheet
 
+    def export_to_csv(self, contacts):
+        response = StreamingHttpResponse(
+            self.iter_csv(contacts), content_type="text/csv; charset=utf-8"
+        )
+        response["Content-Disposition"] = 'attachment; filename="contacts.csv"'
         return response
 
+    def iter_csv(self, contacts):
+        writer = csv.writer(Echo())
+        yield "\ufeff"
+        yield writer.writerow(EXPORT_HEADER)
+        try:
+            for row in self.iter_rows(contacts):
+                yield writer.writerow(row)
+        except Exception as e:
+            # Заголовки ответа уже отправлены: ошибка логируется, а соединение
+            # обрывается, чтобы неполный файл не выглядел как целый.
+            logger.error(f"Экспорт контактов прерван: {e}")
+            raise
+
 
 class ContactImportService:
-    def __init__(self, bitrix_token, user_id):
+    def __init__(self, bitrix_token, user_id, member_id=None):
         self.but = bitrix_token
         self.user_id = user_id
+        self.fingerprints = ContactFingerprintService(bitrix_token, member_id=member_id)
+        self.companies = CompanyDirectoryService(
+            bitrix_token, member_id=self.fingerprints.member_id
+        )
 
     def parse_file(self, file):
         if file.name.endswith(".csv"):
@@ -89,18 +141,24 @@ class ContactImportService:
             raise ValueError("Неподдерживаемый формат файла. Пожалуйста, используйте CSV или XLSX.")
 
     def _parse_csv(self, file):
-        decoded_file = file.read().decode("utf-8-sig")
-        lines = decoded_file.strip().splitlines()
-        header = [h.lower().strip() for h in lines[0].split(",")]
-        rows = [dict(zip(header, line.split(","))) for line in lines[1:]]
-        return header, rows
+        # Строки читаются по одной: кавычки и переводы строк внутри полей
+        # разбирает csv.reader, файл целиком в память не загружается.
+        reader = csv.reader(io.TextIOWrapper(file, encoding="utf-8-sig", newline=""))
+        header = [h.lower().strip() for h in next(reader, [])]
+        return header, (dict(zip(header, row)) for row in reader)
 
     def _parse_xlsx(self, file):
-        workbook = openpyxl.load_workbook(file)
-        sheet = workbook.active
-        header = [cell.value.lower().strip() for cell in sheet[1]]
-        rows = [dict(zip(header, row)) for row in sheet.iter_rows(min_row=2, values_only=True)]
-        return header, rows
+        workbook = openpyxl.load_workbook(file, read_only=True, data_only=True)
+        rows = workbook.active.iter_rows(values_only=True)
+        header = [str(h).lower().strip() if h is not None else "" for h in next(rows, ())]
+        return header, self._iter_xlsx_rows(workbook, header, rows)
+
+    def _iter_xlsx_rows(self, workbook, header, rows):
+        try:
+            for row in rows:
+                yield dict(zip(header, row))
+        finally:
+            workbook.close()
 
     def validate_headers(self, header):
         required_headers = ["имя", "фамилия"]
@@ -110,29 +168,9 @@ class ContactImportService:
                 f"Найденные заголовки: {header}."
             )
 
-    def get_existing_contacts(self):
-        existing_contacts = self.but.call_list_fast(
-            "crm.contact.list", {"select": ["PHONE", "EMAIL"]}
-        )
-        existing_phones = set()
-        existing_emails = set()
-        for contact in existing_contacts:
-            if contact.get("PHONE"):
-                existing_phones.add(contact["PHONE"][0]["VALUE"])
-            if contact.get("EMAIL"):
-                existing_emails.add(contact["EMAIL"][0]["VALUE"])
-        return existing_phones, existing_emails
-
-    def get_company_map(self):
-        companies_data = self.but.call_list_fast(
-            "crm.company.list", {"select": ["ID", "TITLE"]}
-        )
-        return {c["TITLE"].lower().strip(): str(c["ID"]) for c in companies_data}
-
-    def prepare_batch_commands(self, rows, existing_phones, existing_emails, company_map):
-        batch_cmds = []
-        skipped_details = []
-        for i, row in enumerate(rows):
+    def prepare_batch_commands(self, rows, start=0):
+        contacts = []
+        for i, row in enumerate(rows, start):
             name = row.get("имя")
             last_name = row.get("фамилия")
             phone = row.get("номер телефона")
@@ -142,19 +180,6 @@ class ContactImportService:
             if not name and not last_name:
                 continue
 
-            contact_name_for_report = f"{name or ''} {last_name or ''}".strip()
-
-            if phone and phone in existing_phones:
-                skipped_details.append(
-                    f"Строка {i + 2}: Контакт '{contact_name_for_report}' пропущен (дубликат по номеру телефона: {phone})."
-                )
-                continue
-            if email and email in existing_emails:
-                skipped_details.append(
-                    f"Строка {i + 2}: Контакт '{contact_name_for_report}' пропущен (дубликат по email: {email})."
-                )
-                continue
-
             fields = {
                 "NAME": name,
                 "LAST_NAME": last_name,
@@ -162,38 +187,73 @@ class ContactImportService:
                 "ASSIGNED_BY_ID": self.user_id,
             }
             if phone:
-                fields["PHONE"] = [{"VALUE": phone, "VALUE_TYPE": "WORK"}]
+                fields["PHONE"] = [{"VALUE": str(phone), "VALUE_TYPE": "WORK"}]
             if email:
-                fields["EMAIL"] = [{"VALUE": email, "VALUE_TYPE": "WORK"}]
+                fields["EMAIL"] = [{"VALUE": str(email), "VALUE_TYPE": "WORK"}]
 
             if company_name:
-                company_id = company_map.get(str(company_name).lower().strip())
+                company_id = self.companies.find_id(company_name)
                 if company_id:
                     fields["COMPANY_ID"] = company_id
 
+            contacts.append((i, fields, sorted(contact_fingerprints(fields), reverse=True)))
+
+        # Телефоны и email всей порции проверяются одним запросом к индексу.
+        # Повторы внутри порции отсекаются здесь же, а созданные контакты
+        # попадают в индекс и отсекают повторы в следующих порциях файла.
+        existing = self.fingerprints.find(
+            {fingerprint for _, _, fingerprints in contacts for fingerprint in fingerprints}
+        )
+        seen = {}
+        batch_cmds = []
+        skipped_details = []
+        for i, fields, fingerprints in contacts:
+            contact_name_for_report = f"{fields['NAME'] or ''} {fields['LAST_NAME'] or ''}".strip()
+            duplicate = None
+            for kind, value in fingerprints:
+                label = "номеру телефона" if kind == ContactFingerprint.KIND_PHONE else "email"
+                if (kind, value) in existing:
+                    duplicate = f"дубликат по {label}: {value}, контакт ID {existing[(kind, value)]}"
+                elif (kind, value) in seen:
+                    duplicate = f"дубликат по {label}: {value}, строка {seen[(kind, value)]} файла"
+                if duplicate:
+                    break
+
+            if duplicate:
+                skipped_details.append(
+                    f"Строка {i + 2}: Контакт '{contact_name_for_report}' пропущен ({duplicate})."
+                )
+                continue
+
+            for fingerprint in fingerprints:
+                seen[fingerprint] = i + 2
             batch_cmds.append((f"cmd_{i}", "crm.contact.add", {"fields": fields}))
 
         return batch_cmds, skipped_details
 
-    def process_batch_results(self, result, original_rows):
+    def process_batch_results(self, result, batch_cmds):
         success_details = []
         error_details = []
+        created = []
+        fields_by_cmd = {cmd_id: params["fields"] for cmd_id, _, params in batch_cmds}
         if result:
-            for cmd_id, res in result.items():
+            for cmd_id, res in sorted(result.items(), key=lambda item: int(item[0].split("_")[1])):
                 index = int(cmd_id.split("_")[1])
                 row_num = index + 2
-                original_row_data = original_rows[index]
-                contact_name = f"{original_row_data.get('имя', '')} {original_row_data.get('фамилия', '')}".strip()
+                fields = fields_by_cmd.get(cmd_id, {})
+                contact_name = f"{fields.get('NAME') or ''} {fields.get('LAST_NAME') or ''}".strip()
 
-                if res.get("error") is None:
+                error_msg = get_batch_error(res)
+                if error_msg is None:
                     success_details.append(
                         f"Строка {row_num}: Контакт '{contact_name}' успешно создан (ID: {res.get('result')})."
                     )
+                    created.append((res.get("result"), fields))
                 else:
-                    error_msg = res["error"].get(
-                        "error_description", "Неизвестная ошибка"
-                    )
                     error_details.append(
                         f"Строка {row_num}: Ошибка при создании контакта '{contact_name}' - {error_msg}"
                     )
+
+        if created:
+            self.fingerprints.add_contacts(created)
         return success_details, error_details
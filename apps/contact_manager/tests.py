@@ -1,3 +1,342 @@
-from django.test import TestCase
+import csv
+import io
+import os
+import tempfile
+import resource
+import time
+import tracemalloc
+from unittest import mock, skipUnless
 
-# Create your tests here.
+import openpyxl
+from django.core.files import File
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import SimpleTestCase, TestCase, override_settings
+
+from . import services
+from .fingerprints import ContactFingerprintService, contact_fingerprints, normalize_phone
+from .models import ContactFingerprint
+from .services import EXPORT_HEADER, ContactExportService, ContactImportService
+
+
+class ContactCsvExportTests(SimpleTestCase):
+    def setUp(self):
+        self.service = ContactExportService(None, member_id="test-export")
+
+    def test_streams_rows_with_company_titles(self):
+        contacts = [
+            {"NAME": "Иван", "LAST_NAME": "Петров", "COMPANY_ID": "5", "PHONE": [{"VALUE": "+79001234567"}]},
+            {"NAME": "Анна", "LAST_NAME": "Смирнова", "COMPANY_ID": None, "EMAIL": [{"VALUE": "a@example.com"}]},
+        ]
+        with mock.patch.object(self.service, "get_companies_by_id", return_value={"5": "ООО Ромашка"}) as get_titles:
+            content = "".join(self.service.iter_csv(iter(contacts)))
+
+        get_titles.assert_called_once_with({"5"})
+        lines = content.removeprefix("\ufeff").splitlines()
+        self.assertEqual(lines[0], ",".join(EXPORT_HEADER))
+        self.assertEqual(lines[1], "Иван,Петров,+79001234567,,ООО Ромашка")
+        self.assertEqual(lines[2], "Анна,Смирнова,,a@example.com,")
+
+    def test_loads_company_titles_once_per_company(self):
+        contacts = ({"NAME": str(n), "COMPANY_ID": "7"} for n in range(6000))
+        with mock.patch.object(self.service, "get_companies_by_id", return_value={"7": "ООО"}) as get_titles:
+            rows = list(self.service.iter_rows(contacts))
+        self.assertEqual(len(rows), 6000)
+        self.assertEqual(get_titles.call_count, 1)
+
+    def test_contact_error_interrupts_stream(self):
+        def contacts():
+            yield {"NAME": "Иван"}
+            raise ValueError("expired_token")
+
+        stream = self.service.iter_csv(contacts())
+        with self.assertLogs("apps.contact_manager.services", "ERROR"):
+            with self.assertRaises(ValueError):
+                list(stream)
+
+
+class FakeContactPortal:
+    # Контакты генерируются постранично на лету, чтобы память замера
+    # занимал только сам экспорт.
+    def __init__(self, total):
+        self.total = total
+        self.member_id = "benchmark-export"
+
+    def page(self, start):
+        contacts = [
+            {
+                "ID": str(n),
+                "NAME": f"Имя {n}",
+                "LAST_NAME": f"Фамилия {n}",
+                "COMPANY_ID": str(n % 1000),
+                "PHONE": [{"VALUE": f"+7900{n:07d}"}],
+                "EMAIL": [{"VALUE": f"contact{n}@example.com"}],
+            }
+            for n in range(start, min(start + 50, self.total))
+        ]
+        return {"result": contacts, "total": self.total}
+
+    def call_api_method(self, method, params):
+        return self.page(params["start"])
+
+    def batch_api_call(self, methods, halt=0):
+        return {cmd_id: self.page(params["start"]) for cmd_id, _, params in methods}
+
+
+def company_titles(company_ids):
+    return {company_id: f"ООО Компания {company_id}" for company_id in company_ids}
+
+
+@skipUnless(os.getenv("BENCHMARK"), "замеры запускаются с BENCHMARK=1")
+@override_settings(BITRIX_RATE_LIMIT=100000)
+class ContactCsvExportBenchmark(SimpleTestCase):
+    # Время до первого байта и пик памяти потокового CSV-экспорта через
+    # StreamingHttpResponse. Пик памяти процесса (ru_maxrss) только растет,
+    # поэтому для каждого размера печатается пик отслеживаемой памяти Python.
+    def test_export_sizes(self):
+        for total in (10000, 100000, 1000000):
+            service = ContactExportService(FakeContactPortal(total))
+
+            tracemalloc.start()
+            started = time.monotonic()
+            with mock.patch.object(service, "get_companies_by_id", side_effect=company_titles):
+                size = lines = 0
+                # Первые части ответа — BOM и заголовок, третья — первый контакт.
+                for n, chunk in enumerate(service.export_to_csv(service.get_contacts())):
+                    if n == 2:
+                        first_row = time.monotonic() - started
+                    size += len(chunk)
+                    lines += chunk.count(b"\n")
+            elapsed = time.monotonic() - started
+            _, peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+
+            print(
+                f"\nCSV {total} контактов: первая строка через {first_row * 1000:.0f} мс, всего {elapsed:.1f} с, "
+                f"{size / 1024 / 1024:.0f} МБ, пик памяти {peak / 1024 / 1024:.1f} МБ, "
+                f"ru_maxrss процесса {resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024:.0f} МБ"
+            )
+            self.assertEqual(lines, total + 1)
+
+
+class ContactXlsxExportTests(SimpleTestCase):
+    def setUp(self):
+        self.service = ContactExportService(None, member_id="test-export")
+
+    def export(self, contacts):
+        with mock.patch.object(self.service, "get_companies_by_id", return_value={}):
+            response = self.service.export_to_xlsx(iter(contacts))
+        return openpyxl.load_workbook(response.file_to_stream, read_only=True)
+
+    def test_writes_header_and_rows(self):
+        workbook = self.export([{"NAME": "Иван", "LAST_NAME": "Петров"}])
+        rows = list(workbook.active.iter_rows(values_only=True))
+        self.assertEqual(list(rows[0]), EXPORT_HEADER)
+        self.assertEqual(rows[1][:2], ("Иван", "Петров"))
+
+    def test_empty_export_has_header_only(self):
+        workbook = self.export([])
+        self.assertEqual(len(list(workbook.active.iter_rows(values_only=True))), 1)
+
+    def test_rows_continue_on_next_sheet(self):
+        with mock.patch.object(services, "XLSX_MAX_ROWS", 3):
+            workbook = self.export([{"NAME": str(n)} for n in range(5)])
+        self.assertEqual(workbook.sheetnames, ["Contacts", "Contacts 2", "Contacts 3"])
+        names = [
+            row[0]
+            for sheet in workbook.worksheets
+            for row in list(sheet.iter_rows(values_only=True))[1:]
+        ]
+        self.assertEqual(names, ["0", "1", "2", "3", "4"])
+
+
+@skipUnless(os.getenv("BENCHMARK"), "замеры запускаются с BENCHMARK=1")
+@override_settings(BITRIX_RATE_LIMIT=100000)
+class ContactXlsxExportBenchmark(SimpleTestCase):
+    # Прежний экспорт собирал обычную книгу openpyxl со всеми контактами
+    # списком и копировал ее в BytesIO; новый пишет write-only книгу во
+    # временный файл.
+    def legacy_export(self, service, contacts):
+        contacts = list(contacts)
+        company_map = service.get_companies_by_id({str(c["COMPANY_ID"]) for c in contacts})
+        workbook = openpyxl.Workbook()
+        sheet = workbook.active
+        sheet.title = "Contacts"
+        sheet.append(EXPORT_HEADER)
+        for contact in contacts:
+            sheet.append(service.build_row(contact, company_map))
+        buffer = io.BytesIO()
+        workbook.save(buffer)
+        return buffer.getvalue()
+
+    def export(self, service, contacts):
+        response = service.export_to_xlsx(contacts)
+        return b"".join(response.streaming_content)
+
+    def test_old_and_new_export(self):
+        for total in (10000, 100000):
+            for name, export in (("прежний", self.legacy_export), ("write-only", self.export)):
+                service = ContactExportService(FakeContactPortal(total))
+
+                tracemalloc.start()
+                started = time.monotonic()
+                with mock.patch.object(service, "get_companies_by_id", side_effect=company_titles):
+                    content = export(service, service.get_contacts())
+                elapsed = time.monotonic() - started
+                _, peak = tracemalloc.get_traced_memory()
+                tracemalloc.stop()
+
+                print(
+                    f"\nXLSX {total} контактов, {name}: {elapsed:.1f} с, "
+                    f"{len(content) / 1024 / 1024:.1f} МБ, пик памяти {peak / 1024 / 1024:.1f} МБ"
+                )
+
+
+class ContactImportParseTests(SimpleTestCase):
+    def setUp(self):
+        self.service = ContactImportService(None, user_id=1, member_id="test-import")
+
+    def test_csv_with_bom_and_quoted_newlines(self):
+        content = '\ufeffИмя,Фамилия,Компания\r\nИван,Петров,"ООО ""Ромашка"",\nфилиал"\r\nАнна,Смирнова,\r\n'
+        header, rows = self.service.parse_file(
+            SimpleUploadedFile("contacts.csv", content.encode("utf-8"))
+        )
+        self.assertEqual(header, ["имя", "фамилия", "компания"])
+        self.assertEqual(
+            list(rows),
+            [
+                {"имя": "Иван", "фамилия": "Петров", "компания": 'ООО "Ромашка",\nфилиал'},
+                {"имя": "Анна", "фамилия": "Смирнова", "компания": ""},
+            ],
+        )
+
+    def test_xlsx_rows_are_read_lazily(self):
+        workbook = openpyxl.Workbook()
+        sheet = workbook.active
+        sheet.append(["Имя", "Фамилия", None])
+        for n in range(3):
+            sheet.append([f"Имя {n}", f"Фамилия {n}", None])
+        file = SimpleUploadedFile("contacts.xlsx", b"")
+        workbook.save(file.file)
+        file.file.seek(0)
+
+        header, rows = self.service.parse_file(file)
+        self.assertEqual(header, ["имя", "фамилия", ""])
+        self.assertEqual(next(rows), {"имя": "Имя 0", "фамилия": "Фамилия 0", "": None})
+        self.assertEqual(len(list(rows)), 2)
+
+    def test_unsupported_format(self):
+        with self.assertRaises(ValueError):
+            self.service.parse_file(SimpleUploadedFile("contacts.txt", b"x"))
+
+
+@skipUnless(os.getenv("BENCHMARK"), "замеры запускаются с BENCHMARK=1")
+class ContactImportParseBenchmark(SimpleTestCase):
+    # Строк в секунду и пик памяти при разборе файла импорта: прежний
+    # разбор читал файл целиком, новый отдает строки по одной.
+    def setUp(self):
+        self.service = ContactImportService(None, user_id=1, member_id="benchmark-import")
+        self.dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.dir.cleanup)
+
+    def legacy_parse(self, file):
+        if file.name.endswith(".csv"):
+            lines = file.read().decode("utf-8-sig").strip().splitlines()
+            header = [h.lower().strip() for h in lines[0].split(",")]
+            return header, [dict(zip(header, line.split(","))) for line in lines[1:]]
+        workbook = openpyxl.load_workbook(file)
+        sheet = workbook.active
+        header = [cell.value.lower().strip() for cell in sheet[1]]
+        return header, [dict(zip(header, row)) for row in sheet.iter_rows(min_row=2, values_only=True)]
+
+    def write_csv(self, total):
+        path = os.path.join(self.dir.name, "contacts.csv")
+        with open(path, "w", encoding="utf-8-sig", newline="") as file:
+            writer = csv.writer(file)
+            writer.writerow(EXPORT_HEADER)
+            for n in range(total):
+                writer.writerow([f"Имя {n}", f"Фамилия {n}", f"+7900{n:07d}", f"c{n}@example.com", f"ООО {n % 1000}"])
+        return path
+
+    def write_xlsx(self, total):
+        path = os.path.join(self.dir.name, "contacts.xlsx")
+        workbook = openpyxl.Workbook(write_only=True)
+        sheet = workbook.create_sheet("Contacts")
+        sheet.append(EXPORT_HEADER)
+        for n in range(total):
+            sheet.append([f"Имя {n}", f"Фамилия {n}", f"+7900{n:07d}", f"c{n}@example.com", f"ООО {n % 1000}"])
+        workbook.save(path)
+        return path
+
+    def test_parse_rows_per_second(self):
+        for path, total in ((self.write_csv(500000), 500000), (self.write_xlsx(50000), 50000)):
+            size = os.path.getsize(path) / 1024 / 1024
+            for name, parse in (("прежний", self.legacy_parse), ("потоковый", self.service.parse_file)):
+                with open(path, "rb") as raw:
+                    file = File(raw, name=os.path.basename(path))
+                    tracemalloc.start()
+                    started = time.monotonic()
+                    _, rows = parse(file)
+                    count = sum(1 for _ in rows)
+                    elapsed = time.monotonic() - started
+                    _, peak = tracemalloc.get_traced_memory()
+                    tracemalloc.stop()
+
+                print(
+                    f"\n{file.name} ({size:.0f} МБ, {total} строк), {name}: "
+                    f"{count / elapsed:.0f} строк/с, пик памяти {peak / 1024 / 1024:.1f} МБ"
+                )
+                self.assertEqual(count, total)
+
+
+@override_settings(PHONE_DEFAULT_COUNTRY_CODE="7")
+class NormalizePhoneTests(SimpleTestCase):
+    def test_russian_formats_share_one_value(self):
+        for value in ("+7 (900) 123-45-67", "8 900 123 45 67", "79001234567", "9001234567", "007 900 1234567"):
+            self.assertEqual(normalize_phone(value), "+79001234567", value)
+
+    def test_foreign_number_keeps_country_code(self):
+        self.assertEqual(normalize_phone("+44 20 7946 0958"), "+442079460958")
+
+    def test_empty_values(self):
+        self.assertEqual(normalize_phone(None), "")
+        self.assertEqual(normalize_phone("доб."), "")
+
+    @override_settings(PHONE_DEFAULT_COUNTRY_CODE="375")
+    def test_other_default_country(self):
+        self.assertEqual(normalize_phone("2912345678"), "+3752912345678")
+
+    def test_contact_fingerprints(self):
+        self.assertEqual(
+            contact_fingerprints(
+                {
+                    "PHONE": [{"VALUE": "8 (900) 123-45-67"}, {"VALUE": ""}],
+                    "EMAIL": [{"VALUE": " Ivan@Example.com "}],
+                }
+            ),
+            {
+                (ContactFingerprint.KIND_PHONE, "+79001234567"),
+                (ContactFingerprint.KIND_EMAIL, "ivan@example.com"),
+            },
+        )
+
+
+@override_settings(PHONE_DEFAULT_COUNTRY_CODE="7")
+class ContactImportDuplicatesTests(TestCase):
+    def setUp(self):
+        self.service = ContactImportService(None, user_id=1, member_id="test-duplicates")
+        ContactFingerprintService(None, member_id="test-duplicates").add_contacts(
+            [(10, {"PHONE": [{"VALUE": "+7 900 000-00-01"}]})]
+        )
+
+    def test_skips_indexed_and_repeated_contacts(self):
+        rows = [
+            {"имя": "Иван", "фамилия": "Петров", "номер телефона": "89000000001"},
+            {"имя": "Анна", "фамилия": "Смирнова", "почта": "anna@example.com"},
+            {"имя": "Анна", "фамилия": "С.", "почта": "ANNA@example.com"},
+            {"имя": "", "фамилия": ""},
+        ]
+        batch_cmds, skipped_details = self.service.prepare_batch_commands(rows)
+
+        self.assertEqual([cmd_id for cmd_id, _, _ in batch_cmds], ["cmd_1"])
+        self.assertIn("контакт ID 10", skipped_details[0])
+        self.assertIn("строка 3 файла", skipped_details[1])
@@ -8,4 +8,5 @@ urlpatterns = [
     path("", views.index, name="index"),
     path("export/", views.export_contacts, name="export_contacts"),
     path("import/", views.import_contacts, name="import_contacts"),
+    path("import/<int:job_id>/status/", views.import_status, name="import_status"),
 ]
@@ -1,9 +1,14 @@
+import logging
+
+from django.http import JsonResponse
 from django.shortcuts import render
-from django.db import transaction
 from openpyxl.styles.fills import PatternFill
 
 from apps.core.decorators import smart_auth
-from .services import ContactExportService, ContactImportService
+from .jobs import ContactImportJobService
+from .services import ContactExportService
+
+logger = logging.getLogger(__name__)
 
 # Патч для openpyxl для обработки файлов, созданных не в MS Excel
 original_init = PatternFill.__init__
@@ -30,12 +35,11 @@ def export_contacts(request):
             file_format = request.POST.get("format", "csv")
 
             contacts = service.get_contacts()
-            company_map = service.get_company_map()
 
             if file_format == "xlsx":
-                return service.export_to_xlsx(contacts, company_map)
+                return service.export_to_xlsx(contacts)
             else:
-                return service.export_to_csv(contacts, company_map)
+                return service.export_to_csv(contacts)
 
         except Exception as e:
             return render(request, "contact_manager/export.html", {"error": str(e)})
@@ -44,41 +48,40 @@ def export_contacts(request):
 
 
 @smart_auth
-@transaction.atomic
 def import_contacts(request):
     context = {}
+    service = ContactImportJobService(request.bitrix_user_token)
+
     if request.method == "POST":
         if not request.FILES.get("file"):
             context["error"] = "Файл не был загружен."
             return render(request, "contact_manager/import.html", context)
 
-        file = request.FILES["file"]
-
         try:
-            with transaction.atomic():
-                service = ContactImportService(request.bitrix_user_token, request.bitrix_user_token.user.bitrix_id)
-                header, original_rows = service.parse_file(file)
-                service.validate_headers(header)
-
-                existing_phones, existing_emails = service.get_existing_contacts()
-                company_map = service.get_company_map()
-
-                batch_cmds, skipped_details = service.prepare_batch_commands(
-                    original_rows, existing_phones, existing_emails, company_map
-                )
-
-                context["skipped_count"] = len(skipped_details)
-                context["skipped_details"] = skipped_details
-
-                if batch_cmds:
-                    result = service.but.batch_api_call(batch_cmds)
-                    success_details, error_details = service.process_batch_results(result, original_rows)
-                    context["success_count"] = len(success_details)
-                    context["error_count"] = len(error_details)
-                    context["success_details"] = success_details
-                    context["error_details"] = error_details
-
+            # Файл обрабатывается в фоне: ответ с номером задачи уходит сразу,
+            # страница опрашивает прогресс.
+            job = service.create_job(
+                request.FILES["file"], request.bitrix_user_token.user.bitrix_id
+            )
+            service.process_in_background(job)
+            context["job"] = job
         except Exception as e:
             context["error"] = f"Произошла ошибка при обработке файла: {str(e)}"
 
+    elif request.GET.get("job", "").isdigit():
+        context["job"] = service.get_job(request.GET["job"])
+
     return render(request, "contact_manager/import.html", context)
+
+
+@smart_auth
+def import_status(request, job_id):
+    try:
+        service = ContactImportJobService(request.bitrix_user_token)
+        job = service.get_job(job_id)
+        if job is None:
+            return JsonResponse({"error": "Задача импорта не найдена"}, status=404)
+        return JsonResponse(service.get_progress(job))
+    except Exception as e:
+        logger.error(f"Ошибка получения прогресса импорта {job_id}: {e}")
+        return JsonResponse({"error": str(e)}, status=500)
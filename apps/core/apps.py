@@ -0,0 +1,12 @@
+from django.apps import AppConfig
+
+
+class CoreConfig(AppConfig):
+    default_auto_field = "django.db.models.BigAutoField"
+    name = "apps.core"
+
+    def ready(self):
+        from .companies import handle_company_event
+        from .events import register_event_handler
+
+        register_event_handler("ONCRMCOMPANY", handle_company_event)
@@ -0,0 +1,30 @@
+import logging
+import threading
+
+from django.db import connection
+
+logger = logging.getLogger(__name__)
+
+_running = set()
+_running_lock = threading.Lock()
+
+
+def run_in_background(key, func, *args, **kwargs):
+    # Задачи без внешнего брокера: поток на процесс, не более одной задачи на ключ.
+    with _running_lock:
+        if key in _running:
+            return False
+        _running.add(key)
+
+    def target():
+        try:
+            func(*args, **kwargs)
+        except Exception as e:
+            logger.error(f"Ошибка фоновой задачи {key}: {e}")
+        finally:
+            connection.close()
+            with _running_lock:
+                _running.discard(key)
+
+    threading.Thread(target=target, name=key, daemon=True).start()
+    return True
@@ -0,0 +1,132 @@
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.db import connection
+
+from .bitrix import get_batch_error, get_member_id, is_throttle_error
+from .ratelimit import get_rate_limiter
+
+logger = logging.getLogger(__name__)
+
+BATCH_SIZE = 50
+PAGE_SIZE = 50
+BATCH_MAX_RETRIES = 3
+BATCH_RETRY_DELAY = 1
+
+
+def chunked(items, size):
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+
+def chunked_iter(iterable, size):
+    chunk = []
+    for item in iterable:
+        chunk.append(item)
+        if len(chunk) == size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def run_batches(bitrix_token, commands, max_workers=None, member_id=None):
+    # Команды делятся на batch-запросы по 50, запросы идут параллельно,
+    # но не чаще лимита портала. Команды, отклоненные из-за лимитов Bitrix24,
+    # повторяются отдельно, а скорость запросов к порталу снижается.
+    if not commands:
+        return {}
+
+    limiter = get_rate_limiter(
+        f"bitrix:{member_id or get_member_id(bitrix_token)}",
+        settings.BITRIX_RATE_LIMIT,
+    )
+    chunks = list(chunked(commands, BATCH_SIZE))
+
+    def call(chunk):
+        results = {}
+        pending = chunk
+        for attempt in range(BATCH_MAX_RETRIES + 1):
+            if attempt:
+                time.sleep(BATCH_RETRY_DELAY * 2 ** (attempt - 1))
+            limiter.acquire()
+            try:
+                chunk_result = bitrix_token.batch_api_call(methods=pending, halt=0)
+            except Exception as e:
+                # Сбой одного batch-запроса не должен терять результаты остальных.
+                # Повторяется он только при отказе по лимиту: тогда команды
+                # гарантированно не выполнялись.
+                logger.error(f"Ошибка batch-запроса: {e}")
+                error = {"error": "", "error_description": str(e)}
+                chunk_result = {
+                    cmd_id: {"result": None, "error": error} for cmd_id, _, _ in pending
+                }
+
+            throttled = []
+            for command in pending:
+                res = chunk_result.get(command[0])
+                results[command[0]] = res
+                if res and is_throttle_error(res.get("error")):
+                    throttled.append(command)
+
+            if not throttled:
+                limiter.speed_up()
+                break
+            limiter.slow_down()
+            pending = throttled
+            if attempt == BATCH_MAX_RETRIES:
+                logger.error(
+                    f"Bitrix24 ограничил {len(throttled)} команд, повторы исчерпаны ({BATCH_MAX_RETRIES})"
+                )
+            else:
+                logger.warning(
+                    f"Bitrix24 ограничил {len(throttled)} команд, повтор {attempt + 1} из {BATCH_MAX_RETRIES}"
+                )
+        return results
+
+    def call_in_thread(chunk):
+        # Токен может обновляться и сохраняться в БД из потока пула:
+        # соединение потока закрывается, чтобы не копить открытые соединения.
+        try:
+            return call(chunk)
+        finally:
+            connection.close()
+
+    results = {}
+    workers = min(max_workers or settings.BITRIX_BATCH_CONCURRENCY, len(chunks))
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        for chunk_result in executor.map(call_in_thread, chunks):
+            results.update(chunk_result)
+
+    logger.info(f"Выполнено {len(commands)} команд в {len(chunks)} batch-запросах")
+    return results
+
+
+def iter_list_pages(bitrix_token, method, params=None, pages_per_batch=BATCH_SIZE, member_id=None):
+    # Первая страница дает total, остальные запрашиваются пачками по
+    # pages_per_batch страниц в одном batch-запросе (start=50, 100, ...).
+    # Записи отдаются по мере получения, в исходном порядке.
+    params = dict(params or {})
+    limiter = get_rate_limiter(
+        f"bitrix:{member_id or get_member_id(bitrix_token)}",
+        settings.BITRIX_RATE_LIMIT,
+    )
+
+    limiter.acquire()
+    first_page = bitrix_token.call_api_method(method, dict(params, start=0))
+    yield from first_page.get("result") or []
+
+    total = int(first_page.get("total") or 0)
+    offsets = list(range(PAGE_SIZE, total, PAGE_SIZE))
+    for chunk in chunked(offsets, pages_per_batch):
+        limiter.acquire()
+        methods = [(f"page_{start}", method, dict(params, start=start)) for start in chunk]
+        batch_result = bitrix_token.batch_api_call(methods=methods, halt=0)
+        for start in chunk:
+            page = batch_result.get(f"page_{start}")
+            error = get_batch_error(page)
+            if error:
+                raise ValueError(f"Ошибка {method} (start={start}): {error}")
+            yield from page.get("result") or []
@@ -0,0 +1,65 @@
+import os
+from urllib.parse import urlparse
+
+from django.conf import settings
+
+THROTTLE_ERRORS = ("QUERY_LIMIT_EXCEEDED", "OPERATION_TIME_LIMIT")
+
+
+def get_member_id(bitrix_token):
+    member_id = getattr(bitrix_token, "member_id", None)
+    if not member_id:
+        portal = getattr(getattr(bitrix_token, "user", None), "portal", None)
+        member_id = getattr(portal, "member_id", None)
+    if not member_id:
+        raise ValueError("Не удалось определить member_id портала")
+    return member_id
+
+
+def get_portal_member_id(domain):
+    # member_id портала, на котором установлено приложение: под ним веб-запросы
+    # хранят локальные данные (сделки, индексы, итоги звонков).
+    try:
+        from integration_utils.bitrix24.models import BitrixPortal
+    except ImportError:
+        return None
+    portal = BitrixPortal.objects.filter(domain=domain).first()
+    return portal.member_id if portal else None
+
+
+def get_webhook_token(member_id=None):
+    # У входящего webhook нет member_id: он берется из --member-id,
+    # BITRIX_MEMBER_ID или записи портала с тем же доменом, что у webhook.
+    from integration_utils.bitrix24.bitrix_token import BitrixToken
+
+    webhook_url = os.getenv("BITRIX_WEBHOOK_URL")
+    if not webhook_url:
+        raise ValueError("BITRIX_WEBHOOK_URL not configured")
+
+    parsed = urlparse(webhook_url)
+    member_id = member_id or settings.BITRIX_MEMBER_ID or get_portal_member_id(parsed.netloc)
+    if not member_id:
+        raise ValueError(
+            f"Не удалось определить member_id портала {parsed.netloc}: "
+            "укажите --member-id или BITRIX_MEMBER_ID"
+        )
+
+    web_hook_auth = parsed.path.strip("/").removeprefix("rest/")
+    token = BitrixToken(domain=parsed.netloc, web_hook_auth=web_hook_auth)
+    token.member_id = member_id
+    return token
+
+
+def get_batch_error(result):
+    error = result.get("error") if result else "Нет ответа"
+    if not error:
+        return None
+    if isinstance(error, dict):
+        return error.get("error_description") or error.get("error") or "Неизвестная ошибка"
+    return str(error)
+
+
+def is_throttle_error(error):
+    if isinstance(error, dict):
+        error = f"{error.get('error', '')} {error.get('error_description', '')}"
+    return any(code in str(error or "") for code in THROTTLE_ERRORS)
@@ -0,0 +1,195 @@
+import threading
+import time
+from collections import OrderedDict
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.cache import caches
+from django.utils import timezone
+
+
+class MemoryBackend:
+    def __init__(self, max_entries):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            value, expires_at = entry
+            if expires_at <= time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key, value, ttl):
+        with self._lock:
+            self._entries[key] = (value, time.monotonic() + ttl)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def delete(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def delete_prefix(self, prefix):
+        with self._lock:
+            for key in [k for k in self._entries if k.startswith(prefix)]:
+                del self._entries[key]
+
+
+class DjangoCacheBackend:
+    # Вытеснение выполняет сам кеш Django (MAX_ENTRIES у locmem/db, LRU у memcached/redis).
+    # Ключи портала содержат номер его пространства имен: сброс увеличивает
+    # номер через cache.incr, и старые ключи больше не читаются, а со временем
+    # вытесняются. Начальный номер — время в наносекундах, чтобы после
+    # вытеснения самого счетчика не вернуться к прежним ключам.
+    def __init__(self, alias):
+        self.alias = alias
+
+    @property
+    def cache(self):
+        return caches[self.alias]
+
+    def get(self, key):
+        return self.cache.get(self._versioned_key(key))
+
+    def set(self, key, value, ttl):
+        self.cache.set(self._versioned_key(key), value, ttl)
+
+    def delete(self, key):
+        self.cache.delete(self._versioned_key(key))
+
+    def delete_prefix(self, prefix):
+        member_id = prefix.rstrip(":")
+        try:
+            self.cache.incr(self._namespace_key(member_id))
+        except ValueError:
+            # Счетчика нет: ключей с текущим номером тоже нет.
+            pass
+
+    def _versioned_key(self, key):
+        member_id, name = key.split(":", 1)
+        return f"metadata:{member_id}:{self._namespace(member_id)}:{name}"
+
+    def _namespace(self, member_id):
+        namespace_key = self._namespace_key(member_id)
+        namespace = self.cache.get(namespace_key)
+        if namespace is None:
+            self.cache.add(namespace_key, time.time_ns(), None)
+            namespace = self.cache.get(namespace_key)
+        return namespace
+
+    def _namespace_key(self, member_id):
+        return f"metadata-namespace:{member_id}"
+
+
+class DatabaseBackend:
+    def __init__(self, max_entries):
+        self.max_entries = max_entries
+
+    @property
+    def model(self):
+        from .models import MetadataCacheEntry
+
+        return MetadataCacheEntry
+
+    def get(self, key):
+        now = timezone.now()
+        entry = self.model.objects.filter(key=key).only("value", "expires_at").first()
+        if entry is None:
+            return None
+        if entry.expires_at <= now:
+            self.model.objects.filter(pk=entry.pk).delete()
+            return None
+        self.model.objects.filter(pk=entry.pk).update(accessed_at=now)
+        return entry.value
+
+    def set(self, key, value, ttl):
+        now = timezone.now()
+        self.model.objects.update_or_create(
+            key=key,
+            defaults={
+                "value": value,
+                "expires_at": now + timedelta(seconds=ttl),
+                "accessed_at": now,
+            },
+        )
+        self._prune()
+
+    def delete(self, key):
+        self.model.objects.filter(key=key).delete()
+
+    def delete_prefix(self, prefix):
+        self.model.objects.filter(key__startswith=prefix).delete()
+
+    def _prune(self):
+        stale_ids = self.model.objects.order_by("-accessed_at").values_list(
+            "pk", flat=True
+        )[self.max_entries:]
+        stale_ids = list(stale_ids)
+        if stale_ids:
+            self.model.objects.filter(pk__in=stale_ids).delete()
+
+
+class MetadataCache:
+    def __init__(self, backend, ttl):
+        self.backend = backend
+        self.ttl = ttl
+
+    def get(self, member_id, name):
+        return self.backend.get(self._key(member_id, name))
+
+    def set(self, member_id, name, value, ttl=None):
+        self.backend.set(self._key(member_id, name), value, ttl or self.ttl)
+
+    def get_or_load(self, member_id, name, loader, ttl=None):
+        value = self.get(member_id, name)
+        if value is None:
+            value = loader()
+            self.set(member_id, name, value, ttl)
+        return value
+
+    def invalidate(self, member_id, name=None):
+        if name:
+            self.backend.delete(self._key(member_id, name))
+        else:
+            self.backend.delete_prefix(f"{member_id}:")
+
+    def _key(self, member_id, name):
+        return f"{member_id}:{name}"
+
+
+_metadata_cache = None
+_metadata_cache_lock = threading.Lock()
+
+
+def build_backend(backend_name):
+    if backend_name == "memory":
+        return MemoryBackend(settings.METADATA_CACHE_MAX_ENTRIES)
+    if backend_name == "django":
+        return DjangoCacheBackend(settings.METADATA_CACHE_ALIAS)
+    if backend_name == "database":
+        return DatabaseBackend(settings.METADATA_CACHE_MAX_ENTRIES)
+    raise ValueError(f"Неизвестный бэкенд кеша метаданных: {backend_name}")
+
+
+def get_metadata_cache():
+    global _metadata_cache
+    if _metadata_cache is None:
+        with _metadata_cache_lock:
+            if _metadata_cache is None:
+                _metadata_cache = MetadataCache(
+                    build_backend(settings.METADATA_CACHE_BACKEND),
+                    settings.METADATA_CACHE_TTL,
+                )
+    return _metadata_cache
+
+
+def invalidate_portal_metadata(member_id, name=None):
+    get_metadata_cache().invalidate(member_id, name)
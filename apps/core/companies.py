@@ -0,0 +1,264 @@
+import logging
+import threading
+import time
+from collections import OrderedDict
+from datetime import timedelta
+
+from django.conf import settings
+from django.utils import timezone
+
+from .batch import PAGE_SIZE, chunked, iter_list_pages, run_batches
+from .bitrix import get_batch_error, get_member_id
+from .versions import bump_data_version, get_data_versions
+
+logger = logging.getLogger(__name__)
+
+WATERMARK_OVERLAP = timedelta(minutes=5)
+COMPANY_SELECT = ["ID", "TITLE"]
+# Версии справочника в базе: изменения компаний другие процессы догружают
+# по DATE_MODIFY, а удаления так не найти, поэтому после них справочник
+# собирается заново.
+COMPANY_VERSION_NAME = "companies"
+COMPANY_DELETE_VERSION_NAME = "companies-deleted"
+
+
+def normalize_title(title):
+    return " ".join(str(title or "").lower().split())
+
+
+class CompanyDirectory:
+    # Справочник компаний одного портала: ID -> название и нормализованное
+    # название -> ID. ID хранятся числами, строки названий общие для обоих
+    # индексов. complete=False, пока загружены только запрошенные по ID компании.
+    # watermark — момент, с которого справочник гарантированно актуален,
+    # versions — версии справочника в базе, с которыми он сверен.
+    def __init__(self, member_id):
+        self.member_id = member_id
+        self.titles = {}
+        self.ids_by_title = {}
+        self.complete = False
+        self.stale = False
+        self.watermark = None
+        self.refreshed_at = None
+        self.versions = None
+        self.lock = threading.RLock()
+
+    def reset(self):
+        self.titles.clear()
+        self.ids_by_title.clear()
+        self.complete = False
+        self.stale = False
+        self.watermark = None
+        self.refreshed_at = None
+
+    def __len__(self):
+        return len(self.titles)
+
+    def add(self, company):
+        company_id = int(company["ID"])
+        title = company.get("TITLE") or ""
+        self.forget(company_id)
+        self.titles[company_id] = title
+        if normalize_title(title):
+            self.ids_by_title[normalize_title(title)] = company_id
+
+    def forget(self, company_id):
+        title = self.titles.pop(int(company_id), None)
+        if title is not None and self.ids_by_title.get(normalize_title(title)) == int(company_id):
+            del self.ids_by_title[normalize_title(title)]
+
+
+_directories = OrderedDict()
+_directories_lock = threading.Lock()
+
+
+def get_company_directory(member_id):
+    with _directories_lock:
+        directory = _directories.get(member_id)
+        if directory is None:
+            directory = _directories[member_id] = CompanyDirectory(member_id)
+        _directories.move_to_end(member_id)
+        return directory
+
+
+def evict_company_directories():
+    # Общий лимит на все порталы: вытесняются справочники порталов, к которым
+    # дольше всего не обращались. Текущий (последний) портал не вытесняется.
+    with _directories_lock:
+        total = sum(len(directory) for directory in _directories.values())
+        while total > settings.COMPANY_DIRECTORY_MAX_ENTRIES and len(_directories) > 1:
+            member_id, directory = _directories.popitem(last=False)
+            total -= len(directory)
+            logger.info(f"Справочник компаний портала {member_id} вытеснен из памяти")
+
+
+def invalidate_company_directory(member_id, company_id=None, deleted=False):
+    version_name = COMPANY_DELETE_VERSION_NAME if deleted else COMPANY_VERSION_NAME
+    version = bump_data_version(member_id, version_name)
+    with _directories_lock:
+        directory = _directories.get(member_id)
+    if directory is None:
+        return
+    with directory.lock:
+        if company_id and deleted:
+            directory.forget(company_id)
+            # Удаление уже применено в этом процессе: если других событий
+            # между сверками не было, пересобирать справочник не нужно.
+            if directory.versions and directory.versions[1] == version - 1:
+                directory.versions = (directory.versions[0], version)
+        else:
+            directory.stale = True
+
+
+def handle_company_event(event, member_id, company_id):
+    invalidate_company_directory(
+        member_id, company_id=company_id, deleted=event == "ONCRMCOMPANYDELETE"
+    )
+
+
+class CompanyDirectoryService:
+    def __init__(self, bitrix_token, member_id=None):
+        self.but = bitrix_token
+        self.member_id = member_id or get_member_id(bitrix_token)
+        self.directory = get_company_directory(self.member_id)
+
+    def ensure_complete(self):
+        with self.directory.lock:
+            self.check_versions()
+            if not self.directory.complete:
+                self.load_all()
+            else:
+                self.refresh_if_due()
+        return self.directory
+
+    def get_title(self, company_id):
+        if not str(company_id).isdigit():
+            return None
+        return self.directory.titles.get(int(company_id))
+
+    def find_id(self, title):
+        company_id = self.directory.ids_by_title.get(normalize_title(title))
+        return str(company_id) if company_id is not None else None
+
+    def get_titles(self, company_ids):
+        # Неполный справочник догружает только недостающие ID: по 50 в команде
+        # crm.company.list и до 50 команд в batch-запросе.
+        with self.directory.lock:
+            self.check_versions()
+            if self.directory.refreshed_at is not None:
+                self.refresh_if_due()
+            missing = sorted(
+                {int(company_id) for company_id in company_ids} - self.directory.titles.keys()
+            )
+            if missing and not self.directory.complete:
+                self._load_ids(missing)
+            titles = {
+                str(company_id): self.directory.titles.get(int(company_id), "")
+                for company_id in company_ids
+            }
+        evict_company_directories()
+        return titles
+
+    def check_versions(self):
+        # События могли прийти в другой процесс: справочник сверяется с
+        # версиями в базе при каждом обращении.
+        directory = self.directory
+        versions = tuple(
+            get_data_versions(self.member_id, [COMPANY_VERSION_NAME, COMPANY_DELETE_VERSION_NAME])
+        )
+        if directory.versions is not None and versions != directory.versions:
+            if versions[1] != directory.versions[1]:
+                logger.info(f"Справочник компаний портала {self.member_id} сброшен после удаления компаний")
+                directory.reset()
+            else:
+                directory.stale = True
+        directory.versions = versions
+
+    def refresh_if_due(self):
+        interval = timedelta(seconds=settings.COMPANY_DIRECTORY_REFRESH_INTERVAL)
+        refreshed_at = self.directory.refreshed_at
+        if self.directory.stale or refreshed_at is None or timezone.now() - refreshed_at > interval:
+            self.refresh()
+
+    def load_all(self):
+        started_at = timezone.now()
+        started = time.monotonic()
+        directory = self.directory
+        with directory.lock:
+            directory.titles.clear()
+            directory.ids_by_title.clear()
+            directory.watermark = started_at
+            for company in iter_list_pages(
+                self.but,
+                "crm.company.list",
+                {"select": COMPANY_SELECT, "order": {"ID": "ASC"}},
+                member_id=self.member_id,
+            ):
+                directory.add(company)
+            directory.complete = True
+            directory.stale = False
+            directory.refreshed_at = started_at
+        logger.info(
+            f"Справочник компаний портала {self.member_id} загружен: {len(directory)} "
+            f"за {time.monotonic() - started:.1f} с"
+        )
+        evict_company_directories()
+
+    def refresh(self):
+        # Догружаются компании, измененные после начала прошлой загрузки
+        # (с запасом на расхождение часов с порталом). Удаления приходят событиями ONCRMCOMPANYDELETE.
+        directory = self.directory
+        with directory.lock:
+            started_at = timezone.now()
+            watermark = (directory.watermark or started_at) - WATERMARK_OVERLAP
+
+            last_id = 0
+            refreshed = 0
+            while True:
+                response = self.but.call_api_method(
+                    "crm.company.list",
+                    {
+                        "order": {"ID": "ASC"},
+                        "filter": {">ID": last_id, ">=DATE_MODIFY": watermark.isoformat()},
+                        "select": COMPANY_SELECT,
+                        "start": -1,
+                    },
+                )
+                page = response.get("result") or []
+                for company in page:
+                    directory.add(company)
+                refreshed += len(page)
+                if len(page) < PAGE_SIZE:
+                    break
+                last_id = max(int(company["ID"]) for company in page)
+
+            directory.stale = False
+            directory.refreshed_at = directory.watermark = started_at
+        if refreshed:
+            logger.info(f"Справочник компаний портала {self.member_id}: обновлено {refreshed}")
+
+    def _load_ids(self, company_ids):
+        commands = [
+            (
+                f"companies_{n}",
+                "crm.company.list",
+                {"filter": {"@ID": ids}, "select": COMPANY_SELECT, "start": -1},
+            )
+            for n, ids in enumerate(chunked(company_ids, PAGE_SIZE))
+        ]
+        result = run_batches(self.but, commands, member_id=self.member_id)
+        for cmd_id, _, params in commands:
+            res = result.get(cmd_id)
+            error = get_batch_error(res)
+            if error:
+                ids = params["filter"]["@ID"]
+                logger.error(f"Не удалось загрузить компании {ids[0]}..{ids[-1]}: {error}")
+                continue
+            for company in res.get("result") or []:
+                self.directory.add(company)
+            # Удаленные компании запоминаются с пустым названием, чтобы не
+            # запрашивать их повторно.
+            for company_id in params["filter"]["@ID"]:
+                self.directory.titles.setdefault(company_id, "")
+        if self.directory.refreshed_at is None:
+            self.directory.refreshed_at = self.directory.watermark = timezone.now()
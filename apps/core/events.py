@@ -0,0 +1,20 @@
+import logging
+
+logger = logging.getLogger(__name__)
+
+_handlers = []
+
+
+def register_event_handler(prefix, handler):
+    # Приложения подписываются на исходящие события Bitrix24 по префиксу имени
+    # события (например, ONCRMCOMPANY) в AppConfig.ready().
+    _handlers.append((prefix.upper(), handler))
+
+
+def dispatch_event(event, member_id, entity_id):
+    handled = False
+    for prefix, handler in _handlers:
+        if event.startswith(prefix):
+            handler(event, member_id, entity_id)
+            handled = True
+    return handled
@@ -0,0 +1,10 @@
+from django.utils.http import parse_etags
+
+
+def etag_matches(request, etag):
+    # If-None-Match сравнивается по целым тегам и без учета слабости
+    # (W/"x" совпадает с "x"); "*" совпадает с любой версией ресурса.
+    etags = parse_etags(request.headers.get("If-None-Match", ""))
+    if "*" in etags:
+        return True
+    return etag.removeprefix("W/") in {tag.removeprefix("W/") for tag in etags}
@@ -0,0 +1,30 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from apps.core.cache import invalidate_portal_metadata
+
+
+class Command(BaseCommand):
+    help = "Сбрасывает кеш метаданных (описания полей, стадии) для портала"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--member-id", type=str, required=True, help="member_id портала Bitrix24"
+        )
+        parser.add_argument(
+            "--name",
+            type=str,
+            help="Имя записи (например: crm.deal.fields). По умолчанию сбрасываются все записи портала",
+        )
+
+    def handle(self, *args, **options):
+        if settings.METADATA_CACHE_BACKEND == "memory":
+            self.stdout.write(
+                self.style.WARNING(
+                    "Бэкенд 'memory' хранит кеш в памяти каждого процесса: "
+                    "команда не затронет запущенный сервер."
+                )
+            )
+
+        invalidate_portal_metadata(options["member_id"], options.get("name"))
+        self.stdout.write(self.style.SUCCESS("Кеш метаданных сброшен"))
@@ -0,0 +1,34 @@
+# Generated by Django 4.2 on 2026-10-18 11:47
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    initial = True
+
+    dependencies = []
+
+    operations = [
+        migrations.CreateModel(
+            name="MetadataCacheEntry",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("key", models.CharField(max_length=255, unique=True)),
+                ("value", models.JSONField(default=dict)),
+                ("expires_at", models.DateTimeField()),
+                ("accessed_at", models.DateTimeField(db_index=True)),
+            ],
+            options={
+                "verbose_name": "Кеш метаданных портала",
+                "verbose_name_plural": "Кеш метаданных порталов",
+            },
+        ),
+    ]
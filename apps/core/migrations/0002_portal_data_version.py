@@ -0,0 +1,40 @@
+# Generated by Django 4.2 on 2026-10-18 12:45
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("core", "0001_initial"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="PortalDataVersion",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("member_id", models.CharField(max_length=50)),
+                ("name", models.CharField(max_length=50)),
+                ("version", models.PositiveBigIntegerField(default=0)),
+                ("updated_at", models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                "verbose_name": "Версия данных портала",
+                "verbose_name_plural": "Версии данных порталов",
+            },
+        ),
+        migrations.AddConstraint(
+            model_name="portaldataversion",
+            constraint=models.UniqueConstraint(
+                fields=("member_id", "name"), name="core_portal_data_version_unique"
+            ),
+        ),
+    ]
@@ -0,0 +1,34 @@
+from django.db import models
+
+
+class MetadataCacheEntry(models.Model):
+    key = models.CharField(max_length=255, unique=True)
+    value = models.JSONField(default=dict)
+    expires_at = models.DateTimeField()
+    accessed_at = models.DateTimeField(db_index=True)
+
+    class Meta:
+        verbose_name = "Кеш метаданных портала"
+        verbose_name_plural = "Кеш метаданных порталов"
+
+    def __str__(self):
+        return self.key
+
+
+class PortalDataVersion(models.Model):
+    member_id = models.CharField(max_length=50)
+    name = models.CharField(max_length=50)
+    version = models.PositiveBigIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        verbose_name = "Версия данных портала"
+        verbose_name_plural = "Версии данных порталов"
+        constraints = [
+            models.UniqueConstraint(
+                fields=["member_id", "name"], name="core_portal_data_version_unique"
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.member_id}:{self.name} v{self.version}"
@@ -0,0 +1,399 @@
+import os
+import threading
+import time
+import tracemalloc
+from unittest import mock, skipUnless
+
+from django.test import RequestFactory, SimpleTestCase, TestCase, override_settings
+
+from . import batch
+from .batch import chunked_iter, iter_list_pages, run_batches
+from .bitrix import get_batch_error
+from .cache import DjangoCacheBackend, MetadataCache
+from .companies import (
+    COMPANY_DELETE_VERSION_NAME,
+    COMPANY_VERSION_NAME,
+    CompanyDirectoryService,
+    handle_company_event,
+)
+from .http import etag_matches
+from .ratelimit import TokenBucket
+from .versions import bump_data_version
+
+THROTTLED = {"result": None, "error": {"error": "QUERY_LIMIT_EXCEEDED", "error_description": "Too many requests"}}
+
+
+class FakeBatchToken:
+    def __init__(self, responses):
+        self.responses = responses
+        self.calls = []
+
+    def batch_api_call(self, methods, halt=0):
+        self.calls.append([cmd_id for cmd_id, _, _ in methods])
+        response = self.responses(len(self.calls), methods)
+        if isinstance(response, Exception):
+            raise response
+        return response
+
+
+class FakePortalToken:
+    # Портал для замеров: задержка ответа и собственный лимит запросов
+    # (rate в секунду с запасом burst, как у Bitrix24); сверх лимита все
+    # команды запроса отклоняются QUERY_LIMIT_EXCEEDED.
+    def __init__(self, latency, rate, burst):
+        self.latency = latency
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.updated_at = time.monotonic()
+        self.requests = 0
+        self.throttled = 0
+        self.lock = threading.Lock()
+
+    def batch_api_call(self, methods, halt=0):
+        with self.lock:
+            now = time.monotonic()
+            self.tokens = min(self.burst, self.tokens + (now - self.updated_at) * self.rate)
+            self.updated_at = now
+            self.requests += 1
+            allowed = self.tokens >= 1
+            if allowed:
+                self.tokens -= 1
+        time.sleep(self.latency)
+        if not allowed:
+            self.throttled += 1
+            return {cmd_id: THROTTLED for cmd_id, _, _ in methods}
+        return {cmd_id: {"result": int(cmd_id.split("_")[1])} for cmd_id, _, _ in methods}
+
+
+class FakeListToken:
+    # latency — задержка ответа портала на один HTTP-запрос, для замеров.
+    def __init__(self, total, latency=0):
+        self.records = [{"ID": str(n)} for n in range(total)]
+        self.latency = latency
+        self.batch_calls = 0
+
+    def page(self, start):
+        return {"result": self.records[start:start + 50], "total": len(self.records)}
+
+    def call_api_method(self, method, params):
+        time.sleep(self.latency)
+        return self.page(params["start"])
+
+    def batch_api_call(self, methods, halt=0):
+        time.sleep(self.latency)
+        self.batch_calls += 1
+        return {cmd_id: self.page(params["start"]) for cmd_id, _, params in methods}
+
+
+class FakeCompanyToken:
+    # crm.company.list с фильтром по DATE_MODIFY — догрузка изменений,
+    # без него — полная загрузка (одна страница).
+    def __init__(self, companies):
+        self.companies = companies
+        self.calls = []
+
+    def call_api_method(self, method, params):
+        if ">=DATE_MODIFY" in params.get("filter", {}):
+            self.calls.append("refresh")
+            return {"result": []}
+        self.calls.append("load")
+        return {"result": list(self.companies), "total": len(self.companies)}
+
+    def batch_api_call(self, methods, halt=0):
+        self.calls.append("ids")
+        return {
+            cmd_id: {"result": [c for c in self.companies if int(c["ID"]) in params["filter"]["@ID"]]}
+            for cmd_id, _, params in methods
+        }
+
+
+@override_settings(COMPANY_DIRECTORY_REFRESH_INTERVAL=3600)
+class CompanyDirectoryVersionTests(TestCase):
+    def setUp(self):
+        self.member_id = f"test-companies-{self._testMethodName}"
+        self.token = FakeCompanyToken([{"ID": "1", "TITLE": "Ромашка"}, {"ID": "2", "TITLE": "Лютик"}])
+        self.service = CompanyDirectoryService(self.token, member_id=self.member_id)
+        self.service.ensure_complete()
+
+    def test_unchanged_directory_is_not_reloaded(self):
+        self.service.ensure_complete()
+        self.assertEqual(self.token.calls, ["load"])
+
+    def test_update_in_other_process_refreshes_directory(self):
+        bump_data_version(self.member_id, COMPANY_VERSION_NAME)
+        self.service.ensure_complete()
+        self.assertEqual(self.token.calls, ["load", "refresh"])
+
+    def test_delete_in_other_process_reloads_directory(self):
+        self.token.companies = self.token.companies[:1]
+        bump_data_version(self.member_id, COMPANY_DELETE_VERSION_NAME)
+
+        self.assertEqual(self.service.get_titles(["1", "2"]), {"1": "Ромашка", "2": ""})
+        self.service.ensure_complete()
+        self.assertEqual(self.token.calls, ["load", "ids", "load"])
+        self.assertIsNone(self.service.find_id("Лютик"))
+
+    def test_delete_in_this_process_is_applied_without_reload(self):
+        handle_company_event("ONCRMCOMPANYDELETE", self.member_id, "2")
+        self.service.ensure_complete()
+        self.assertEqual(self.token.calls, ["load"])
+        self.assertIsNone(self.service.find_id("Лютик"))
+
+
+class ChunkedIterTests(SimpleTestCase):
+    def test_splits_iterator_into_chunks(self):
+        self.assertEqual(list(chunked_iter(iter(range(7)), 3)), [[0, 1, 2], [3, 4, 5], [6]])
+
+    def test_exact_multiple_has_no_empty_tail(self):
+        self.assertEqual(list(chunked_iter(range(4), 2)), [[0, 1], [2, 3]])
+
+    def test_empty_iterable(self):
+        self.assertEqual(list(chunked_iter(iter([]), 3)), [])
+
+    def test_reads_source_lazily(self):
+        consumed = []
+
+        def source():
+            for n in range(10):
+                consumed.append(n)
+                yield n
+
+        chunks = chunked_iter(source(), 2)
+        self.assertEqual(next(chunks), [0, 1])
+        self.assertEqual(consumed, [0, 1])
+
+
+class DjangoCacheBackendTests(SimpleTestCase):
+    def setUp(self):
+        self.backend = DjangoCacheBackend("default")
+        self.cache = MetadataCache(self.backend, ttl=60)
+        self.backend.cache.clear()
+
+    def test_invalidate_portal_switches_namespace(self):
+        self.cache.set("portal-a", "crm.deal.fields", {"TITLE": {}})
+        self.cache.set("portal-a", "crm.status.list:DEAL_STAGE", {"NEW": "Новая"})
+        self.cache.set("portal-b", "crm.deal.fields", {"ID": {}})
+
+        self.cache.invalidate("portal-a")
+
+        self.assertIsNone(self.cache.get("portal-a", "crm.deal.fields"))
+        self.assertIsNone(self.cache.get("portal-a", "crm.status.list:DEAL_STAGE"))
+        self.assertEqual(self.cache.get("portal-b", "crm.deal.fields"), {"ID": {}})
+        self.cache.set("portal-a", "crm.deal.fields", {"NAME": {}})
+        self.assertEqual(self.cache.get("portal-a", "crm.deal.fields"), {"NAME": {}})
+
+    def test_invalidate_single_name(self):
+        self.cache.set("portal-a", "crm.deal.fields", {"TITLE": {}})
+        self.cache.set("portal-a", "crm.status.list:DEAL_STAGE", {"NEW": "Новая"})
+        self.cache.invalidate("portal-a", "crm.deal.fields")
+
+        self.assertIsNone(self.cache.get("portal-a", "crm.deal.fields"))
+        self.assertEqual(self.cache.get("portal-a", "crm.status.list:DEAL_STAGE"), {"NEW": "Новая"})
+
+    def test_evicted_counter_does_not_revive_old_values(self):
+        self.cache.set("portal-a", "crm.deal.fields", {"TITLE": {}})
+        self.backend.cache.delete("metadata-namespace:portal-a")
+
+        self.cache.invalidate("portal-a")
+        self.assertIsNone(self.cache.get("portal-a", "crm.deal.fields"))
+
+
+class EtagMatchesTests(SimpleTestCase):
+    def matches(self, header, etag='"abc-m-webp"'):
+        return etag_matches(RequestFactory().get("/", HTTP_IF_NONE_MATCH=header), etag)
+
+    def test_whole_tags_are_compared(self):
+        self.assertTrue(self.matches('"abc-m-webp"'))
+        self.assertTrue(self.matches('"other", W/"abc-m-webp"'))
+        self.assertFalse(self.matches('"abc-m-webp-2"'))
+        self.assertFalse(self.matches('"x-abc-m-webp"'))
+        self.assertFalse(self.matches('"abc"', etag='"ab"'))
+
+    def test_star_matches_any_version(self):
+        self.assertTrue(self.matches("*"))
+
+    def test_missing_or_malformed_header(self):
+        self.assertFalse(etag_matches(RequestFactory().get("/"), '"abc"'))
+        self.assertFalse(self.matches("abc-m-webp"))
+
+
+class GetBatchErrorTests(SimpleTestCase):
+    def test_successful_result(self):
+        self.assertIsNone(get_batch_error({"result": 5}))
+        self.assertIsNone(get_batch_error({"result": 5, "error": None}))
+
+    def test_missing_result(self):
+        self.assertEqual(get_batch_error(None), "Нет ответа")
+        self.assertEqual(get_batch_error({}), "Нет ответа")
+
+    def test_error_dict_prefers_description(self):
+        self.assertEqual(
+            get_batch_error({"error": {"error": "NOT_FOUND", "error_description": "Not found"}}),
+            "Not found",
+        )
+        self.assertEqual(get_batch_error({"error": {"error": "NOT_FOUND"}}), "NOT_FOUND")
+        self.assertEqual(get_batch_error({"error": {"code": 1}}), "Неизвестная ошибка")
+
+    def test_error_string(self):
+        self.assertEqual(get_batch_error({"result": None, "error": "ERROR_CORE"}), "ERROR_CORE")
+
+
+@override_settings(BITRIX_RATE_LIMIT=1000)
+class IterListPagesTests(SimpleTestCase):
+    def test_reads_all_pages_in_order(self):
+        token = FakeListToken(2520)
+        records = list(iter_list_pages(token, "crm.company.list", member_id="test-pages"))
+        self.assertEqual([r["ID"] for r in records], [str(n) for n in range(2520)])
+        # 51 страница: первая отдельным запросом, остальные 50 одним batch-запросом.
+        self.assertEqual(token.batch_calls, 1)
+
+    def test_single_page_needs_no_batch(self):
+        token = FakeListToken(30)
+        self.assertEqual(len(list(iter_list_pages(token, "crm.company.list", member_id="test-pages"))), 30)
+        self.assertEqual(token.batch_calls, 0)
+
+    def test_page_error_raises(self):
+        token = FakeListToken(120)
+        token.batch_api_call = lambda methods, halt=0: {
+            cmd_id: {"result": None, "error": "ACCESS_DENIED"} for cmd_id, _, _ in methods
+        }
+        with self.assertRaisesMessage(ValueError, "ACCESS_DENIED"):
+            list(iter_list_pages(token, "crm.company.list", member_id="test-pages"))
+
+
+@skipUnless(os.getenv("BENCHMARK"), "замеры запускаются с BENCHMARK=1")
+@override_settings(BITRIX_RATE_LIMIT=2)
+class IterListPagesBenchmark(SimpleTestCase):
+    # Замер, а не проверка: 50 000 компаний с портала с задержкой ответа
+    # 200 мс при лимите 2 запроса в секунду. Записи не копятся в списке,
+    # поэтому пик памяти — одна пачка из 50 страниц.
+    def test_50k_companies(self):
+        token = FakeListToken(50000, latency=0.2)
+        for record in token.records:
+            record["TITLE"] = f"Компания {record['ID']}"
+
+        tracemalloc.start()
+        started = time.monotonic()
+        count = sum(1 for _ in iter_list_pages(token, "crm.company.list", member_id="benchmark-pages"))
+        elapsed = time.monotonic() - started
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+
+        print(
+            f"\niter_list_pages: {count} записей за {elapsed:.1f} с, "
+            f"HTTP-запросов {token.batch_calls + 1} (постранично было бы {count // 50}), "
+            f"пик памяти {peak / 1024:.0f} КБ"
+        )
+        self.assertEqual(count, 50000)
+
+
+@skipUnless(os.getenv("BENCHMARK"), "замеры запускаются с BENCHMARK=1")
+@override_settings(BITRIX_RATE_LIMIT=2)
+class RunBatchesBenchmark(SimpleTestCase):
+    # Контактов в секунду при создании 2500 контактов batch-запросами:
+    # портал отвечает на batch за секунду и пропускает 2 запроса в секунду
+    # с запасом 10. При лимите приложения 2 запроса в секунду один поток
+    # упирается в задержку ответа, несколько — в лимит. Последний замер —
+    # портал строже лимита приложения: отклоненные команды повторяются,
+    # а скорость снижается.
+    def test_contacts_per_second(self):
+        commands = [(f"contact_{n}", "crm.contact.add", {"fields": {"NAME": str(n)}}) for n in range(2500)]
+        for workers, portal_rate in ((1, 2), (2, 2), (4, 2), (4, 1)):
+            token = FakePortalToken(latency=1, rate=portal_rate, burst=10)
+            started = time.monotonic()
+            with mock.patch.object(batch, "BATCH_RETRY_DELAY", 0.5):
+                result = run_batches(
+                    token, commands, max_workers=workers, member_id=f"benchmark-batches-{workers}-{portal_rate}"
+                )
+            elapsed = time.monotonic() - started
+
+            print(
+                f"\nrun_batches, потоков {workers}, портал {portal_rate} запр/с: "
+                f"{len(commands) / elapsed:.0f} контактов/с, запросов {token.requests}, "
+                f"отклонено порталом {token.throttled}"
+            )
+            self.assertEqual(sum(1 for res in result.values() if res.get("result") is not None), len(commands))
+
+
+class TokenBucketTests(SimpleTestCase):
+    def test_acquire_uses_capacity_without_waiting(self):
+        bucket = TokenBucket(rate=2, capacity=3)
+        with mock.patch("apps.core.ratelimit.time.sleep") as sleep:
+            for _ in range(3):
+                bucket.acquire()
+        sleep.assert_not_called()
+
+    def test_acquire_waits_when_empty(self):
+        bucket = TokenBucket(rate=2, capacity=1)
+        bucket.acquire()
+        with mock.patch("apps.core.ratelimit.time.sleep", side_effect=lambda wait: setattr(
+            bucket, "_tokens", 1
+        )) as sleep:
+            bucket.acquire()
+        self.assertEqual(sleep.call_count, 1)
+        self.assertAlmostEqual(sleep.call_args[0][0], 0.5, places=1)
+
+    def test_slow_down_halves_rate_down_to_minimum(self):
+        bucket = TokenBucket(rate=16)
+        bucket.slow_down()
+        self.assertEqual(bucket.rate, 8)
+        for _ in range(10):
+            bucket.slow_down()
+        self.assertEqual(bucket.rate, 1)
+
+    def test_speed_up_restores_rate_up_to_maximum(self):
+        bucket = TokenBucket(rate=10)
+        bucket.slow_down()
+        bucket.speed_up()
+        self.assertEqual(bucket.rate, 6)
+        for _ in range(10):
+            bucket.speed_up()
+        self.assertEqual(bucket.rate, 10)
+
+
+@override_settings(BITRIX_RATE_LIMIT=1000, BITRIX_BATCH_CONCURRENCY=2)
+@mock.patch.object(batch, "BATCH_RETRY_DELAY", 0)
+class RunBatchesTests(SimpleTestCase):
+    def commands(self, count):
+        return [(f"cmd_{n}", "crm.deal.add", {"fields": {"TITLE": str(n)}}) for n in range(count)]
+
+    def test_splits_commands_into_batches_of_50(self):
+        token = FakeBatchToken(
+            lambda call, methods: {cmd_id: {"result": 1} for cmd_id, _, _ in methods}
+        )
+        result = run_batches(token, self.commands(120), member_id="test-split")
+        self.assertEqual(sorted(len(ids) for ids in token.calls), [20, 50, 50])
+        self.assertEqual(len(result), 120)
+
+    def test_retries_only_throttled_commands(self):
+        def responses(call, methods):
+            if call == 1:
+                return {"cmd_0": {"result": 1}, "cmd_1": THROTTLED, "cmd_2": {"result": None, "error": "ERROR"}}
+            return {cmd_id: {"result": 2} for cmd_id, _, _ in methods}
+
+        token = FakeBatchToken(responses)
+        result = run_batches(token, self.commands(3), member_id="test-retry")
+        self.assertEqual(token.calls, [["cmd_0", "cmd_1", "cmd_2"], ["cmd_1"]])
+        self.assertEqual(result["cmd_1"], {"result": 2})
+        self.assertEqual(result["cmd_2"]["error"], "ERROR")
+
+    def test_stops_after_max_retries(self):
+        token = FakeBatchToken(lambda call, methods: {cmd_id: THROTTLED for cmd_id, _, _ in methods})
+        with self.assertLogs("apps.core.batch", "WARNING") as logs:
+            result = run_batches(token, self.commands(1), member_id="test-exhausted")
+        self.assertEqual(len(token.calls), batch.BATCH_MAX_RETRIES + 1)
+        self.assertEqual(result["cmd_0"], THROTTLED)
+        self.assertIn("повторы исчерпаны", logs.output[-1])
+        self.assertNotIn(f"повтор {batch.BATCH_MAX_RETRIES + 1}", "".join(logs.output))
+
+    def test_failed_request_keeps_other_results(self):
+        def responses(call, methods):
+            if methods[0][0] == "cmd_0":
+                return ConnectionError("timeout")
+            return {cmd_id: {"result": 1} for cmd_id, _, _ in methods}
+
+        token = FakeBatchToken(responses)
+        result = run_batches(token, self.commands(60), member_id="test-failure")
+        self.assertEqual(result["cmd_0"]["error"]["error_description"], "timeout")
+        self.assertEqual(result["cmd_59"], {"result": 1})
@@ -0,0 +1,36 @@
+from django.db import IntegrityError, transaction
+from django.db.models import F
+from django.utils import timezone
+
+from .models import PortalDataVersion
+
+
+# Версии данных портала, общие для всех процессов: обработчик события
+# увеличивает версию, а процессы, у которых в памяти собраны данные по
+# старой версии, пересобирают их при следующем обращении.
+def get_data_versions(member_id, names):
+    versions = dict(
+        PortalDataVersion.objects.filter(member_id=member_id, name__in=names).values_list(
+            "name", "version"
+        )
+    )
+    return [versions.get(name, 0) for name in names]
+
+
+def get_data_version(member_id, name):
+    return get_data_versions(member_id, [name])[0]
+
+
+def bump_data_version(member_id, name):
+    updated = PortalDataVersion.objects.filter(member_id=member_id, name=name).update(
+        version=F("version") + 1, updated_at=timezone.now()
+    )
+    if updated:
+        return get_data_version(member_id, name)
+    try:
+        with transaction.atomic():
+            PortalDataVersion.objects.create(member_id=member_id, name=name, version=1)
+        return 1
+    except IntegrityError:
+        # Запись одновременно создал другой процесс.
+        return bump_data_version(member_id, name)
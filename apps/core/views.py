@@ -0,0 +1,36 @@
+import logging
+
+from django.conf import settings
+from django.http import JsonResponse
+from django.views.decorators.csrf import csrf_exempt
+from django.views.decorators.http import require_POST
+
+from .events import dispatch_event
+
+logger = logging.getLogger(__name__)
+
+
+@csrf_exempt
+@require_POST
+def bitrix_event(request):
+    # Обработчик исходящих событий Bitrix24: сбрасывает локальные справочники
+    # портала (компании, структура компании), см. register_event_handler.
+    event = request.POST.get("event", "").upper()
+    member_id = request.POST.get("auth[member_id]")
+    application_token = request.POST.get("auth[application_token]")
+
+    if not settings.BITRIX_APPLICATION_TOKEN:
+        logger.warning(f"Событие {event} отклонено: BITRIX_APPLICATION_TOKEN не настроен")
+        return JsonResponse({"error": "Прием событий не настроен"}, status=403)
+    if application_token != settings.BITRIX_APPLICATION_TOKEN:
+        logger.warning(f"Событие {event} с неверным application_token отклонено")
+        return JsonResponse({"error": "Неверный application_token"}, status=403)
+    if not member_id:
+        return JsonResponse({"error": "Не указан member_id"}, status=400)
+
+    entity_id = request.POST.get("data[FIELDS][ID]")
+    if dispatch_event(event, member_id, entity_id):
+        logger.info(f"Событие {event} портала {member_id} обработано")
+    else:
+        logger.info(f"Событие {event} портала {member_id} пропущено: нет обработчика")
+    return JsonResponse({"status": "ok"})
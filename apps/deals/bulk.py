@@ -0,0 +1,187 @@
+import csv
+import io
+import json
+import logging
+
+from django.conf import settings
+
+from apps.core.batch import run_batches
+from apps.core.bitrix import get_batch_error
+from .outbox import DealOutboxService
+from .services import DealMetadataService
+from .sync import DealSyncService
+
+logger = logging.getLogger(__name__)
+
+COLUMN_ALIASES = {
+    "название": "TITLE",
+    "title": "TITLE",
+    "сумма": "OPPORTUNITY",
+    "opportunity": "OPPORTUNITY",
+    "amount": "OPPORTUNITY",
+    "валюта": "CURRENCY_ID",
+    "currency": "CURRENCY_ID",
+    "стадия": "STAGE_ID",
+    "stage": "STAGE_ID",
+    "источник": "LEAD_SOURCE",
+    "источник лида": "LEAD_SOURCE",
+    "source": "LEAD_SOURCE",
+}
+
+MAX_ROWS = 10000
+
+
+class DealBulkService:
+    def __init__(self, bitrix_token, member_id=None):
+        self.but = bitrix_token
+        self.metadata = DealMetadataService(bitrix_token, member_id=member_id)
+        self.sync_service = DealSyncService(
+            bitrix_token, member_id=self.metadata.member_id
+        )
+
+    def parse_file(self, file):
+        name = file.name.lower()
+        if name.endswith(".csv"):
+            rows = list(csv.DictReader(io.TextIOWrapper(file, encoding="utf-8-sig", newline="")))
+        elif name.endswith(".json"):
+            rows = json.load(io.TextIOWrapper(file, encoding="utf-8-sig"))
+            if not isinstance(rows, list) or not all(isinstance(r, dict) for r in rows):
+                raise ValueError("JSON-файл должен содержать список объектов сделок.")
+        else:
+            raise ValueError("Неподдерживаемый формат файла. Пожалуйста, используйте CSV или JSON.")
+
+        if not rows:
+            raise ValueError("Файл не содержит сделок.")
+        if len(rows) > MAX_ROWS:
+            raise ValueError(f"Слишком много строк: {len(rows)}. Максимум за одну загрузку: {MAX_ROWS}.")
+        return rows
+
+    def prepare_batch_commands(self, rows):
+        schema = self.metadata.get_deal_fields()
+        stage_names = self.metadata.get_stage_names()
+
+        batch_cmds = []
+        invalid_details = []
+        for i, row in enumerate(rows):
+            fields, errors = self.validate_row(row, schema, stage_names)
+            if errors:
+                invalid_details.append(
+                    f"Строка {i + 2}: Сделка '{fields.get('TITLE', '')}' не создана - {'; '.join(errors)}"
+                )
+                continue
+            batch_cmds.append((f"row_{i}", "crm.deal.add", {"fields": fields}))
+
+        return batch_cmds, invalid_details
+
+    def validate_row(self, row, schema, stage_names):
+        fields = {
+            "STAGE_ID": settings.DEFAULT_STAGE,
+            "CURRENCY_ID": settings.DEFAULT_CURRENCY,
+        }
+        errors = []
+
+        for column, value in row.items():
+            if column is None:
+                continue
+            code = COLUMN_ALIASES.get(column.lower().strip(), column.strip().upper())
+            if code == "LEAD_SOURCE":
+                code = settings.CUSTOM_FIELD_NAME
+            if value is None or str(value).strip() == "":
+                continue
+            value = str(value).strip() if not isinstance(value, (int, float)) else value
+
+            field_info = schema.get(code)
+            if field_info is None:
+                errors.append(f"неизвестное поле '{column}'")
+                continue
+            if field_info.get("isReadOnly"):
+                errors.append(f"поле '{column}' доступно только для чтения")
+                continue
+
+            try:
+                fields[code] = self._convert_value(code, value, field_info, stage_names)
+            except ValueError as e:
+                errors.append(f"поле '{column}': {e}")
+
+        if not fields.get("TITLE"):
+            errors.append("не указано название сделки")
+        for code, field_info in schema.items():
+            if field_info.get("isRequired") and code not in fields:
+                errors.append(f"не заполнено обязательное поле '{field_info.get('title', code)}'")
+
+        return fields, errors
+
+    def _convert_value(self, code, value, field_info, stage_names):
+        field_type = field_info.get("type")
+        if field_type in ("double", "money"):
+            try:
+                return float(str(value).replace(",", ".").replace(" ", ""))
+            except ValueError:
+                raise ValueError("должно быть числом")
+        if field_type == "integer":
+            # int() отбросил бы дробную часть у чисел из JSON: 1.5 -> 1.
+            if isinstance(value, float) and not value.is_integer():
+                raise ValueError("должно быть целым числом")
+            try:
+                return int(value)
+            except ValueError:
+                raise ValueError("должно быть целым числом")
+        if field_type == "char" and value in ("Y", "N", "y", "n"):
+            return value.upper()
+        if field_type == "enumeration":
+            for item in field_info.get("items") or []:
+                if str(value) == str(item.get("ID")) or str(value).lower() == str(item.get("VALUE", "")).lower():
+                    return item["ID"]
+            raise ValueError(f"недопустимое значение '{value}'")
+        if code == "STAGE_ID" and stage_names:
+            if value in stage_names:
+                return value
+            for stage_id, stage_name in stage_names.items():
+                if str(value).lower() == stage_name.lower():
+                    return stage_id
+            raise ValueError(f"неизвестная стадия '{value}'")
+        return value
+
+    def create_deals(self, rows):
+        batch_cmds, invalid_details = self.prepare_batch_commands(rows)
+        result = run_batches(self.but, batch_cmds, member_id=self.metadata.member_id)
+        success_details, error_details = self.process_batch_results(result, batch_cmds)
+        return success_details, invalid_details + error_details
+
+    def enqueue_deals(self, rows, upload_key):
+        # Проверенные строки ставятся в очередь создания сделок и отправляются
+        # в фоне. Ключ идемпотентности строки — ключ загрузки и номер строки:
+        # повторная отправка того же файла из формы не создает дублей.
+        batch_cmds, invalid_details = self.prepare_batch_commands(rows)
+        outbox = DealOutboxService(self.but, member_id=self.metadata.member_id)
+        outbox.enqueue_many(
+            [(f"{upload_key}:{cmd_id}", params["fields"]) for cmd_id, _, params in batch_cmds]
+        )
+        outbox.flush_in_background()
+        return len(batch_cmds), invalid_details
+
+    def process_batch_results(self, result, batch_cmds):
+        success_details = []
+        error_details = []
+        created = []
+        fields_by_cmd = {cmd_id: params["fields"] for cmd_id, _, params in batch_cmds}
+        if result:
+            for cmd_id, res in sorted(result.items(), key=lambda item: int(item[0].split("_")[1])):
+                index = int(cmd_id.split("_")[1])
+                row_num = index + 2
+                title = fields_by_cmd.get(cmd_id, {}).get("TITLE", "")
+
+                error_msg = get_batch_error(res)
+                if error_msg is None:
+                    success_details.append(
+                        f"Строка {row_num}: Сделка '{title}' успешно создана (ID: {res.get('result')})."
+                    )
+                    created.append((res.get("result"), fields_by_cmd[cmd_id]))
+                else:
+                    error_details.append(
+                        f"Строка {row_num}: Ошибка при создании сделки '{title}' - {error_msg}"
+                    )
+
+        if created:
+            self.sync_service.save_created_deals(created)
+        return success_details, error_details
@@ -0,0 +1,52 @@
+import json
+import time
+
+from django.core.management.base import BaseCommand
+
+from apps.core.bitrix import get_webhook_token
+from apps.deals.outbox import DealOutboxService
+
+
+class Command(BaseCommand):
+    help = "Отправляет сделки из локальной очереди в Bitrix24 batch-запросами по 50 команд"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--member-id",
+            type=str,
+            help="member_id портала (по умолчанию BITRIX_MEMBER_ID или портал, установивший приложение, с доменом webhook)",
+        )
+        parser.add_argument(
+            "--loop", action="store_true", help="Работать постоянно, опрашивая очередь"
+        )
+        parser.add_argument(
+            "--interval", type=int, default=5, help="Пауза между опросами очереди, сек"
+        )
+        parser.add_argument(
+            "--stats", action="store_true", help="Показать состояние очереди и выйти"
+        )
+
+    def handle(self, *args, **options):
+        try:
+            token = get_webhook_token(options.get("member_id"))
+        except ValueError as e:
+            self.stdout.write(self.style.ERROR(str(e)))
+            return
+
+        service = DealOutboxService(token, member_id=options.get("member_id"))
+
+        if options["stats"]:
+            self.stdout.write(json.dumps(service.get_stats(), ensure_ascii=False, indent=2))
+            return
+
+        while True:
+            total = service.flush()
+            if total["sent"] or total["failed"] or total["retried"]:
+                self.stdout.write(
+                    f"Отправлено: {total['sent']}, ошибок: {total['failed']}, повторов: {total['retried']}"
+                )
+            if not options["loop"]:
+                break
+            time.sleep(options["interval"])
+
+        self.stdout.write(self.style.SUCCESS("Готово!"))
@@ -0,0 +1,46 @@
+from django.core.management.base import BaseCommand
+
+from apps.core.bitrix import get_webhook_token
+from apps.deals.bulk import DealBulkService
+
+
+class Command(BaseCommand):
+    help = "Создает сделки в Bitrix24 из CSV или JSON файла batch-запросами по 50 команд"
+
+    def add_arguments(self, parser):
+        parser.add_argument("path", type=str, help="Путь к CSV или JSON файлу")
+        parser.add_argument(
+            "--member-id",
+            type=str,
+            help="member_id портала (по умолчанию BITRIX_MEMBER_ID или портал, установивший приложение, с доменом webhook)",
+        )
+
+    def handle(self, *args, **options):
+        try:
+            token = get_webhook_token(options.get("member_id"))
+        except ValueError as e:
+            self.stdout.write(self.style.ERROR(str(e)))
+            return
+
+        service = DealBulkService(token, member_id=options.get("member_id"))
+
+        with open(options["path"], "rb") as file:
+            try:
+                rows = service.parse_file(file)
+            except ValueError as e:
+                self.stdout.write(self.style.ERROR(str(e)))
+                return
+
+        self.stdout.write(f"Создание {len(rows)} сделок...")
+        success_details, error_details = service.create_deals(rows)
+
+        for detail in success_details:
+            self.stdout.write(f"  {detail}")
+        for detail in error_details:
+            self.stdout.write(self.style.WARNING(f"  {detail}"))
+
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"\nГотово! Создано: {len(success_details)}, Ошибок: {len(error_details)}"
+            )
+        )
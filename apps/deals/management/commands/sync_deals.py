@@ -0,0 +1,34 @@
+from django.core.management.base import BaseCommand
+
+from apps.core.bitrix import get_webhook_token
+from apps.deals.sync import DealSyncService
+
+
+class Command(BaseCommand):
+    help = "Синхронизирует локальное зеркало сделок с Bitrix24 по DATE_MODIFY"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--member-id",
+            type=str,
+            help="member_id портала (по умолчанию BITRIX_MEMBER_ID или портал, установивший приложение, с доменом webhook)",
+        )
+        parser.add_argument(
+            "--full",
+            action="store_true",
+            help="Полная синхронизация с удалением сделок, отсутствующих в Bitrix24",
+        )
+
+    def handle(self, *args, **options):
+        try:
+            token = get_webhook_token(options.get("member_id"))
+        except ValueError as e:
+            self.stdout.write(self.style.ERROR(str(e)))
+            return
+
+        service = DealSyncService(token, member_id=options.get("member_id"))
+        self.stdout.write(f"Синхронизация сделок портала {service.member_id}...")
+
+        synced = service.sync(full=options["full"])
+
+        self.stdout.write(self.style.SUCCESS(f"Готово! Синхронизировано сделок: {synced}"))
@@ -0,0 +1,100 @@
+# Generated by Django 4.2 on 2026-10-18 11:49
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    initial = True
+
+    dependencies = []
+
+    operations = [
+        migrations.CreateModel(
+            name="Deal",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("member_id", models.CharField(max_length=50)),
+                ("bitrix_id", models.PositiveBigIntegerField()),
+                ("title", models.CharField(blank=True, max_length=255)),
+                ("stage_id", models.CharField(blank=True, max_length=50)),
+                (
+                    "opportunity",
+                    models.DecimalField(decimal_places=2, default=0, max_digits=18),
+                ),
+                ("currency_id", models.CharField(blank=True, max_length=10)),
+                ("lead_source", models.CharField(blank=True, max_length=100)),
+                ("closed", models.BooleanField(default=False)),
+                ("date_create", models.DateTimeField(blank=True, null=True)),
+                ("date_modify", models.DateTimeField(blank=True, null=True)),
+                ("synced_at", models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                "verbose_name": "Сделка",
+                "verbose_name_plural": "Сделки",
+                "ordering": ["-date_create"],
+            },
+        ),
+        migrations.CreateModel(
+            name="DealSyncState",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("member_id", models.CharField(max_length=50, unique=True)),
+                ("last_date_modify", models.DateTimeField(blank=True, null=True)),
+                ("last_synced_at", models.DateTimeField(blank=True, null=True)),
+                ("last_full_sync_at", models.DateTimeField(blank=True, null=True)),
+            ],
+            options={
+                "verbose_name": "Состояние синхронизации сделок",
+                "verbose_name_plural": "Состояния синхронизации сделок",
+            },
+        ),
+        migrations.AddIndex(
+            model_name="deal",
+            index=models.Index(
+                fields=["member_id", "closed", "-date_create"],
+                name="deals_deal_open_created_idx",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="deal",
+            index=models.Index(
+                fields=["member_id", "closed", "stage_id", "-date_create"],
+                name="deals_deal_open_stage_idx",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="deal",
+            index=models.Index(
+                fields=["member_id", "closed", "-opportunity"],
+                name="deals_deal_open_amount_idx",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="deal",
+            index=models.Index(
+                fields=["member_id", "synced_at"], name="deals_deal_synced_idx"
+            ),
+        ),
+        migrations.AddConstraint(
+            model_name="deal",
+            constraint=models.UniqueConstraint(
+                fields=("member_id", "bitrix_id"), name="deals_deal_member_bitrix_uniq"
+            ),
+        ),
+    ]
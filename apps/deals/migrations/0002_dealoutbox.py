@@ -0,0 +1,69 @@
+# Generated by Django 4.2 on 2026-10-18 11:51
+
+from django.db import migrations, models
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("deals", "0001_initial"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="DealOutbox",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("member_id", models.CharField(max_length=50)),
+                ("idempotency_key", models.CharField(max_length=64, unique=True)),
+                ("fields", models.JSONField(default=dict)),
+                (
+                    "status",
+                    models.CharField(
+                        choices=[
+                            ("pending", "В очереди"),
+                            ("sent", "Отправлена"),
+                            ("failed", "Ошибка"),
+                        ],
+                        default="pending",
+                        max_length=10,
+                    ),
+                ),
+                ("deal_id", models.PositiveBigIntegerField(blank=True, null=True)),
+                ("attempts", models.PositiveIntegerField(default=0)),
+                ("last_error", models.TextField(blank=True)),
+                ("created_at", models.DateTimeField(auto_now_add=True)),
+                (
+                    "next_attempt_at",
+                    models.DateTimeField(default=django.utils.timezone.now),
+                ),
+                ("sent_at", models.DateTimeField(blank=True, null=True)),
+            ],
+            options={
+                "verbose_name": "Сделка в очереди",
+                "verbose_name_plural": "Очередь создания сделок",
+                "ordering": ["created_at"],
+            },
+        ),
+        migrations.AddIndex(
+            model_name="dealoutbox",
+            index=models.Index(
+                fields=["status", "next_attempt_at"], name="deals_outbox_due_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="dealoutbox",
+            index=models.Index(
+                fields=["member_id", "status", "created_at"],
+                name="deals_outbox_member_idx",
+            ),
+        ),
+    ]
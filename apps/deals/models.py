@@ -0,0 +1,101 @@
+from django.db import models
+from django.utils import timezone
+
+
+class Deal(models.Model):
+    member_id = models.CharField(max_length=50)
+    bitrix_id = models.PositiveBigIntegerField()
+    title = models.CharField(max_length=255, blank=True)
+    stage_id = models.CharField(max_length=50, blank=True)
+    opportunity = models.DecimalField(max_digits=18, decimal_places=2, default=0)
+    currency_id = models.CharField(max_length=10, blank=True)
+    lead_source = models.CharField(max_length=100, blank=True)
+    closed = models.BooleanField(default=False)
+    date_create = models.DateTimeField(null=True, blank=True)
+    date_modify = models.DateTimeField(null=True, blank=True)
+    synced_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        ordering = ["-date_create"]
+        verbose_name = "Сделка"
+        verbose_name_plural = "Сделки"
+        constraints = [
+            models.UniqueConstraint(
+                fields=["member_id", "bitrix_id"], name="deals_deal_member_bitrix_uniq"
+            ),
+        ]
+        indexes = [
+            models.Index(
+                fields=["member_id", "closed", "-date_create"],
+                name="deals_deal_open_created_idx",
+            ),
+            models.Index(
+                fields=["member_id", "closed", "stage_id", "-date_create"],
+                name="deals_deal_open_stage_idx",
+            ),
+            models.Index(
+                fields=["member_id", "closed", "-opportunity"],
+                name="deals_deal_open_amount_idx",
+            ),
+            models.Index(
+                fields=["member_id", "synced_at"], name="deals_deal_synced_idx"
+            ),
+        ]
+
+    def __str__(self):
+        return f"Deal #{self.bitrix_id} ({self.member_id})"
+
+
+class DealSyncState(models.Model):
+    member_id = models.CharField(max_length=50, unique=True)
+    last_date_modify = models.DateTimeField(null=True, blank=True)
+    last_synced_at = models.DateTimeField(null=True, blank=True)
+    last_full_sync_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        verbose_name = "Состояние синхронизации сделок"
+        verbose_name_plural = "Состояния синхронизации сделок"
+
+    def __str__(self):
+        return f"Deal sync for {self.member_id}"
+
+
+class DealOutbox(models.Model):
+    STATUS_PENDING = "pending"
+    STATUS_SENT = "sent"
+    STATUS_FAILED = "failed"
+    STATUS_CHOICES = [
+        (STATUS_PENDING, "В очереди"),
+        (STATUS_SENT, "Отправлена"),
+        (STATUS_FAILED, "Ошибка"),
+    ]
+
+    member_id = models.CharField(max_length=50)
+    idempotency_key = models.CharField(max_length=64, unique=True)
+    fields = models.JSONField(default=dict)
+    status = models.CharField(
+        max_length=10, choices=STATUS_CHOICES, default=STATUS_PENDING
+    )
+    deal_id = models.PositiveBigIntegerField(null=True, blank=True)
+    attempts = models.PositiveIntegerField(default=0)
+    last_error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    next_attempt_at = models.DateTimeField(default=timezone.now)
+    sent_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        ordering = ["created_at"]
+        verbose_name = "Сделка в очереди"
+        verbose_name_plural = "Очередь создания сделок"
+        indexes = [
+            models.Index(
+                fields=["status", "next_attempt_at"], name="deals_outbox_due_idx"
+            ),
+            models.Index(
+                fields=["member_id", "status", "created_at"],
+                name="deals_outbox_member_idx",
+            ),
+        ]
+
+    def __str__(self):
+        return f"Outbox {self.idempotency_key} ({self.status})"
@@ -0,0 +1,236 @@
+import logging
+import threading
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Avg, Count, F, Max, Min, Sum
+from django.utils import timezone
+
+from apps.core.background import run_in_background
+from apps.core.batch import BATCH_SIZE
+from apps.core.bitrix import get_batch_error, get_member_id
+from .models import DealOutbox
+from .sync import DealSyncService
+
+logger = logging.getLogger(__name__)
+
+ORIGINATOR_ID = "deal_management"
+CLAIM_TIMEOUT = timedelta(minutes=5)
+RETRY_BASE_DELAY = 10
+
+_flush_metrics = {}
+_flush_metrics_lock = threading.Lock()
+
+
+def record_flush(member_id, duration, sent, failed, retried):
+    with _flush_metrics_lock:
+        metrics = _flush_metrics.setdefault(
+            member_id, {"flushes": 0, "sent": 0, "failed": 0, "retried": 0}
+        )
+        metrics["flushes"] += 1
+        metrics["sent"] += sent
+        metrics["failed"] += failed
+        metrics["retried"] += retried
+        metrics["last_flush_seconds"] = round(duration, 3)
+        metrics["max_flush_seconds"] = max(
+            metrics.get("max_flush_seconds", 0), round(duration, 3)
+        )
+        metrics["last_flush_at"] = timezone.now().isoformat()
+
+
+class DealOutboxService:
+    def __init__(self, bitrix_token, member_id=None):
+        self.but = bitrix_token
+        self.member_id = member_id or get_member_id(bitrix_token)
+        self.sync_service = DealSyncService(bitrix_token, member_id=self.member_id)
+
+    def enqueue(self, fields, idempotency_key):
+        entry, created = DealOutbox.objects.get_or_create(
+            idempotency_key=idempotency_key,
+            defaults={"member_id": self.member_id, "fields": fields},
+        )
+        if not created:
+            logger.info(f"Повторная отправка формы {idempotency_key} проигнорирована")
+        return entry, created
+
+    def enqueue_many(self, items):
+        DealOutbox.objects.bulk_create(
+            [
+                DealOutbox(member_id=self.member_id, idempotency_key=key, fields=fields)
+                for key, fields in items
+            ],
+            batch_size=500,
+            ignore_conflicts=True,
+        )
+
+    def flush_in_background(self):
+        return run_in_background(f"deal-outbox:{self.member_id}", self.flush)
+
+    def flush(self):
+        total = {"sent": 0, "failed": 0, "retried": 0}
+        while True:
+            entries = self._claim()
+            if not entries:
+                break
+            started = time.monotonic()
+            stats = self._send(entries)
+            record_flush(
+                self.member_id,
+                time.monotonic() - started,
+                stats["sent"],
+                stats["failed"],
+                stats["retried"],
+            )
+            for key in total:
+                total[key] += stats[key]
+        return total
+
+    def _claim(self):
+        # Строки «арендуются» сдвигом next_attempt_at: параллельный обработчик
+        # их не возьмет, а после падения процесса они вернутся в очередь.
+        now = timezone.now()
+        with transaction.atomic():
+            due = DealOutbox.objects.select_for_update(skip_locked=True).filter(
+                member_id=self.member_id,
+                status=DealOutbox.STATUS_PENDING,
+                next_attempt_at__lte=now,
+            )
+            entries = list(due.order_by("next_attempt_at")[:BATCH_SIZE])
+            if entries:
+                DealOutbox.objects.filter(pk__in=[e.pk for e in entries]).update(
+                    attempts=F("attempts") + 1, next_attempt_at=now + CLAIM_TIMEOUT
+                )
+        for entry in entries:
+            entry.attempts += 1
+        return entries
+
+    def _send(self, entries):
+        stats = {"sent": 0, "failed": 0, "retried": 0}
+        retried = [e for e in entries if e.attempts > 1]
+        stats["retried"] = len(retried)
+
+        # Ответ на прошлую попытку мог потеряться после создания сделки:
+        # такие строки сначала ищутся в Bitrix24 по ORIGIN_ID.
+        existing = {}
+        lookup_error = None
+        if retried:
+            try:
+                existing = self._find_existing(retried)
+            except Exception as e:
+                lookup_error = f"Не удалось проверить предыдущую попытку: {e}"
+                logger.error(lookup_error)
+
+        commands = []
+        for entry in entries:
+            if entry.idempotency_key in existing:
+                continue
+            if lookup_error and entry.attempts > 1:
+                continue
+            fields = dict(
+                entry.fields, ORIGINATOR_ID=ORIGINATOR_ID, ORIGIN_ID=entry.idempotency_key
+            )
+            commands.append((f"outbox_{entry.pk}", "crm.deal.add", {"fields": fields}))
+
+        try:
+            result = self.but.batch_api_call(methods=commands, halt=0) if commands else {}
+        except Exception as e:
+            logger.error(f"Ошибка отправки очереди сделок: {e}")
+            result = {
+                cmd_id: {"result": None, "error": {"error_description": str(e)}}
+                for cmd_id, _, _ in commands
+            }
+
+        now = timezone.now()
+        created = []
+        for entry in entries:
+            deal_id = existing.get(entry.idempotency_key)
+            error = None
+            if lookup_error and entry.attempts > 1:
+                error = lookup_error
+            elif deal_id is None:
+                res = result.get(f"outbox_{entry.pk}")
+                error = get_batch_error(res)
+                if error is None:
+                    deal_id = res.get("result")
+                    if not deal_id:
+                        error = "пустой ответ Bitrix24"
+
+            if deal_id:
+                entry.status = DealOutbox.STATUS_SENT
+                entry.deal_id = deal_id
+                entry.sent_at = now
+                entry.last_error = ""
+                created.append((deal_id, entry.fields))
+                stats["sent"] += 1
+            elif entry.attempts >= settings.DEAL_OUTBOX_MAX_ATTEMPTS:
+                entry.status = DealOutbox.STATUS_FAILED
+                entry.last_error = error
+                stats["failed"] += 1
+                logger.error(f"Сделка {entry.idempotency_key} не создана: {error}")
+            else:
+                entry.last_error = error
+                entry.next_attempt_at = now + timedelta(
+                    seconds=RETRY_BASE_DELAY * 2 ** (entry.attempts - 1)
+                )
+
+        DealOutbox.objects.bulk_update(
+            entries, ["status", "deal_id", "sent_at", "last_error", "next_attempt_at"]
+        )
+        if created:
+            self.sync_service.save_created_deals(created)
+
+        logger.info(
+            f"Очередь сделок: отправлено {stats['sent']}, ошибок {stats['failed']}, повторов {stats['retried']}"
+        )
+        return stats
+
+    def _find_existing(self, entries):
+        response = self.but.call_api_method(
+            "crm.deal.list",
+            {
+                "filter": {
+                    "ORIGINATOR_ID": ORIGINATOR_ID,
+                    "@ORIGIN_ID": [e.idempotency_key for e in entries],
+                },
+                "select": ["ID", "ORIGIN_ID"],
+                "start": -1,
+            },
+        )
+        return {deal["ORIGIN_ID"]: int(deal["ID"]) for deal in response.get("result") or []}
+
+    def get_pending_count(self):
+        return DealOutbox.objects.filter(
+            member_id=self.member_id, status=DealOutbox.STATUS_PENDING
+        ).count()
+
+    def get_stats(self):
+        entries = DealOutbox.objects.filter(member_id=self.member_id)
+        now = timezone.now()
+
+        depth = entries.filter(status=DealOutbox.STATUS_PENDING).aggregate(
+            count=Count("pk"), oldest=Min("created_at")
+        )
+        retries = entries.filter(
+            created_at__gte=now - timedelta(days=1), attempts__gt=0
+        ).aggregate(attempts=Sum("attempts"), count=Count("pk"))
+        latency = entries.filter(
+            status=DealOutbox.STATUS_SENT, sent_at__gte=now - timedelta(hours=1)
+        ).aggregate(
+            avg=Avg(F("sent_at") - F("created_at")),
+            max=Max(F("sent_at") - F("created_at")),
+        )
+
+        with _flush_metrics_lock:
+            flush_metrics = dict(_flush_metrics.get(self.member_id, {}))
+
+        return {
+            "queue_depth": depth["count"],
+            "oldest_pending_seconds": (now - depth["oldest"]).total_seconds() if depth["oldest"] else 0,
+            "failed": entries.filter(status=DealOutbox.STATUS_FAILED).count(),
+            "retries_24h": (retries["attempts"] or 0) - (retries["count"] or 0),
+            "queue_latency_avg_seconds": latency["avg"].total_seconds() if latency["avg"] else None,
+            "queue_latency_max_seconds": latency["max"].total_seconds() if latency["max"] else None,
+            "flush": flush_metrics,
+        }
@@ -0,0 +1,191 @@
+import logging
+
+from django.conf import settings
+from django.core.paginator import Paginator
+
+from apps.core.bitrix import get_batch_error, get_member_id
+from apps.core.cache import get_metadata_cache
+from .models import Deal
+from .sync import DealSyncService
+
+logger = logging.getLogger(__name__)
+
+DEALS_PER_PAGE = 10
+
+DEAL_SORT_OPTIONS = {
+    "-date_create": "Сначала новые",
+    "date_create": "Сначала старые",
+    "-opportunity": "Сумма по убыванию",
+    "opportunity": "Сумма по возрастанию",
+    "title": "Название",
+}
+DEFAULT_DEAL_SORT = "-date_create"
+
+DEAL_FIELDS_CACHE_KEY = "crm.deal.fields"
+DEAL_STAGES_CACHE_KEY = "crm.status.list:DEAL_STAGE"
+DEAL_STAGES_PARAMS = {"order": {"SORT": "ASC"}, "filter": {"ENTITY_ID": "DEAL_STAGE"}}
+
+
+def build_stage_names(statuses):
+    return {
+        status["STATUS_ID"]: status["NAME"]
+        for status in statuses or []
+        if status.get("ENTITY_ID") == "DEAL_STAGE"
+    }
+
+
+class DealMetadataService:
+    def __init__(self, bitrix_user_token, member_id=None):
+        self.but = bitrix_user_token
+        self.member_id = member_id or get_member_id(bitrix_user_token)
+        self.cache = get_metadata_cache()
+
+    def get_cached_deal_fields(self):
+        return self.cache.get(self.member_id, DEAL_FIELDS_CACHE_KEY)
+
+    def set_deal_fields(self, fields):
+        self.cache.set(self.member_id, DEAL_FIELDS_CACHE_KEY, fields)
+
+    def get_deal_fields(self):
+        return self.cache.get_or_load(
+            self.member_id, DEAL_FIELDS_CACHE_KEY, self._load_deal_fields
+        )
+
+    def get_lead_source_options(self):
+        custom_field_data = self.get_deal_fields().get(settings.CUSTOM_FIELD_NAME)
+        if custom_field_data and custom_field_data.get("items"):
+            return custom_field_data["items"]
+        return []
+
+    def get_cached_stage_names(self):
+        return self.cache.get(self.member_id, DEAL_STAGES_CACHE_KEY)
+
+    def set_stage_names(self, stage_names):
+        self.cache.set(self.member_id, DEAL_STAGES_CACHE_KEY, stage_names)
+
+    def get_stage_names(self):
+        return self.cache.get_or_load(
+            self.member_id, DEAL_STAGES_CACHE_KEY, self._load_stage_names
+        )
+
+    def _load_deal_fields(self):
+        response = self.but.call_api_method("crm.deal.fields")
+        if "result" not in response:
+            raise ValueError(f"Не удалось загрузить описание полей сделки: {response}")
+        return response["result"]
+
+    def _load_stage_names(self):
+        response = self.but.call_api_method("crm.status.list", DEAL_STAGES_PARAMS)
+        if "result" not in response:
+            raise ValueError(f"Не удалось загрузить стадии сделок: {response}")
+        return build_stage_names(response["result"])
+
+
+class DealService:
+    def __init__(self, bitrix_user_token):
+        self.but = bitrix_user_token
+        self.metadata = DealMetadataService(bitrix_user_token)
+        self.sync_service = DealSyncService(
+            bitrix_user_token, member_id=self.metadata.member_id
+        )
+
+    def build_deal_fields(self, title, custom_field, opportunity):
+        if not title:
+            raise ValueError("Название сделки обязательно")
+        if not custom_field:
+            raise ValueError("Источник лида обязателен")
+
+        fields = {
+            "TITLE": title,
+            "STAGE_ID": settings.DEFAULT_STAGE,
+            settings.CUSTOM_FIELD_NAME: custom_field,
+            "CURRENCY_ID": settings.DEFAULT_CURRENCY,
+        }
+
+        if opportunity:
+            try:
+                fields["OPPORTUNITY"] = float(opportunity)
+            except ValueError:
+                raise ValueError("Сумма должна быть числом")
+
+        return fields
+
+    def get_page_data(self):
+        # Все чтения уходят одним batch-запросом; halt=0, чтобы ошибка одной
+        # команды не отменяла остальные. Метаданные запрашиваются только при
+        # промахе кеша.
+        deal_fields = self.metadata.get_cached_deal_fields()
+        stage_names = self.metadata.get_cached_stage_names()
+
+        methods = [("user", "user.current", {})]
+        if deal_fields is None:
+            methods.append(("fields", "crm.deal.fields", {}))
+        if stage_names is None:
+            methods.append(("stages", "crm.status.list", DEAL_STAGES_PARAMS))
+
+        batch_result = self.but.batch_api_call(methods=methods, halt=0)
+
+        data = {
+            "user_name": "Неизвестно",
+            "errors": [],
+        }
+
+        user_result = batch_result.get("user")
+        user_error = get_batch_error(user_result)
+        if user_error:
+            logger.error(f"Bitrix24 error (user.current): {user_error}")
+        else:
+            data["user_name"] = user_result.get("result", {}).get("NAME", "Неизвестно")
+
+        if deal_fields is None:
+            fields_result = batch_result.get("fields")
+            fields_error = get_batch_error(fields_result)
+            if fields_error:
+                logger.error(f"Failed to get deal fields: {fields_error}")
+                data["errors"].append("Не удалось загрузить описание полей сделки.")
+            else:
+                deal_fields = fields_result.get("result") or {}
+                self.metadata.set_deal_fields(deal_fields)
+
+        if deal_fields is not None:
+            custom_field_data = deal_fields.get(settings.CUSTOM_FIELD_NAME)
+            if not custom_field_data or not custom_field_data.get("items"):
+                logger.error(
+                    f"Custom field {settings.CUSTOM_FIELD_NAME} not found or has no items."
+                )
+                data["errors"].append(
+                    f"Системное поле '{settings.CUSTOM_FIELD_NAME}' не найдено в Bitrix24. Обратитесь к администратору."
+                )
+
+        if stage_names is None:
+            stages_result = batch_result.get("stages")
+            stages_error = get_batch_error(stages_result)
+            if stages_error:
+                logger.error(f"Failed to get deal stages: {stages_error}")
+            else:
+                self.metadata.set_stage_names(
+                    build_stage_names(stages_result.get("result"))
+                )
+
+        return data
+
+    def get_deals_page(self, stage=None, search=None, sort=None, page=1):
+        deals = Deal.objects.filter(member_id=self.metadata.member_id, closed=False)
+        if stage:
+            deals = deals.filter(stage_id=stage)
+        if search:
+            deals = deals.filter(title__icontains=search)
+        if sort not in DEAL_SORT_OPTIONS:
+            sort = DEFAULT_DEAL_SORT
+        deals = deals.order_by(sort, "-bitrix_id").only(
+            "bitrix_id", "title", "stage_id", "opportunity", "currency_id"
+        )
+        return Paginator(deals, DEALS_PER_PAGE).get_page(page)
+
+    def refresh_deals(self):
+        # Список отдается из локального зеркала; устаревшее зеркало
+        # догоняется в фоне и не задерживает ответ.
+        state = self.sync_service.get_state()
+        if self.sync_service.is_stale(state):
+            self.sync_service.sync_in_background()
+        return state.last_synced_at is not None
@@ -0,0 +1,166 @@
+import logging
+from datetime import timedelta
+from decimal import Decimal, InvalidOperation
+
+from django.conf import settings
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from apps.core.background import run_in_background
+from apps.core.bitrix import get_member_id
+from .models import Deal, DealSyncState
+
+logger = logging.getLogger(__name__)
+
+PAGE_SIZE = 50
+WATERMARK_OVERLAP = timedelta(minutes=5)
+
+DEAL_UPDATE_FIELDS = [
+    "title",
+    "stage_id",
+    "opportunity",
+    "currency_id",
+    "lead_source",
+    "closed",
+    "date_create",
+    "date_modify",
+    "synced_at",
+]
+
+
+def parse_amount(value):
+    try:
+        return Decimal(str(value or 0)).quantize(Decimal("0.01"))
+    except InvalidOperation:
+        return Decimal("0")
+
+
+def deal_from_bitrix(member_id, data, synced_at):
+    return Deal(
+        member_id=member_id,
+        bitrix_id=int(data["ID"]),
+        title=(data.get("TITLE") or "")[:255],
+        stage_id=data.get("STAGE_ID") or "",
+        opportunity=parse_amount(data.get("OPPORTUNITY")),
+        currency_id=data.get("CURRENCY_ID") or "",
+        lead_source=str(data.get(settings.CUSTOM_FIELD_NAME) or "")[:100],
+        closed=data.get("CLOSED") == "Y",
+        date_create=parse_datetime(data["DATE_CREATE"]) if data.get("DATE_CREATE") else None,
+        date_modify=parse_datetime(data["DATE_MODIFY"]) if data.get("DATE_MODIFY") else None,
+        synced_at=synced_at,
+    )
+
+
+class DealSyncService:
+    def __init__(self, bitrix_token, member_id=None):
+        self.but = bitrix_token
+        self.member_id = member_id or get_member_id(bitrix_token)
+
+    @property
+    def select(self):
+        return [
+            "ID",
+            "TITLE",
+            "STAGE_ID",
+            "OPPORTUNITY",
+            "CURRENCY_ID",
+            "CLOSED",
+            "DATE_CREATE",
+            "DATE_MODIFY",
+            settings.CUSTOM_FIELD_NAME,
+        ]
+
+    def get_state(self):
+        state, _ = DealSyncState.objects.get_or_create(member_id=self.member_id)
+        return state
+
+    def is_stale(self, state):
+        if not state.last_synced_at:
+            return True
+        interval = timedelta(seconds=settings.DEAL_SYNC_INTERVAL)
+        return timezone.now() - state.last_synced_at > interval
+
+    def sync(self, full=False):
+        state = self.get_state()
+        watermark = None if full else state.last_date_modify
+        started_at = timezone.now()
+        max_date_modify = watermark
+        last_id = 0
+        synced = 0
+
+        # Keyset-пагинация по ID с start=-1: Bitrix24 не считает total,
+        # и каждая страница стоит одинаково независимо от глубины.
+        while True:
+            deal_filter = {">ID": last_id}
+            if watermark:
+                deal_filter[">=DATE_MODIFY"] = watermark.isoformat()
+
+            response = self.but.call_api_method(
+                "crm.deal.list",
+                {
+                    "order": {"ID": "ASC"},
+                    "filter": deal_filter,
+                    "select": self.select,
+                    "start": -1,
+                },
+            )
+            page = response.get("result") or []
+            if not page:
+                break
+
+            deals = [deal_from_bitrix(self.member_id, data, timezone.now()) for data in page]
+            Deal.objects.bulk_create(
+                deals,
+                update_conflicts=True,
+                unique_fields=["member_id", "bitrix_id"],
+                update_fields=DEAL_UPDATE_FIELDS,
+            )
+
+            synced += len(deals)
+            last_id = max(deal.bitrix_id for deal in deals)
+            for deal in deals:
+                if deal.date_modify and (
+                    max_date_modify is None or deal.date_modify > max_date_modify
+                ):
+                    max_date_modify = deal.date_modify
+
+            if len(page) < PAGE_SIZE:
+                break
+
+        if full:
+            # Удаленные в Bitrix24 сделки не попадают в выборку по DATE_MODIFY,
+            # поэтому чистятся только при полной синхронизации.
+            removed, _ = Deal.objects.filter(
+                member_id=self.member_id, synced_at__lt=started_at
+            ).delete()
+            if removed:
+                logger.info(f"Удалено {removed} отсутствующих в Bitrix24 сделок")
+            state.last_full_sync_at = started_at
+
+        # Сделки, измененные во время прохода, могли оказаться за курсором по ID.
+        # Водяной знак не уходит дальше начала синхронизации (с запасом на
+        # расхождение часов), поэтому следующий проход их подхватит.
+        if max_date_modify:
+            state.last_date_modify = min(max_date_modify, started_at - WATERMARK_OVERLAP)
+        state.last_synced_at = started_at
+        state.save()
+
+        logger.info(f"Синхронизировано сделок: {synced} (портал {self.member_id})")
+        return synced
+
+    def sync_in_background(self):
+        return run_in_background(f"deal-sync:{self.member_id}", self.sync)
+
+    def save_created_deals(self, created):
+        now = timezone.now()
+        deals = []
+        for deal_id, fields in created:
+            deal = deal_from_bitrix(self.member_id, dict(fields, ID=deal_id, CLOSED="N"), now)
+            deal.date_create = deal.date_modify = now
+            deals.append(deal)
+        Deal.objects.bulk_create(
+            deals,
+            update_conflicts=True,
+            unique_fields=["member_id", "bitrix_id"],
+            update_fields=DEAL_UPDATE_FIELDS,
+        )
@@ -1,18 +1,45 @@
+import logging
+
 from django import template
 
+from apps.deals.services import DealMetadataService
+
+logger = logging.getLogger(__name__)
+
 register = template.Library()
 
-STAGE_MAPPING = {
-    "NEW": "Новая",
-    "PREPARATION": "Подготовка",
-    "PREPAYMENT_INVOICE": "Счет на предоплату",
-    "EXECUTING": "Выполняется",
-    "FINAL_INVOICE": "Финальный счет",
-    "WON": "Успешно реализована",
-    "LOSE": "Проиграна",
-}
+
+def _get_metadata(context):
+    return DealMetadataService(context["request"].bitrix_user_token)
+
+
+def _get_stage_names(context):
+    # Стадии загружаются один раз за рендеринг шаблона: при ошибке портала
+    # таблица сделок показывает коды стадий без повторных запросов.
+    if "deal_stage_names" not in context.render_context:
+        try:
+            stage_names = _get_metadata(context).get_stage_names()
+        except Exception as e:
+            logger.error(f"Could not fetch deal stages: {e}")
+            stage_names = {}
+        context.render_context["deal_stage_names"] = stage_names
+    return context.render_context["deal_stage_names"]
+
+
+@register.simple_tag(takes_context=True)
+def lead_source_options(context):
+    try:
+        return _get_metadata(context).get_lead_source_options()
+    except Exception as e:
+        logger.error(f"Could not fetch lead source options: {e}")
+        return []
+
+
+@register.simple_tag(takes_context=True)
+def translate_stage(context, stage_id):
+    return _get_stage_names(context).get(stage_id, stage_id)
 
 
-@register.filter
-def translate_stage(stage_id):
-    return STAGE_MAPPING.get(stage_id, stage_id)
+@register.simple_tag(takes_context=True)
+def deal_stage_options(context):
+    return list(_get_stage_names(context).items())
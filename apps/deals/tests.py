@@ -1 +1,209 @@
-# Create your tests here.
+from unittest import mock
+
+from django.test import TestCase, override_settings
+
+from .bulk import DealBulkService
+from .models import Deal, DealOutbox
+from .outbox import DealOutboxService
+from .services import DealService
+
+DEAL_FIELDS = {
+    "TITLE": {"type": "string", "isRequired": True, "title": "Название"},
+    "OPPORTUNITY": {"type": "double"},
+    "CURRENCY_ID": {"type": "crm_currency"},
+    "STAGE_ID": {"type": "crm_status"},
+    "UF_CRM_COUNT": {"type": "integer"},
+    "ID": {"type": "integer", "isReadOnly": True},
+}
+STAGE_NAMES = {"NEW": "Новая", "WON": "Сделка успешна"}
+STAGES = [
+    {"ENTITY_ID": "DEAL_STAGE", "STATUS_ID": "NEW", "NAME": "Новая"},
+    {"ENTITY_ID": "DEAL_STAGE", "STATUS_ID": "WON", "NAME": "Сделка успешна"},
+]
+
+
+class FakeOutboxToken:
+    def __init__(self, results):
+        self.results = results
+        self.batches = []
+
+    def batch_api_call(self, methods, halt=0):
+        self.batches.append(methods)
+        return {cmd_id: self.results.pop(0) for cmd_id, _, _ in methods}
+
+    def call_api_method(self, method, params):
+        return {"result": []}
+
+
+class FakePageToken:
+    # Считает обращения к порталу: страница сделок должна обходиться
+    # одним batch-запросом.
+    def __init__(self, member_id, errors=()):
+        self.member_id = member_id
+        self.errors = errors
+        self.batches = []
+        self.calls = []
+
+    def batch_api_call(self, methods, halt=0):
+        self.batches.append([method for _, method, _ in methods])
+        results = {
+            "user.current": {"NAME": "Иван"},
+            "crm.deal.fields": {"UF_CRM_1": {"type": "enumeration", "items": [{"ID": "1"}]}},
+            "crm.status.list": STAGES,
+        }
+        return {
+            cmd_id: (
+                {"error": "ERROR", "error_description": f"{method} failed"}
+                if method in self.errors
+                else {"result": results[method]}
+            )
+            for cmd_id, method, _ in methods
+        }
+
+    def call_api_method(self, method, params=None):
+        self.calls.append(method)
+        return {"result": []}
+
+
+@override_settings(CUSTOM_FIELD_NAME="UF_CRM_1")
+class DealPageDataTests(TestCase):
+    def get_page_data(self, member_id, errors=()):
+        token = FakePageToken(member_id, errors)
+        service = DealService(token)
+        return service, token, service.get_page_data()
+
+    def test_page_needs_one_request(self):
+        service, token, data = self.get_page_data("test-page-a")
+
+        self.assertEqual(token.batches, [["user.current", "crm.deal.fields", "crm.status.list"]])
+        self.assertEqual(token.calls, [])
+        self.assertEqual(data, {"user_name": "Иван", "errors": []})
+        self.assertEqual(service.metadata.get_stage_names(), STAGE_NAMES)
+        # Список сделок читается из локального зеркала, без crm.deal.list.
+        Deal.objects.create(member_id="test-page-a", bitrix_id=1, title="Поставка", stage_id="NEW")
+        self.assertEqual(len(service.get_deals_page()), 1)
+        self.assertEqual((len(token.batches), token.calls), (1, []))
+
+        _, token, _ = self.get_page_data("test-page-a")
+        self.assertEqual(token.batches, [["user.current"]])
+        self.assertEqual(token.calls, [])
+
+    def test_failed_fields_do_not_cause_extra_requests(self):
+        with self.assertLogs("apps.deals.services", "ERROR"):
+            service, token, data = self.get_page_data("test-page-b", errors=["crm.deal.fields"])
+
+        self.assertEqual(len(token.batches), 1)
+        self.assertEqual(token.calls, [])
+        self.assertEqual(data["errors"], ["Не удалось загрузить описание полей сделки."])
+        self.assertIsNone(service.metadata.get_cached_deal_fields())
+        self.assertEqual(service.metadata.get_cached_stage_names(), STAGE_NAMES)
+
+    def test_failed_stages_and_user_do_not_cause_extra_requests(self):
+        with self.assertLogs("apps.deals.services", "ERROR"):
+            service, token, data = self.get_page_data(
+                "test-page-c", errors=["crm.status.list", "user.current"]
+            )
+
+        self.assertEqual(len(token.batches), 1)
+        self.assertEqual(token.calls, [])
+        self.assertEqual(data, {"user_name": "Неизвестно", "errors": []})
+        self.assertIsNone(service.metadata.get_cached_stage_names())
+
+
+@override_settings(DEAL_OUTBOX_MAX_ATTEMPTS=2)
+class DealOutboxTests(TestCase):
+    def enqueue(self, token, key):
+        outbox = DealOutboxService(token, member_id="test-outbox")
+        outbox.enqueue({"TITLE": key}, key)
+        return outbox
+
+    def test_sent_deal_is_saved_locally(self):
+        token = FakeOutboxToken([{"result": 101}])
+        stats = self.enqueue(token, "key-1").flush()
+
+        entry = DealOutbox.objects.get(idempotency_key="key-1")
+        self.assertEqual(stats["sent"], 1)
+        self.assertEqual((entry.status, entry.deal_id, entry.last_error), (DealOutbox.STATUS_SENT, 101, ""))
+        self.assertEqual(token.batches[0][0][2]["fields"]["ORIGIN_ID"], "key-1")
+        self.assertTrue(Deal.objects.filter(member_id="test-outbox", bitrix_id=101).exists())
+
+    def test_empty_result_is_retried_with_error(self):
+        token = FakeOutboxToken([{"result": None}])
+        self.enqueue(token, "key-2").flush()
+
+        entry = DealOutbox.objects.get(idempotency_key="key-2")
+        self.assertEqual(entry.status, DealOutbox.STATUS_PENDING)
+        self.assertEqual(entry.last_error, "пустой ответ Bitrix24")
+
+    def test_error_after_max_attempts_marks_failed(self):
+        token = FakeOutboxToken([{"result": None, "error": {"error_description": "Bad field"}}])
+        outbox = self.enqueue(token, "key-3")
+        DealOutbox.objects.filter(idempotency_key="key-3").update(attempts=1)
+        outbox.flush()
+
+        entry = DealOutbox.objects.get(idempotency_key="key-3")
+        self.assertEqual((entry.status, entry.last_error), (DealOutbox.STATUS_FAILED, "Bad field"))
+
+    def test_repeated_key_is_not_enqueued_twice(self):
+        outbox = DealOutboxService(None, member_id="test-outbox")
+        outbox.enqueue({"TITLE": "A"}, "key-4")
+        _, created = outbox.enqueue({"TITLE": "A"}, "key-4")
+
+        self.assertFalse(created)
+        self.assertEqual(DealOutbox.objects.filter(member_id="test-outbox").count(), 1)
+
+
+@override_settings(DEFAULT_STAGE="NEW", DEFAULT_CURRENCY="RUB")
+class DealBulkServiceTests(TestCase):
+    def setUp(self):
+        self.service = DealBulkService(None, member_id="test-bulk")
+        self.service.metadata.get_deal_fields = lambda: DEAL_FIELDS
+        self.service.metadata.get_stage_names = lambda: STAGE_NAMES
+
+    def validate(self, row):
+        return self.service.validate_row(row, DEAL_FIELDS, STAGE_NAMES)
+
+    def test_converts_aliases_and_values(self):
+        fields, errors = self.validate(
+            {"Название": "Поставка", "сумма": "1 500,50", "стадия": "сделка успешна", "UF_CRM_COUNT": "3"}
+        )
+        self.assertEqual(errors, [])
+        self.assertEqual(
+            fields,
+            {"TITLE": "Поставка", "OPPORTUNITY": 1500.5, "STAGE_ID": "WON", "CURRENCY_ID": "RUB", "UF_CRM_COUNT": 3},
+        )
+
+    def test_integer_field_rejects_fractions(self):
+        for value in (1.5, "1.5"):
+            _, errors = self.validate({"title": "Поставка", "UF_CRM_COUNT": value})
+            self.assertEqual(errors, ["поле 'UF_CRM_COUNT': должно быть целым числом"], value)
+        fields, errors = self.validate({"title": "Поставка", "UF_CRM_COUNT": 2.0})
+        self.assertEqual((fields["UF_CRM_COUNT"], errors), (2, []))
+
+    def test_reports_unknown_read_only_and_missing_fields(self):
+        _, errors = self.validate({"color": "red", "ID": "5", "стадия": "Потеряна"})
+        self.assertEqual(
+            errors,
+            [
+                "неизвестное поле 'color'",
+                "поле 'ID' доступно только для чтения",
+                "поле 'стадия': неизвестная стадия 'Потеряна'",
+                "не указано название сделки",
+                "не заполнено обязательное поле 'Название'",
+            ],
+        )
+
+    def test_upload_is_queued_once_per_key(self):
+        rows = [{"title": "A"}, {"title": "B", "сумма": "x"}, {"title": "C"}]
+        with mock.patch.object(DealOutboxService, "flush_in_background") as flush:
+            queued, invalid = self.service.enqueue_deals(rows, "upload")
+            self.service.enqueue_deals(rows, "upload")
+
+        self.assertEqual(queued, 2)
+        self.assertEqual(len(invalid), 1)
+        self.assertIn("Строка 3", invalid[0])
+        self.assertEqual(flush.call_count, 2)
+        self.assertEqual(
+            list(DealOutbox.objects.filter(member_id="test-bulk").values_list("idempotency_key", flat=True)),
+            ["upload:row_0", "upload:row_2"],
+        )
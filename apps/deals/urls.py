@@ -6,4 +6,6 @@ app_name = "deals"
 
 urlpatterns = [
     path("", views.index, name="index"),
+    path("bulk/", views.bulk_create, name="bulk_create"),
+    path("outbox/stats/", views.outbox_stats, name="outbox_stats"),
 ]
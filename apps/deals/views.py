@@ -1,9 +1,14 @@
 import logging
+import uuid
 
+from django.http import JsonResponse
 from django.shortcuts import render
 from django.conf import settings
 
 from apps.core.decorators import smart_auth
+from .bulk import DealBulkService
+from .outbox import DealOutboxService
+from .services import DEAL_SORT_OPTIONS, DEFAULT_DEAL_SORT, DealService
 
 logger = logging.getLogger(__name__)
 
@@ -14,6 +19,11 @@ def index(request):
     error_message = None
 
     try:
+        service = DealService(request.bitrix_user_token)
+        outbox = DealOutboxService(
+            request.bitrix_user_token, member_id=service.metadata.member_id
+        )
+
         if request.method == "POST":
             title = request.POST.get("title", "").strip()
             custom_field = request.POST.get(settings.CUSTOM_FIELD_NAME, "").strip()
@@ -23,98 +33,63 @@ def index(request):
                 f"Form data: title={title}, source={custom_field}, amount={opportunity}"
             )
 
-            if not title:
-                error_message = "Название сделки обязательно"
-            elif not custom_field:
-                error_message = "Источник лида обязателен"
+            try:
+                fields = service.build_deal_fields(title, custom_field, opportunity)
+            except ValueError as e:
+                error_message = str(e)
             else:
-                fields = {
-                    "TITLE": title,
-                    "STAGE_ID": settings.DEFAULT_STAGE,
-                    settings.CUSTOM_FIELD_NAME: custom_field,
-                    "CURRENCY_ID": settings.DEFAULT_CURRENCY,
-                }
-
-                if opportunity:
-                    try:
-                        fields["OPPORTUNITY"] = float(opportunity)
-                    except ValueError:
-                        error_message = "Сумма должна быть числом"
-
-                if not error_message:
-                    logger.info(f"Отправка данных в Bitrix24: {fields}")
-                    response = request.bitrix_user_token.call_api_method(
-                        "crm.deal.add", {"fields": fields}
-                    )
-
-                    logger.info(f"Bitrix24 response: {response}")
-
-                    if "error" in response:
-                        logger.error(f"Bitrix24 error: {response['error']}")
-                        error_message = f"Ошибка Bitrix24: {response['error'].get('error_description', 'Неизвестная ошибка')}"
-                    elif response.get("result"):
-                        deal_id = response["result"]
-                        success_message = f"Сделка #{deal_id} успешно создана!"
-                        logger.info(f"Создана сделка #{deal_id}")
-                    else:
-                        error_message = "Ошибка при создании сделки"
-                        logger.error(f"Ошибка создания сделки: {response}")
-
-        user = request.bitrix_user_token.call_api_method("user.current")
-        user_name = user.get("result", {}).get("NAME", "Неизвестно")
-
-        deals_response = request.bitrix_user_token.call_api_method(
-            "crm.deal.list",
-            {
-                "order": {"DATE_CREATE": "DESC"},
-                "filter": {"CLOSED": "N"},
-                "select": ["ID", "TITLE", "STAGE_ID", "OPPORTUNITY", "CURRENCY_ID"],
-            },
+                # Сделка ставится в очередь и отправляется в фоне: форма не ждет
+                # Bitrix24, а повторная отправка с тем же ключом не создает дубль.
+                idempotency_key = request.POST.get("idempotency_key") or uuid.uuid4().hex
+                entry, _ = outbox.enqueue(fields, idempotency_key[:64])
+                outbox.flush_in_background()
+                logger.info(f"Сделка поставлена в очередь: {fields}")
+                if entry.status == entry.STATUS_SENT:
+                    success_message = f"Сделка #{entry.deal_id} успешно создана!"
+                else:
+                    success_message = "Сделка принята и будет создана в Bitrix24 в течение нескольких секунд."
+
+        page_data = service.get_page_data()
+        is_synced = service.refresh_deals()
+
+        stage = request.GET.get("stage", "").strip()
+        search = request.GET.get("q", "").strip()
+        sort = request.GET.get("sort", DEFAULT_DEAL_SORT)
+        deals_page = service.get_deals_page(
+            stage=stage, search=search, sort=sort, page=request.GET.get("page")
         )
 
-        deals = deals_response.get("result", [])[:10]
+        query = request.GET.copy()
+        query.pop("page", None)
 
-        lead_source_options = []
-        try:
-            fields_response = request.bitrix_user_token.call_api_method(
-                "crm.deal.fields"
-            )
-            if "result" in fields_response:
-                all_fields = fields_response["result"]
-                custom_field_data = all_fields.get(settings.CUSTOM_FIELD_NAME)
-                if custom_field_data and custom_field_data.get("items"):
-                    lead_source_options = custom_field_data["items"]
-                else:
-                    logger.error(
-                        f"Custom field {settings.CUSTOM_FIELD_NAME} not found or has no items."
-                    )
-                    if not error_message:
-                        error_message = (
-                            f"Системное поле '{settings.CUSTOM_FIELD_NAME}' не найдено в Bitrix24. Обратитесь к администратору."
-                        )
-            else:
-                logger.error(
-                    f"Failed to get deal fields: {fields_response.get('error_description')}"
-                )
-                if not error_message:
-                    error_message = "Не удалось загрузить описание полей сделки."
+        if not error_message and page_data["errors"]:
+            error_message = page_data["errors"][0]
 
-        except Exception as e:
-            logger.error(f"Could not fetch lead source options: {e}")
-            if not error_message:
-                error_message = "Не удалось загрузить опции для поля 'Источник лида'."
+        outbox_pending = outbox.get_pending_count()
+        outbox_message = None
+        if outbox_pending:
+            outbox_message = f"Сделок в очереди на создание: {outbox_pending}"
+
+        user_name = page_data["user_name"]
 
         context = {
             "user_name": user_name,
-            "deals": deals,
+            "deals": deals_page,
+            "deals_synced": is_synced,
+            "stage": stage,
+            "search": search,
+            "sort": sort,
+            "sort_options": DEAL_SORT_OPTIONS,
+            "base_query": query.urlencode(),
             "success_message": success_message,
             "error_message": error_message,
             "custom_field_name": settings.CUSTOM_FIELD_NAME,
-            "lead_source_options": lead_source_options,
+            "idempotency_key": uuid.uuid4().hex,
+            "outbox_message": outbox_message,
         }
 
         logger.info(f"Получены данные пользователя: {user_name}")
-        logger.info(f"Получено сделок: {len(deals)}")
+        logger.info(f"Сделок в выборке: {deals_page.paginator.count}")
         return render(request, "deals/index.html", context)
 
     except Exception as e:
@@ -130,3 +105,45 @@ def index(request):
                 "error": "Произошла ошибка при работе с Bitrix24. Попробуйте обновить страницу."
             }
         return render(request, "deals/error.html", context)
+
+
+@smart_auth
+def bulk_create(request):
+    context = {
+        "custom_field_name": settings.CUSTOM_FIELD_NAME,
+        "idempotency_key": uuid.uuid4().hex,
+    }
+    if request.method == "POST":
+        if not request.FILES.get("file"):
+            context["error"] = "Файл не был загружен."
+            return render(request, "deals/bulk.html", context)
+
+        try:
+            service = DealBulkService(request.bitrix_user_token)
+            rows = service.parse_file(request.FILES["file"])
+            upload_key = request.POST.get("idempotency_key") or uuid.uuid4().hex
+            queued_count, error_details = service.enqueue_deals(rows, upload_key[:32])
+
+            context["total_count"] = len(rows)
+            context["queued_count"] = queued_count
+            context["error_count"] = len(error_details)
+            context["error_details"] = error_details
+            logger.info(
+                f"Массовое создание сделок: {queued_count} в очереди, {len(error_details)} ошибок"
+            )
+
+        except Exception as e:
+            logger.error(f"Ошибка массового создания сделок: {e}")
+            context["error"] = f"Произошла ошибка при обработке файла: {str(e)}"
+
+    return render(request, "deals/bulk.html", context)
+
+
+@smart_auth
+def outbox_stats(request):
+    try:
+        outbox = DealOutboxService(request.bitrix_user_token)
+        return JsonResponse(outbox.get_stats())
+    except Exception as e:
+        logger.error(f"Ошибка получения статистики очереди сделок: {e}")
+        return JsonResponse({"error": str(e)}, status=500)
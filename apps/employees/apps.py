@@ -4,3 +4,10 @@ from django.apps import AppConfig
 class EmployeesConfig(AppConfig):
     default_auto_field = "django.db.models.BigAutoField"
     name = "apps.employees"
+
+    def ready(self):
+        from apps.core.events import register_event_handler
+        from .org import handle_org_event
+
+        register_event_handler("ONUSER", handle_org_event)
+        register_event_handler("ONDEPARTMENT", handle_org_event)
@@ -0,0 +1,161 @@
+import logging
+from collections import defaultdict
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Q, Sum
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from apps.core.background import run_in_background
+from apps.core.bitrix import get_member_id
+from .models import CallRollup, CallSyncState
+
+logger = logging.getLogger(__name__)
+
+PAGE_SIZE = 50
+CALL_TYPE_OUTGOING = 1
+LONG_CALL_SECONDS = 60
+
+CALL_WINDOWS = {
+    "24h": ("за 24 часа", timedelta(hours=24)),
+    "7d": ("за 7 дней", timedelta(days=7)),
+    "30d": ("за 30 дней", timedelta(days=30)),
+}
+DEFAULT_CALL_WINDOW = "24h"
+
+
+class CallStatsService:
+    def __init__(self, bitrix_token, member_id=None):
+        self.but = bitrix_token
+        self.member_id = member_id or get_member_id(bitrix_token)
+
+    def get_state(self):
+        state, _ = CallSyncState.objects.get_or_create(member_id=self.member_id)
+        return state
+
+    def is_stale(self, state):
+        if not state.last_synced_at:
+            return True
+        interval = timedelta(seconds=settings.CALL_SYNC_INTERVAL)
+        return timezone.now() - state.last_synced_at > interval
+
+    def sync_in_background(self):
+        return run_in_background(f"call-sync:{self.member_id}", self.sync)
+
+    def sync(self):
+        # Звонки читаются по возрастанию ID начиная с водяного знака, так что
+        # каждый звонок попадает в почасовые итоги ровно один раз. Страница
+        # читается и учитывается под блокировкой строки CallSyncState: вторая
+        # синхронизация (другой воркер или cron) ждет и продолжает с нового
+        # водяного знака. Первый проход ограничен CALL_STATS_BACKFILL_DAYS днями.
+        self.get_state()
+        started_at = timezone.now()
+        synced = 0
+
+        while True:
+            with transaction.atomic():
+                state = CallSyncState.objects.select_for_update().get(member_id=self.member_id)
+                call_filter = {">ID": state.last_call_id}
+                if not state.last_call_id:
+                    backfill_from = started_at - timedelta(days=settings.CALL_STATS_BACKFILL_DAYS)
+                    call_filter[">=CALL_START_DATE"] = backfill_from.isoformat()
+
+                response = self.but.call_api_method(
+                    "voximplant.statistic.get",
+                    {
+                        "FILTER": call_filter,
+                        "SORT": "ID",
+                        "ORDER": "ASC",
+                    },
+                )
+                page = response.get("result") or []
+                if page:
+                    self._add_calls(page)
+                    state.last_call_id = max(int(call["ID"]) for call in page)
+                    state.save(update_fields=["last_call_id"])
+
+            synced += len(page)
+            if len(page) < PAGE_SIZE:
+                break
+
+        retention_start = started_at - timedelta(days=settings.CALL_ROLLUP_RETENTION_DAYS)
+        CallRollup.objects.filter(member_id=self.member_id, hour__lt=retention_start).delete()
+
+        CallSyncState.objects.filter(member_id=self.member_id).update(last_synced_at=started_at)
+
+        logger.info(f"Синхронизировано звонков: {synced} (портал {self.member_id})")
+        return synced
+
+    def _add_calls(self, calls):
+        totals = defaultdict(lambda: [0, 0, 0])
+        for call in calls:
+            start_date = parse_datetime(call.get("CALL_START_DATE") or "")
+            user_id = call.get("PORTAL_USER_ID")
+            if not start_date or not user_id:
+                continue
+            duration = int(call.get("CALL_DURATION") or 0)
+            key = (
+                start_date.replace(minute=0, second=0, microsecond=0),
+                int(user_id),
+                int(call.get("CALL_TYPE") or 0),
+            )
+            totals[key][0] += 1
+            totals[key][1] += 1 if duration > LONG_CALL_SECONDS else 0
+            totals[key][2] += duration
+
+        if not totals:
+            return
+
+        query = Q()
+        for hour, user_id, call_type in totals:
+            query |= Q(hour=hour, user_id=user_id, call_type=call_type)
+        existing = {
+            (rollup.hour, rollup.user_id, rollup.call_type): rollup
+            for rollup in CallRollup.objects.select_for_update().filter(
+                query, member_id=self.member_id
+            )
+        }
+
+        created = []
+        for key, (calls_count, long_calls_count, duration) in totals.items():
+            rollup = existing.get(key)
+            if rollup is None:
+                hour, user_id, call_type = key
+                created.append(
+                    CallRollup(
+                        member_id=self.member_id,
+                        hour=hour,
+                        user_id=user_id,
+                        call_type=call_type,
+                        calls_count=calls_count,
+                        long_calls_count=long_calls_count,
+                        total_duration=duration,
+                    )
+                )
+            else:
+                rollup.calls_count += calls_count
+                rollup.long_calls_count += long_calls_count
+                rollup.total_duration += duration
+
+        CallRollup.objects.bulk_create(created)
+        CallRollup.objects.bulk_update(
+            existing.values(), ["calls_count", "long_calls_count", "total_duration"]
+        )
+
+    def get_long_calls(self, window=DEFAULT_CALL_WINDOW):
+        # Итоги почасовые, поэтому начало окна округляется вниз до часа:
+        # окно «24 часа» включает до 59 минут сверх 24 часов.
+        _, period = CALL_WINDOWS.get(window, CALL_WINDOWS[DEFAULT_CALL_WINDOW])
+        since = (timezone.now() - period).replace(minute=0, second=0, microsecond=0)
+        rollups = (
+            CallRollup.objects.filter(
+                member_id=self.member_id,
+                call_type=CALL_TYPE_OUTGOING,
+                hour__gte=since,
+            )
+            .values("user_id")
+            .annotate(long_calls=Sum("long_calls_count"))
+        )
+        return {str(r["user_id"]): r["long_calls"] for r in rollups}
@@ -0,0 +1,67 @@
+import random
+import time
+import tracemalloc
+
+from django.core.management.base import BaseCommand
+
+from apps.employees.org import OrgModel
+
+
+class Command(BaseCommand):
+    help = "Замеряет сборку структуры компании и поиск руководителей на синтетических данных"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--users", type=int, default=20000, help="Количество сотрудников")
+        parser.add_argument("--departments", type=int, default=2000, help="Количество отделов")
+        parser.add_argument("--seed", type=int, default=1, help="Зерно генератора данных")
+
+    def handle(self, *args, **options):
+        users, departments = self.build_data(options["users"], options["departments"], options["seed"])
+        self.stdout.write(f"Сотрудников: {len(users)}, отделов: {len(departments)}")
+
+        tracemalloc.start()
+        started = time.monotonic()
+        org = OrgModel(users, departments)
+        built = time.monotonic() - started
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+
+        started = time.monotonic()
+        chains = sum(len(org.get_managers(user)) for user in org.users.values())
+        walked = time.monotonic() - started
+
+        self.stdout.write(
+            f"Сборка: {built * 1000:.0f} мс, пик памяти {peak / 1024 / 1024:.1f} МБ; "
+            f"руководители всех сотрудников: {walked * 1000:.0f} мс "
+            f"(в среднем {chains / len(users):.1f} в цепочке)"
+        )
+
+    def build_data(self, users_count, departments_count, seed):
+        # Дерево отделов: родитель — любой из ранее созданных отделов,
+        # руководитель — сотрудник этого же отдела; часть отделов без руководителя.
+        rng = random.Random(seed)
+        departments = [{"ID": "1", "NAME": "Компания"}]
+        for n in range(2, departments_count + 1):
+            departments.append({"ID": str(n), "NAME": f"Отдел {n}", "PARENT": str(rng.randint(1, n - 1))})
+
+        users = []
+        for n in range(1, users_count + 1):
+            department_id = n if n <= departments_count else rng.randint(1, departments_count)
+            users.append(
+                {
+                    "ID": str(n),
+                    "LAST_NAME": f"Фамилия{n}",
+                    "NAME": f"Имя{n}",
+                    "UF_DEPARTMENT": [department_id],
+                }
+            )
+
+        for department in departments:
+            department_id = int(department["ID"])
+            if department_id <= users_count and rng.random() < 0.9:
+                department["UF_HEAD"] = department["ID"]
+                # Руководитель отдела числится в родительском отделе, поэтому
+                # цепочка поднимается вверх по дереву.
+                if department.get("PARENT"):
+                    users[department_id - 1]["UF_DEPARTMENT"] = [int(department["PARENT"])]
+        return users, departments
@@ -0,0 +1,29 @@
+from django.core.management.base import BaseCommand
+
+from apps.core.bitrix import get_webhook_token
+from apps.employees.calls import CallStatsService
+
+
+class Command(BaseCommand):
+    help = "Догружает звонки из voximplant.statistic.get в почасовые итоги"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--member-id",
+            type=str,
+            help="member_id портала (по умолчанию BITRIX_MEMBER_ID или портал, установивший приложение, с доменом webhook)",
+        )
+
+    def handle(self, *args, **options):
+        try:
+            token = get_webhook_token(options.get("member_id"))
+        except ValueError as e:
+            self.stdout.write(self.style.ERROR(str(e)))
+            return
+
+        service = CallStatsService(token, member_id=options.get("member_id"))
+        self.stdout.write(f"Синхронизация звонков портала {service.member_id}...")
+
+        synced = service.sync()
+
+        self.stdout.write(self.style.SUCCESS(f"Готово! Обработано звонков: {synced}"))
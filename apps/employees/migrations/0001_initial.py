@@ -0,0 +1,72 @@
+# Generated by Django 4.2 on 2026-10-18 12:09
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    initial = True
+
+    dependencies = []
+
+    operations = [
+        migrations.CreateModel(
+            name="CallRollup",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("member_id", models.CharField(max_length=50)),
+                ("hour", models.DateTimeField()),
+                ("user_id", models.PositiveBigIntegerField()),
+                ("call_type", models.PositiveSmallIntegerField()),
+                ("calls_count", models.PositiveIntegerField(default=0)),
+                ("long_calls_count", models.PositiveIntegerField(default=0)),
+                ("total_duration", models.PositiveBigIntegerField(default=0)),
+            ],
+            options={
+                "verbose_name": "Звонки за час",
+                "verbose_name_plural": "Звонки по часам",
+            },
+        ),
+        migrations.CreateModel(
+            name="CallSyncState",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("member_id", models.CharField(max_length=50, unique=True)),
+                ("last_call_id", models.PositiveBigIntegerField(default=0)),
+                ("last_synced_at", models.DateTimeField(blank=True, null=True)),
+            ],
+            options={
+                "verbose_name": "Состояние синхронизации звонков",
+                "verbose_name_plural": "Состояния синхронизации звонков",
+            },
+        ),
+        migrations.AddIndex(
+            model_name="callrollup",
+            index=models.Index(
+                fields=["member_id", "call_type", "hour"],
+                name="employees_call_window_idx",
+            ),
+        ),
+        migrations.AddConstraint(
+            model_name="callrollup",
+            constraint=models.UniqueConstraint(
+                fields=("member_id", "hour", "user_id", "call_type"),
+                name="employees_call_rollup_unique",
+            ),
+        ),
+    ]
@@ -0,0 +1,42 @@
+from django.db import models
+
+
+class CallRollup(models.Model):
+    member_id = models.CharField(max_length=50)
+    hour = models.DateTimeField()
+    user_id = models.PositiveBigIntegerField()
+    call_type = models.PositiveSmallIntegerField()
+    calls_count = models.PositiveIntegerField(default=0)
+    long_calls_count = models.PositiveIntegerField(default=0)
+    total_duration = models.PositiveBigIntegerField(default=0)
+
+    class Meta:
+        verbose_name = "Звонки за час"
+        verbose_name_plural = "Звонки по часам"
+        constraints = [
+            models.UniqueConstraint(
+                fields=["member_id", "hour", "user_id", "call_type"],
+                name="employees_call_rollup_unique",
+            ),
+        ]
+        indexes = [
+            models.Index(
+                fields=["member_id", "call_type", "hour"], name="employees_call_window_idx"
+            ),
+        ]
+
+    def __str__(self):
+        return f"Calls of {self.user_id} at {self.hour:%Y-%m-%d %H}:00"
+
+
+class CallSyncState(models.Model):
+    member_id = models.CharField(max_length=50, unique=True)
+    last_call_id = models.PositiveBigIntegerField(default=0)
+    last_synced_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        verbose_name = "Состояние синхронизации звонков"
+        verbose_name_plural = "Состояния синхронизации звонков"
+
+    def __str__(self):
+        return f"Call sync for {self.member_id}"
@@ -0,0 +1,119 @@
+import logging
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+
+from apps.core.versions import bump_data_version, get_data_version
+
+logger = logging.getLogger(__name__)
+
+ORG_VERSION_NAME = "org"
+
+
+class OrgUser:
+    __slots__ = ("id", "full_name", "short_name", "department_id", "department")
+
+    def __init__(self, user, department_names):
+        self.id = int(user["ID"])
+        self.full_name = f"{user.get('LAST_NAME', '')} {user.get('NAME', '')} {user.get('SECOND_NAME', '')}".strip()
+        self.short_name = f"{user.get('LAST_NAME', '')} {user.get('NAME', '')}".strip()
+
+        department_ids = user.get("UF_DEPARTMENT") or []
+        self.department_id = int(department_ids[0]) if department_ids and department_ids[0] else None
+        self.department = ""
+        if department_ids:
+            self.department = department_names.get(self.department_id, "Не указан")
+
+
+class OrgModel:
+    # Структура компании одного портала. Для каждого отдела один раз
+    # вычисляется цепочка руководителей вверх по дереву (ID в порядке
+    # подъема), цепочка сотрудника — цепочка его основного отдела.
+    def __init__(self, users, departments):
+        self.department_names = {int(dept["ID"]): dept["NAME"] for dept in departments}
+        heads = {}
+        for dept in departments:
+            if dept.get("ID") and dept.get("UF_HEAD"):
+                heads[int(dept["ID"])] = int(dept["UF_HEAD"])
+
+        self.users = {}
+        for user in users:
+            org_user = OrgUser(user, self.department_names)
+            self.users[org_user.id] = org_user
+
+        self.chains = {}
+        for org_user in self.users.values():
+            if org_user.department_id and org_user.department_id not in self.chains:
+                self.chains[org_user.department_id] = self._walk(org_user.department_id, heads)
+
+    def __len__(self):
+        return len(self.users)
+
+    def _walk(self, department_id, heads):
+        chain = []
+        visited = set()
+        current = department_id
+        while current and current not in visited:
+            visited.add(current)
+            head = self.users.get(heads.get(current))
+            if head is None:
+                break
+            chain.append(head.id)
+            current = head.department_id
+        return tuple(chain)
+
+    def get_managers(self, user):
+        # Цепочка обрывается на самом сотруднике: руководитель отдела не
+        # подчиняется сам себе и тем, кто выше него в этой же цепочке.
+        chain = self.chains.get(user.department_id, ())
+        if user.id in chain:
+            chain = chain[:chain.index(user.id)]
+        return [self.users[user_id] for user_id in chain]
+
+
+_models = OrderedDict()
+_models_lock = threading.Lock()
+
+
+def get_org_model(member_id, loader):
+    # Модели хранятся в памяти процесса по порталам (не более ORG_MODEL_MAX_PORTALS)
+    # и пересобираются по истечении ORG_MODEL_TTL либо после события об
+    # изменении сотрудников и отделов: событие увеличивает версию структуры
+    # портала в базе, и каждый процесс сверяет с ней свою копию.
+    version = get_data_version(member_id, ORG_VERSION_NAME)
+    with _models_lock:
+        entry = _models.get(member_id)
+        if (
+            entry
+            and entry[2] == version
+            and time.monotonic() - entry[0] < settings.ORG_MODEL_TTL
+        ):
+            _models.move_to_end(member_id)
+            return entry[1]
+
+    started = time.monotonic()
+    users, departments = loader()
+    model = OrgModel(users, departments)
+    logger.info(
+        f"Структура компании портала {member_id} собрана: {len(model)} сотрудников, "
+        f"{len(model.department_names)} отделов за {time.monotonic() - started:.2f} с"
+    )
+
+    with _models_lock:
+        _models[member_id] = (started, model, version)
+        _models.move_to_end(member_id)
+        while len(_models) > settings.ORG_MODEL_MAX_PORTALS:
+            _models.popitem(last=False)
+    return model
+
+
+def invalidate_org_model(member_id):
+    bump_data_version(member_id, ORG_VERSION_NAME)
+    with _models_lock:
+        _models.pop(member_id, None)
+
+
+def handle_org_event(event, member_id, entity_id):
+    invalidate_org_model(member_id)
@@ -0,0 +1,224 @@
+from datetime import datetime, timedelta, timezone as dt_timezone
+from unittest import mock
+
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.utils import timezone
+
+from apps.core.versions import bump_data_version
+
+from .calls import CALL_TYPE_OUTGOING, CallStatsService
+from .models import CallRollup, CallSyncState
+from .org import ORG_VERSION_NAME, OrgModel, get_org_model, handle_org_event
+
+DEPARTMENTS = [
+    {"ID": "1", "NAME": "Компания", "UF_HEAD": "1"},
+    {"ID": "2", "NAME": "Продажи", "UF_HEAD": "2", "PARENT": "1"},
+    {"ID": "3", "NAME": "Опт", "UF_HEAD": "3", "PARENT": "2"},
+    {"ID": "4", "NAME": "Склад"},
+]
+USERS = [
+    {"ID": "1", "LAST_NAME": "Иванов", "NAME": "Иван", "UF_DEPARTMENT": [1]},
+    {"ID": "2", "LAST_NAME": "Петров", "NAME": "Петр", "UF_DEPARTMENT": [1]},
+    {"ID": "3", "LAST_NAME": "Сидоров", "NAME": "Олег", "UF_DEPARTMENT": [2]},
+    {"ID": "4", "LAST_NAME": "Смирнова", "NAME": "Анна", "SECOND_NAME": "Петровна", "UF_DEPARTMENT": [3]},
+    {"ID": "5", "LAST_NAME": "Кузнецов", "NAME": "Олег", "UF_DEPARTMENT": [4]},
+    {"ID": "6", "LAST_NAME": "Новиков", "NAME": "Илья"},
+]
+
+
+def manager_names(org, user_id):
+    return [manager.short_name for manager in org.get_managers(org.users[user_id])]
+
+
+class OrgModelTests(SimpleTestCase):
+    def setUp(self):
+        self.org = OrgModel(USERS, DEPARTMENTS)
+
+    def test_managers_follow_head_chain(self):
+        self.assertEqual(manager_names(self.org, 4), ["Сидоров Олег", "Петров Петр", "Иванов Иван"])
+        self.assertEqual(manager_names(self.org, 3), ["Петров Петр", "Иванов Иван"])
+
+    def test_head_is_not_own_manager(self):
+        self.assertEqual(manager_names(self.org, 2), ["Иванов Иван"])
+        self.assertEqual(manager_names(self.org, 1), [])
+
+    def test_department_without_head_or_user_without_department(self):
+        self.assertEqual(manager_names(self.org, 5), [])
+        self.assertEqual(manager_names(self.org, 6), [])
+        self.assertEqual(self.org.users[5].department, "Склад")
+        self.assertEqual(self.org.users[6].department, "")
+
+    def test_names(self):
+        user = self.org.users[4]
+        self.assertEqual(user.full_name, "Смирнова Анна Петровна")
+        self.assertEqual(user.short_name, "Смирнова Анна")
+
+    def test_cycle_in_heads_terminates(self):
+        departments = [
+            {"ID": "1", "NAME": "A", "UF_HEAD": "2"},
+            {"ID": "2", "NAME": "B", "UF_HEAD": "1"},
+        ]
+        users = [
+            {"ID": "1", "NAME": "A", "UF_DEPARTMENT": [1]},
+            {"ID": "2", "NAME": "B", "UF_DEPARTMENT": [2]},
+            {"ID": "3", "NAME": "C", "UF_DEPARTMENT": [1]},
+        ]
+        org = OrgModel(users, departments)
+        self.assertEqual(manager_names(org, 3), ["B", "A"])
+
+
+@override_settings(ORG_MODEL_TTL=600, ORG_MODEL_MAX_PORTALS=2)
+class OrgModelCacheTests(TestCase):
+    def setUp(self):
+        self.loads = []
+
+    def loader(self, member_id):
+        def load():
+            self.loads.append(member_id)
+            return USERS, DEPARTMENTS
+
+        return load
+
+    def test_model_is_built_once_per_portal(self):
+        first = get_org_model("test-org-a", self.loader("test-org-a"))
+        self.assertIs(get_org_model("test-org-a", self.loader("test-org-a")), first)
+        self.assertEqual(self.loads, ["test-org-a"])
+
+    def test_event_invalidates_model(self):
+        get_org_model("test-org-b", self.loader("test-org-b"))
+        handle_org_event("ONUSERUPDATE", "test-org-b", "4")
+        get_org_model("test-org-b", self.loader("test-org-b"))
+        self.assertEqual(self.loads, ["test-org-b", "test-org-b"])
+
+    def test_event_in_other_process_invalidates_model(self):
+        # Другой процесс только увеличивает версию в базе, копия этого
+        # процесса остается в памяти.
+        first = get_org_model("test-org-f", self.loader("test-org-f"))
+        bump_data_version("test-org-f", ORG_VERSION_NAME)
+        self.assertIsNot(get_org_model("test-org-f", self.loader("test-org-f")), first)
+        get_org_model("test-org-f", self.loader("test-org-f"))
+        self.assertEqual(self.loads, ["test-org-f", "test-org-f"])
+
+    def test_least_recently_used_portal_is_evicted(self):
+        for member_id in ("test-org-c", "test-org-d", "test-org-c", "test-org-e", "test-org-c", "test-org-d"):
+            get_org_model(member_id, self.loader(member_id))
+        self.assertEqual(self.loads, ["test-org-c", "test-org-d", "test-org-e", "test-org-d"])
+
+
+class FakeCallToken:
+    # voximplant.statistic.get: звонки с ID больше водяного знака, по 50.
+    def __init__(self, calls):
+        self.calls = calls
+        self.filters = []
+
+    def call_api_method(self, method, params):
+        self.filters.append(params["FILTER"])
+        after = params["FILTER"][">ID"]
+        return {"result": [call for call in self.calls if int(call["ID"]) > after][:50]}
+
+
+def make_call(call_id, start, duration, user_id="7", call_type=CALL_TYPE_OUTGOING):
+    return {
+        "ID": str(call_id),
+        "CALL_START_DATE": start.isoformat(),
+        "CALL_DURATION": str(duration),
+        "PORTAL_USER_ID": user_id,
+        "CALL_TYPE": str(call_type),
+    }
+
+
+@override_settings(CALL_STATS_BACKFILL_DAYS=30, CALL_ROLLUP_RETENTION_DAYS=90)
+class CallStatsSyncTests(TestCase):
+    def setUp(self):
+        self.hour = (timezone.now() - timedelta(hours=2)).replace(minute=0, second=0, microsecond=0)
+        # 60 звонков одного часа: две страницы, длинный — каждый второй.
+        self.calls = [
+            make_call(n, self.hour + timedelta(seconds=n), 90 if n % 2 else 30) for n in range(1, 61)
+        ]
+        self.token = FakeCallToken(self.calls)
+        self.service = CallStatsService(self.token, member_id="test-calls")
+
+    def test_rollup_accumulates_across_pages(self):
+        self.assertEqual(self.service.sync(), 60)
+
+        rollup = CallRollup.objects.get(member_id="test-calls")
+        self.assertEqual(rollup.hour, self.hour)
+        self.assertEqual(
+            (rollup.calls_count, rollup.long_calls_count, rollup.total_duration), (60, 30, 30 * 90 + 30 * 30)
+        )
+
+    def test_watermark_advances(self):
+        self.service.sync()
+
+        state = CallSyncState.objects.get(member_id="test-calls")
+        self.assertEqual(state.last_call_id, 60)
+        self.assertIsNotNone(state.last_synced_at)
+        self.assertEqual([f[">ID"] for f in self.token.filters], [0, 50])
+        self.assertIn(">=CALL_START_DATE", self.token.filters[0])
+        self.assertNotIn(">=CALL_START_DATE", self.token.filters[1])
+
+        self.calls.append(make_call(61, self.hour, 120))
+        self.assertEqual(self.service.sync(), 1)
+        self.assertEqual(self.token.filters[-1], {">ID": 60})
+        rollup = CallRollup.objects.get(member_id="test-calls")
+        self.assertEqual((rollup.calls_count, rollup.long_calls_count), (61, 31))
+
+    def test_rollups_older_than_retention_are_deleted(self):
+        now = timezone.now()
+        for days in (91, 89):
+            CallRollup.objects.create(
+                member_id="test-calls", hour=now - timedelta(days=days), user_id=7, call_type=1
+            )
+        CallRollup.objects.create(member_id="other", hour=now - timedelta(days=91), user_id=7, call_type=1)
+
+        self.token.calls = []
+        self.service.sync()
+
+        self.assertEqual(
+            sorted((r.member_id, (now - r.hour).days) for r in CallRollup.objects.all()),
+            [("other", 91), ("test-calls", 89)],
+        )
+
+
+class CallStatsWindowTests(TestCase):
+    def setUp(self):
+        self.now = datetime(2026, 10, 18, 12, 30, tzinfo=dt_timezone.utc)
+        self.service = CallStatsService(None, member_id="test-windows")
+
+    def rollup(self, hour, long_calls, call_type=CALL_TYPE_OUTGOING, member_id="test-windows", user_id=7):
+        CallRollup.objects.create(
+            member_id=member_id,
+            hour=hour,
+            user_id=user_id,
+            call_type=call_type,
+            calls_count=long_calls,
+            long_calls_count=long_calls,
+        )
+
+    def get_long_calls(self, window):
+        with mock.patch("apps.employees.calls.timezone.now", return_value=self.now):
+            return self.service.get_long_calls(window)
+
+    def test_window_starts_at_hour_boundary(self):
+        # Окно 24 часа от 12:30 начинается в 12:00 предыдущего дня.
+        self.rollup(datetime(2026, 10, 17, 11, 0, tzinfo=dt_timezone.utc), 1)
+        self.rollup(datetime(2026, 10, 17, 12, 0, tzinfo=dt_timezone.utc), 2)
+        self.rollup(datetime(2026, 10, 18, 12, 0, tzinfo=dt_timezone.utc), 4)
+        self.rollup(datetime(2026, 10, 11, 12, 0, tzinfo=dt_timezone.utc), 8)
+        self.rollup(datetime(2026, 10, 11, 11, 0, tzinfo=dt_timezone.utc), 16, user_id=8)
+
+        self.assertEqual(self.get_long_calls("24h"), {"7": 6})
+        self.assertEqual(self.get_long_calls("7d"), {"7": 15})
+        self.assertEqual(self.get_long_calls("30d"), {"7": 15, "8": 16})
+
+    def test_only_outgoing_calls_of_portal_are_counted(self):
+        hour = datetime(2026, 10, 18, 10, 0, tzinfo=dt_timezone.utc)
+        self.rollup(hour, 1)
+        self.rollup(hour, 2, call_type=2)
+        self.rollup(hour, 4, member_id="other")
+
+        self.assertEqual(self.get_long_calls("24h"), {"7": 1})
+
+    def test_unknown_window_falls_back_to_24_hours(self):
+        self.rollup(datetime(2026, 10, 16, 12, 0, tzinfo=dt_timezone.utc), 1)
+        self.assertEqual(self.get_long_calls("1y"), {})
@@ -6,4 +6,5 @@ app_name = "employees"
 
 urlpatterns = [
     path("", views.index, name="index"),
+    path("data/", views.employees_data, name="data"),
 ]
@@ -1,22 +1,71 @@
 import logging
 
+from django.http import JsonResponse
 from django.shortcuts import render
 
 from apps.core.decorators import smart_auth
+from .calls import CALL_WINDOWS, DEFAULT_CALL_WINDOW
 from .services import EmployeeService
 
 logger = logging.getLogger(__name__)
 
 
+def get_window(request):
+    window = request.GET.get("window")
+    if window not in CALL_WINDOWS:
+        window = DEFAULT_CALL_WINDOW
+    return window
+
+
 @smart_auth
 def index(request):
     try:
+        window = get_window(request)
+        search = request.GET.get("q", "").strip()
+
         service = EmployeeService(request.bitrix_user_token)
-        employees_data = service.get_employees_data()
-        context = {"employees": employees_data}
-        logger.info("Получены данные о сотрудниках и иерархии (batch)")
+        employees_page = service.get_employees_page(
+            window, search=search, page=request.GET.get("page")
+        )
+
+        query = request.GET.copy()
+        query.pop("page", None)
+
+        context = {
+            "employees": employees_page,
+            "window": window,
+            "window_label": CALL_WINDOWS[window][0],
+            "call_windows": {key: label for key, (label, _) in CALL_WINDOWS.items()},
+            "search": search,
+            "base_query": query.urlencode(),
+        }
+        logger.info(f"Получены данные о сотрудниках: {employees_page.paginator.count}")
         return render(request, "employees/index.html", context)
 
     except Exception as e:
         logger.error("Ошибка при получении данных сотрудников: %s", str(e))
         return render(request, "employees/error.html", {"error": str(e)})
+
+
+@smart_auth
+def employees_data(request):
+    # Следующие страницы таблицы для подгрузки без перезагрузки страницы.
+    try:
+        service = EmployeeService(request.bitrix_user_token)
+        employees_page = service.get_employees_page(
+            get_window(request),
+            search=request.GET.get("q", "").strip(),
+            page=request.GET.get("page"),
+        )
+        return JsonResponse(
+            {
+                "employees": employees_page.object_list,
+                "page": employees_page.number,
+                "num_pages": employees_page.paginator.num_pages,
+                "total": employees_page.paginator.count,
+                "has_next": employees_page.has_next(),
+            }
+        )
+    except Exception as e:
+        logger.error(f"Ошибка при получении страницы сотрудников: {e}")
+        return JsonResponse({"error": str(e)}, status=500)
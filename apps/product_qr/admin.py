@@ -0,0 +1,14 @@
+from django.contrib import admin
+
+from .models import ProductQR
+
+
+@admin.register(ProductQR)
+class ProductQRAdmin(admin.ModelAdmin):
+    # Список читается по индексу product_qr_created_idx, поиск — точный по
+    # member_id/product_id (индекс product_qr_product_idx). Полный COUNT по
+    # большой таблице не выполняется.
+    list_display = ["uuid", "product_id", "member_id", "created_at"]
+    search_fields = ["=product_id", "=member_id"]
+    show_full_result_count = False
+    readonly_fields = ["uuid", "product_id", "member_id", "product_data", "created_at"]
@@ -0,0 +1,366 @@
+import hashlib
+import logging
+import multiprocessing
+import re
+import time
+import zlib
+import zipfile
+from concurrent.futures import ProcessPoolExecutor
+from io import BytesIO
+
+import django
+from django.conf import settings
+from django.utils import timezone
+from PIL import Image, ImageDraw, ImageFont
+
+from apps.core.batch import PAGE_SIZE, chunked, iter_list_pages, run_batches
+from apps.core.bitrix import get_batch_error, get_member_id
+from .models import ProductQR, ProductQRImage
+from .services import find_product_qr, get_public_url, render_qr_image
+
+logger = logging.getLogger(__name__)
+
+PRODUCT_SELECT = ["*", "PROPERTY_*"]
+OUTPUT_ZIP = "zip"
+OUTPUT_PDF = "pdf"
+OUTPUT_FILES = {
+    OUTPUT_ZIP: ("qr_codes.zip", "application/zip"),
+    OUTPUT_PDF: ("qr_labels.pdf", "application/pdf"),
+}
+
+# Лист A4 при 150 dpi: 3 x 4 этикетки с QR-кодом и подписью
+SHEET_SIZE = (1240, 1754)
+SHEET_MARGIN = 60
+SHEET_COLUMNS = 3
+SHEET_ROWS = 4
+LABEL_CAPTION_HEIGHT = 60
+SHEET_RESOLUTION = 150
+# Размер листа в пунктах PDF (1/72 дюйма)
+SHEET_PAGE_SIZE = tuple(round(size * 72 / SHEET_RESOLUTION, 2) for size in SHEET_SIZE)
+
+
+def parse_product_ids(text):
+    ids = []
+    seen = set()
+    for value in re.split(r"[\s,;]+", text or ""):
+        if not value:
+            continue
+        if not value.isdigit():
+            raise ValueError(f"ID товара должен быть числом: {value}")
+        if value not in seen:
+            seen.add(value)
+            ids.append(value)
+    return ids
+
+
+def get_label_font():
+    # Шрифт по умолчанию в Pillow может не содержать кириллицы.
+    if settings.QR_LABEL_FONT:
+        return ImageFont.truetype(settings.QR_LABEL_FONT, 24)
+    return ImageFont.load_default()
+
+
+def render_qr_task(task):
+    # Выполняется в дочернем процессе: на входе (публичная ссылка, формат).
+    public_url, image_format = task
+    return render_qr_image(public_url, image_format)
+
+
+class ZipStream:
+    # Файловый объект без seek для zipfile: записанное забирается по частям
+    # и сразу отдается клиенту, архив целиком в памяти не собирается.
+    def __init__(self):
+        self.chunks = []
+
+    def write(self, data):
+        self.chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def drain(self):
+        data = b"".join(self.chunks)
+        self.chunks = []
+        return data
+
+
+def iter_zip(files):
+    stream = ZipStream()
+    # PNG уже сжат, поэтому архив без сжатия.
+    with zipfile.ZipFile(stream, "w", compression=zipfile.ZIP_STORED) as archive:
+        for name, content in files:
+            archive.writestr(name, content)
+            yield stream.drain()
+    yield stream.drain()
+
+
+def iter_pdf(sheets):
+    # Минимальный PDF из черно-белых листов: каждый лист записывается
+    # и отдается сразу после отрисовки, в памяти держится один лист.
+    # Объект 1 — каталог, 2 — дерево страниц; они пишутся в конце,
+    # когда известен список страниц.
+    offsets = {}
+    position = 0
+    pages = []
+
+    def write_object(number, body, stream=None):
+        nonlocal position
+        offsets[number] = position
+        data = f"{number} 0 obj\n".encode() + body
+        if stream is not None:
+            data += b"\nstream\n" + stream + b"\nendstream"
+        data += b"\nendobj\n"
+        position += len(data)
+        return data
+
+    header = b"%PDF-1.4\n%\xe2\xe3\xcf\xd3\n"
+    position = len(header)
+    yield header
+
+    width, height = SHEET_PAGE_SIZE
+    number = 3
+    for sheet in sheets:
+        image_data = zlib.compress(sheet.tobytes())
+        content = f"q {width} 0 0 {height} 0 0 cm /Im0 Do Q".encode()
+        image_number, content_number, page_number = number, number + 1, number + 2
+        number += 3
+        chunk = write_object(
+            image_number,
+            (
+                f"<< /Type /XObject /Subtype /Image /Width {sheet.width} /Height {sheet.height} "
+                f"/ColorSpace /DeviceGray /BitsPerComponent 1 /Filter /FlateDecode "
+                f"/Length {len(image_data)} >>"
+            ).encode(),
+            image_data,
+        )
+        chunk += write_object(content_number, f"<< /Length {len(content)} >>".encode(), content)
+        chunk += write_object(
+            page_number,
+            (
+                f"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 {width} {height}] "
+                f"/Resources << /XObject << /Im0 {image_number} 0 R >> >> "
+                f"/Contents {content_number} 0 R >>"
+            ).encode(),
+        )
+        pages.append(page_number)
+        yield chunk
+
+    kids = " ".join(f"{page} 0 R" for page in pages)
+    chunk = write_object(1, b"<< /Type /Catalog /Pages 2 0 R >>")
+    chunk += write_object(2, f"<< /Type /Pages /Kids [{kids}] /Count {len(pages)} >>".encode())
+    xref = [f"xref\n0 {number}\n", "0000000000 65535 f \n"]
+    xref += [f"{offsets[n]:010d} 00000 n \n" for n in range(1, number)]
+    chunk += "".join(xref).encode()
+    chunk += f"trailer\n<< /Size {number} /Root 1 0 R >>\nstartxref\n{position}\n%%EOF\n".encode()
+    yield chunk
+
+
+class ProductQRBulkService:
+    def __init__(self, bitrix_user_token, member_id=None):
+        self.but = bitrix_user_token
+        self.member_id = member_id or get_member_id(bitrix_user_token)
+
+    def get_products(self, product_ids=None, section_id=None):
+        if product_ids and len(product_ids) > settings.QR_BULK_MAX_PRODUCTS:
+            raise ValueError(
+                f"Слишком много товаров: {len(product_ids)}, максимум {settings.QR_BULK_MAX_PRODUCTS}"
+            )
+
+        if section_id:
+            products = list(
+                iter_list_pages(
+                    self.but,
+                    "crm.product.list",
+                    {
+                        "order": {"ID": "ASC"},
+                        "filter": {"SECTION_ID": section_id},
+                        "select": PRODUCT_SELECT,
+                    },
+                    member_id=self.member_id,
+                )
+            )
+        else:
+            products = self._get_products_by_id(product_ids)
+
+        if not products:
+            raise ValueError("Товары не найдены")
+        if len(products) > settings.QR_BULK_MAX_PRODUCTS:
+            raise ValueError(
+                f"Слишком много товаров: {len(products)}, максимум {settings.QR_BULK_MAX_PRODUCTS}"
+            )
+        return products
+
+    def _get_products_by_id(self, product_ids):
+        # По 50 ID в команде crm.product.list и до 50 команд в batch-запросе.
+        commands = [
+            (
+                f"products_{n}",
+                "crm.product.list",
+                {"filter": {"@ID": ids}, "select": PRODUCT_SELECT, "start": -1},
+            )
+            for n, ids in enumerate(chunked(product_ids, PAGE_SIZE))
+        ]
+        result = run_batches(self.but, commands, member_id=self.member_id)
+
+        products_by_id = {}
+        for cmd_id, _, _ in commands:
+            res = result.get(cmd_id)
+            error = get_batch_error(res)
+            if error:
+                raise ValueError(f"Ошибка получения товаров: {error}")
+            for product in res.get("result") or []:
+                products_by_id[str(product["ID"])] = product
+
+        missing = [product_id for product_id in product_ids if product_id not in products_by_id]
+        if missing:
+            raise ValueError(f"Товары не найдены: {', '.join(missing[:20])}")
+        return [products_by_id[product_id] for product_id in product_ids]
+
+    def generate(
+        self,
+        products,
+        file,
+        output=OUTPUT_ZIP,
+        image_format=ProductQRImage.FORMAT_PNG,
+        force_new=False,
+        progress=None,
+    ):
+        # Результат пишется в file по частям: архив или PDF целиком в памяти
+        # не собирается.
+        if output == OUTPUT_PDF:
+            image_format = ProductQRImage.FORMAT_PNG
+
+        # Товары, у которых уже есть QR-код, получают существующий код и
+        # сохраненное изображение; новые записи и рендеринг — только для остальных.
+        existing = {}
+        if not force_new:
+            existing = find_product_qr(self.member_id, [str(product["ID"]) for product in products])
+
+        refreshed_at = timezone.now()
+        created = ProductQR.objects.bulk_create(
+            [
+                ProductQR(
+                    product_id=str(product["ID"]),
+                    member_id=self.member_id,
+                    product_data=product,
+                    refreshed_at=refreshed_at,
+                )
+                for product in products
+                if str(product["ID"]) not in existing
+            ],
+            batch_size=500,
+        )
+        changed = []
+        for product in products:
+            qr_record = existing.get(str(product["ID"]))
+            if qr_record is not None and qr_record.product_data != product:
+                qr_record.product_data = product
+                qr_record.refreshed_at = refreshed_at
+                changed.append(qr_record)
+        ProductQR.objects.bulk_update(changed, ["product_data", "refreshed_at"], batch_size=500)
+
+        created_records = iter(created)
+        qr_records = [
+            existing.get(str(product["ID"])) or next(created_records) for product in products
+        ]
+
+        stored = {
+            image.qr_id: bytes(image.content)
+            for image in ProductQRImage.objects.filter(
+                qr__in=list(existing.values()), format=image_format
+            )
+        }
+        missing = [qr_record for qr_record in qr_records if qr_record.uuid not in stored]
+
+        started = time.monotonic()
+        ready = len(qr_records) - len(missing)
+        if progress:
+            progress(ready)
+
+        def render_progress(count):
+            if progress:
+                progress(ready + count)
+
+        rendered = self.render_images(missing, image_format, progress=render_progress)
+        logger.info(
+            f"Сгенерировано QR-кодов: {len(rendered)} за {time.monotonic() - started:.1f} с, "
+            f"взято готовых: {ready}"
+        )
+
+        ProductQRImage.objects.bulk_create(
+            [
+                ProductQRImage(
+                    qr=qr_record,
+                    format=image_format,
+                    content=content,
+                    etag=hashlib.sha256(content).hexdigest()[:32],
+                )
+                for qr_record, content in zip(missing, rendered)
+            ],
+            batch_size=500,
+            ignore_conflicts=True,
+        )
+        stored.update((qr_record.uuid, content) for qr_record, content in zip(missing, rendered))
+        images = [stored[qr_record.uuid] for qr_record in qr_records]
+
+        if output == OUTPUT_PDF:
+            chunks = iter_pdf(self.iter_sheets(products, images))
+        else:
+            chunks = iter_zip(
+                (f"qr_product_{product['ID']}.{image_format}", content)
+                for product, content in zip(products, images)
+            )
+        for chunk in chunks:
+            file.write(chunk)
+
+    def render_images(self, qr_records, image_format, workers=None, progress=None):
+        tasks = [(get_public_url(qr_record.uuid), image_format) for qr_record in qr_records]
+        workers = workers or settings.QR_BULK_WORKERS
+        if workers <= 1 or len(tasks) < PAGE_SIZE:
+            return self._collect(map(render_qr_task, tasks), progress)
+        # Процессы запускаются через spawn: fork из потока веб-воркера может
+        # унаследовать захваченные блокировки и зависнуть.
+        with ProcessPoolExecutor(
+            max_workers=workers,
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=django.setup,
+        ) as executor:
+            return self._collect(
+                executor.map(render_qr_task, tasks, chunksize=max(len(tasks) // (workers * 4), 1)),
+                progress,
+            )
+
+    def _collect(self, results, progress):
+        rendered = []
+        for content in results:
+            rendered.append(content)
+            if progress and len(rendered) % PAGE_SIZE == 0:
+                progress(len(rendered))
+        if progress:
+            progress(len(rendered))
+        return rendered
+
+    def iter_sheets(self, products, images):
+        cell_width = (SHEET_SIZE[0] - 2 * SHEET_MARGIN) // SHEET_COLUMNS
+        cell_height = (SHEET_SIZE[1] - 2 * SHEET_MARGIN) // SHEET_ROWS
+        qr_size = min(cell_width, cell_height - LABEL_CAPTION_HEIGHT) - 20
+        font = get_label_font()
+        per_sheet = SHEET_COLUMNS * SHEET_ROWS
+
+        # Черно-белые листы (1 бит на точку) рисуются по одному.
+        for start in range(0, len(products), per_sheet):
+            sheet = Image.new("1", SHEET_SIZE, 1)
+            draw = ImageDraw.Draw(sheet)
+            for n, (product, content) in enumerate(
+                zip(products[start:start + per_sheet], images[start:start + per_sheet])
+            ):
+                left = SHEET_MARGIN + (n % SHEET_COLUMNS) * cell_width
+                top = SHEET_MARGIN + (n // SHEET_COLUMNS) * cell_height
+                qr_image = Image.open(BytesIO(content)).convert("1").resize(
+                    (qr_size, qr_size), Image.NEAREST
+                )
+                sheet.paste(qr_image, (left + (cell_width - qr_size) // 2, top))
+                caption = f"{product['ID']} {product.get('NAME') or ''}"[:40]
+                draw.text((left + 10, top + qr_size + 10), caption, fill=0, font=font)
+            yield sheet
@@ -0,0 +1,152 @@
+import hashlib
+import logging
+import os
+import tempfile
+import threading
+from io import BytesIO
+from pathlib import Path
+
+import requests
+from django.conf import settings
+from PIL import Image, ImageOps
+
+logger = logging.getLogger(__name__)
+
+# Ширина миниатюр в пикселях: мобильный экран, планшет, ретина
+THUMBNAIL_SIZES = {
+    "s": 320,
+    "m": 640,
+    "l": 1280,
+}
+THUMBNAIL_FORMATS = {
+    "webp": ("WEBP", "image/webp"),
+    "jpg": ("JPEG", "image/jpeg"),
+}
+THUMBNAIL_QUALITY = 80
+SOURCE_CHUNK_SIZE = 64 * 1024
+
+_locks = {}
+_locks_lock = threading.Lock()
+
+
+def get_image_version(source_url):
+    return hashlib.sha256(source_url.encode()).hexdigest()[:16]
+
+
+def get_cache_dir():
+    return Path(settings.QR_IMAGE_CACHE_DIR)
+
+
+def get_thumbnail_path(source_url, size, image_format):
+    return get_cache_dir() / f"{get_image_version(source_url)}_{size}.{image_format}"
+
+
+def get_thumbnail(source_url, size, image_format):
+    # Возвращает открытый файл миниатюры. Оригинал скачивается с портала
+    # один раз, при первом запросе любой миниатюры: сразу готовятся все
+    # размеры в WebP и JPEG. Параллельные запросы той же картинки ждут первый
+    # вместо повторного скачивания. Файл открывается сразу после проверки:
+    # если его успели вытеснить из кеша, миниатюры собираются заново.
+    # В логи и ошибки попадает только версия картинки: адрес может содержать
+    # ключ webhook.
+    path = get_thumbnail_path(source_url, size, image_format)
+    try:
+        file = open(path, "rb")
+    except FileNotFoundError:
+        pass
+    else:
+        touch(path)
+        return file
+
+    version = get_image_version(source_url)
+    with _locks_lock:
+        lock = _locks.setdefault(version, threading.Lock())
+    try:
+        with lock:
+            for _ in range(2):
+                try:
+                    return open(path, "rb")
+                except FileNotFoundError:
+                    build_thumbnails(source_url, fetch_source(source_url))
+                    evict_thumbnails(keep=version)
+            return open(path, "rb")
+    finally:
+        with _locks_lock:
+            _locks.pop(version, None)
+
+
+def fetch_source(source_url):
+    version = get_image_version(source_url)
+    try:
+        response = requests.get(source_url, stream=True, timeout=10)
+        response.raise_for_status()
+    except requests.HTTPError as e:
+        raise ValueError(
+            f"Портал вернул {e.response.status_code} для картинки {version}"
+        ) from None
+    except requests.RequestException as e:
+        raise ValueError(f"Не удалось скачать картинку {version}: {type(e).__name__}") from None
+
+    content = BytesIO()
+    with response:
+        for chunk in response.iter_content(SOURCE_CHUNK_SIZE):
+            content.write(chunk)
+            if content.tell() > settings.QR_IMAGE_MAX_SOURCE_BYTES:
+                raise ValueError(
+                    f"Картинка {version} больше {settings.QR_IMAGE_MAX_SOURCE_BYTES} байт"
+                )
+    content.seek(0)
+    return content
+
+
+def build_thumbnails(source_url, content):
+    image = Image.open(content)
+    image = ImageOps.exif_transpose(image).convert("RGB")
+
+    cache_dir = get_cache_dir()
+    cache_dir.mkdir(parents=True, exist_ok=True)
+    for size, width in THUMBNAIL_SIZES.items():
+        thumbnail = image.copy()
+        thumbnail.thumbnail((width, width * 4))
+        for image_format, (pil_format, _) in THUMBNAIL_FORMATS.items():
+            # Запись во временный файл и переименование: читатели не видят
+            # недописанных миниатюр.
+            with tempfile.NamedTemporaryFile(dir=cache_dir, suffix=".tmp", delete=False) as file:
+                thumbnail.save(file, format=pil_format, quality=THUMBNAIL_QUALITY)
+            os.chmod(file.name, 0o644)
+            os.replace(file.name, get_thumbnail_path(source_url, size, image_format))
+    logger.info(f"Миниатюры картинки товара готовы: {get_image_version(source_url)}")
+
+
+def touch(path):
+    # Время изменения файла служит отметкой последнего обращения для LRU.
+    try:
+        os.utime(path)
+    except OSError:
+        pass
+
+
+def evict_thumbnails(keep=None):
+    # Кеш ограничен QR_IMAGE_CACHE_MAX_BYTES: удаляются файлы, к которым
+    # дольше всего не обращались. Только что собранные миниатюры (keep)
+    # не удаляются, даже если кеш меньше одного набора.
+    files = []
+    total = 0
+    for entry in os.scandir(get_cache_dir()):
+        if entry.is_file() and not entry.name.endswith(".tmp"):
+            if keep and entry.name.startswith(f"{keep}_"):
+                total += entry.stat().st_size
+                continue
+            stat = entry.stat()
+            files.append((stat.st_mtime, stat.st_size, entry.path))
+            total += stat.st_size
+
+    files.sort()
+    for _, size, path in files:
+        if total <= settings.QR_IMAGE_CACHE_MAX_BYTES:
+            break
+        try:
+            os.remove(path)
+        except OSError:
+            continue
+        total -= size
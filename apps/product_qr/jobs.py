@@ -0,0 +1,119 @@
+import logging
+import tempfile
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.files import File
+from django.db.models import Q
+from django.utils import timezone
+
+from apps.core.background import run_in_background
+from apps.core.bitrix import get_member_id
+from .bulk import OUTPUT_FILES, ProductQRBulkService
+from .models import ProductQRBulkJob
+
+logger = logging.getLogger(__name__)
+
+# Прогресс сохраняется после каждых 50 изображений; задача без обновлений
+# дольше этого срока прервана перезапуском процесса.
+STALE_JOB_TIMEOUT = timedelta(minutes=5)
+
+
+class ProductQRBulkJobService:
+    def __init__(self, bitrix_token, member_id=None):
+        self.but = bitrix_token
+        self.member_id = member_id or get_member_id(bitrix_token)
+
+    def create_job(self, product_ids, section_id, output, image_format, force_new):
+        self.delete_expired()
+        return ProductQRBulkJob.objects.create(
+            member_id=self.member_id,
+            product_ids=product_ids,
+            section_id=section_id,
+            output=output,
+            image_format=image_format,
+            force_new=force_new,
+        )
+
+    def get_job(self, job_id):
+        job = ProductQRBulkJob.objects.filter(member_id=self.member_id, pk=job_id).first()
+        if (
+            job is not None
+            and not job.is_finished
+            and job.updated_at < timezone.now() - STALE_JOB_TIMEOUT
+        ):
+            job.status = ProductQRBulkJob.STATUS_FAILED
+            job.error = "Генерация прервана перезапуском сервера, запустите ее заново"
+            job.finished_at = timezone.now()
+            job.save()
+        return job
+
+    def process_in_background(self, job):
+        return run_in_background(f"product-qr-bulk:{job.pk}", self.process, job.pk)
+
+    def process(self, job_id):
+        # Задачу берет только тот, кто первым перевел ее из очереди.
+        claimed = ProductQRBulkJob.objects.filter(
+            member_id=self.member_id, pk=job_id, status=ProductQRBulkJob.STATUS_PENDING
+        ).update(status=ProductQRBulkJob.STATUS_RUNNING, updated_at=timezone.now())
+        if not claimed:
+            logger.info(f"Массовая генерация {job_id} уже выполняется или завершена")
+            return None
+
+        job = ProductQRBulkJob.objects.get(pk=job_id)
+        try:
+            self._process(job)
+            job.status = ProductQRBulkJob.STATUS_DONE
+        except Exception as e:
+            logger.error(f"Ошибка массовой генерации QR-кодов {job.pk}: {e}")
+            job.status = ProductQRBulkJob.STATUS_FAILED
+            job.error = str(e)
+
+        job.finished_at = timezone.now()
+        job.save()
+        return job
+
+    def _process(self, job):
+        service = ProductQRBulkService(self.but, member_id=self.member_id)
+        products = service.get_products(product_ids=job.product_ids, section_id=job.section_id)
+        job.total_count = len(products)
+        job.save(update_fields=["total_count", "updated_at"])
+        logger.info(f"Массовая генерация QR-кодов {job.pk}: {len(products)} товаров")
+
+        def progress(count):
+            job.processed_count = count
+            job.save(update_fields=["processed_count", "updated_at"])
+
+        # Результат собирается во временном файле и затем переносится в
+        # хранилище: в памяти не держится ни архив, ни PDF.
+        with tempfile.TemporaryFile() as file:
+            service.generate(
+                products,
+                file,
+                output=job.output,
+                image_format=job.image_format,
+                force_new=job.force_new,
+                progress=progress,
+            )
+            file.seek(0)
+            job.result.save(f"{job.pk}_{OUTPUT_FILES[job.output][0]}", File(file), save=False)
+
+    def delete_expired(self):
+        cutoff = timezone.now() - timedelta(hours=settings.QR_BULK_RESULT_TTL_HOURS)
+        expired = ProductQRBulkJob.objects.filter(
+            Q(finished_at__lt=cutoff) | Q(finished_at__isnull=True, updated_at__lt=cutoff),
+            member_id=self.member_id,
+        )
+        for job in expired:
+            if job.result:
+                job.result.delete(save=False)
+            job.delete()
+
+    def get_progress(self, job):
+        return {
+            "id": job.pk,
+            "status": job.status,
+            "total_count": job.total_count,
+            "processed_count": job.processed_count,
+            "error": job.error,
+        }
@@ -0,0 +1,61 @@
+import time
+import uuid
+from types import SimpleNamespace
+
+from django.core.management.base import BaseCommand
+
+from apps.product_qr.bulk import (
+    OUTPUT_PDF,
+    OUTPUT_ZIP,
+    ProductQRBulkService,
+    iter_pdf,
+    iter_zip,
+)
+
+
+class Command(BaseCommand):
+    help = "Замеряет скорость массовой генерации QR-кодов (этикеток в секунду) в зависимости от числа процессов"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--count", type=int, default=1000, help="Количество этикеток")
+        parser.add_argument(
+            "--workers",
+            type=str,
+            default="1,2,4",
+            help="Число процессов через запятую (например: 1,2,4,8)",
+        )
+        parser.add_argument(
+            "--output",
+            choices=[OUTPUT_ZIP, OUTPUT_PDF],
+            default=OUTPUT_PDF,
+            help="Собирать ZIP-архив или PDF-лист этикеток",
+        )
+
+    def handle(self, *args, **options):
+        count = options["count"]
+        output = options["output"]
+        # Портал и база не нужны: товары и записи QR-кодов синтетические.
+        service = ProductQRBulkService(None, member_id="benchmark")
+        products = [{"ID": str(n), "NAME": f"Товар {n}"} for n in range(1, count + 1)]
+        qr_records = [SimpleNamespace(uuid=uuid.uuid4()) for _ in products]
+
+        self.stdout.write(f"Генерация {count} этикеток, результат: {output.upper()}")
+        for workers in [int(value) for value in options["workers"].split(",")]:
+            started = time.monotonic()
+            images = service.render_images(qr_records, "png", workers=workers)
+            rendered = time.monotonic() - started
+
+            if output == OUTPUT_PDF:
+                chunks = iter_pdf(service.iter_sheets(products, images))
+            else:
+                chunks = iter_zip(
+                    (f"qr_product_{product['ID']}.png", content)
+                    for product, content in zip(products, images)
+                )
+            size = sum(len(chunk) for chunk in chunks)
+            total = time.monotonic() - started
+
+            self.stdout.write(
+                f"Процессов {workers}: отрисовка {rendered:.1f} с ({count / rendered:.0f} этикеток/с), "
+                f"всего {total:.1f} с ({count / total:.0f} этикеток/с), результат {size / 1024 / 1024:.1f} МБ"
+            )
@@ -0,0 +1,55 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from apps.product_qr.models import ProductQR
+from apps.product_qr.services import compact_product_data
+
+BATCH_SIZE = 500
+
+
+class Command(BaseCommand):
+    help = "Удаляет из старых снимков товаров в QR-кодах поля, не нужные публичной странице"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--older-than-days",
+            type=int,
+            default=settings.QR_SNAPSHOT_RETENTION_DAYS,
+            help="Сжимать снимки старше указанного числа дней",
+        )
+        parser.add_argument(
+            "--member-id",
+            type=str,
+            help="Только QR-коды указанного портала",
+        )
+
+    def handle(self, *args, **options):
+        cutoff = timezone.now() - timedelta(days=options["older_than_days"])
+        records = ProductQR.objects.filter(created_at__lt=cutoff).only("uuid", "product_data")
+        if options.get("member_id"):
+            records = records.filter(member_id=options["member_id"])
+
+        self.stdout.write(f"Сжатие снимков товаров, созданных до {cutoff:%d.%m.%Y}...")
+
+        checked = 0
+        changed = []
+        compacted = 0
+        for qr_record in records.iterator(chunk_size=BATCH_SIZE):
+            checked += 1
+            product_data = compact_product_data(qr_record.product_data or {})
+            if product_data != qr_record.product_data:
+                qr_record.product_data = product_data
+                changed.append(qr_record)
+            if len(changed) >= BATCH_SIZE:
+                ProductQR.objects.bulk_update(changed, ["product_data"])
+                compacted += len(changed)
+                changed = []
+        ProductQR.objects.bulk_update(changed, ["product_data"])
+        compacted += len(changed)
+
+        self.stdout.write(
+            self.style.SUCCESS(f"Готово! Проверено: {checked}, сжато снимков: {compacted}")
+        )
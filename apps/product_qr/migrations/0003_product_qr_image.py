@@ -0,0 +1,54 @@
+# Generated by Django 4.2 on 2026-10-18 12:13
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("product_qr", "0002_productqr_product_data"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="ProductQRImage",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                (
+                    "format",
+                    models.CharField(
+                        choices=[("png", "PNG"), ("svg", "SVG")], max_length=3
+                    ),
+                ),
+                ("content", models.BinaryField()),
+                ("etag", models.CharField(max_length=64)),
+                ("created_at", models.DateTimeField(auto_now_add=True)),
+                (
+                    "qr",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="images",
+                        to="product_qr.productqr",
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "Изображение QR-кода",
+                "verbose_name_plural": "Изображения QR-кодов",
+            },
+        ),
+        migrations.AddConstraint(
+            model_name="productqrimage",
+            constraint=models.UniqueConstraint(
+                fields=("qr", "format"), name="product_qr_image_unique"
+            ),
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 4.2 on 2026-10-18 12:17
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("product_qr", "0003_product_qr_image"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="productqr",
+            index=models.Index(
+                fields=["member_id", "product_id", "-created_at"],
+                name="product_qr_product_idx",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="productqr",
+            index=models.Index(fields=["-created_at"], name="product_qr_created_idx"),
+        ),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 4.2 on 2026-10-18 12:18
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("product_qr", "0004_product_qr_indexes"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="productqr",
+            name="refreshed_at",
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+    ]
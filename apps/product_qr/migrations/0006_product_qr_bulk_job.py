@@ -0,0 +1,57 @@
+# Generated by Django 4.2 on 2026-10-18 12:43
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("product_qr", "0005_productqr_refreshed_at"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="ProductQRBulkJob",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("member_id", models.CharField(max_length=50)),
+                ("product_ids", models.JSONField(default=list)),
+                ("section_id", models.CharField(blank=True, max_length=20)),
+                ("output", models.CharField(max_length=3)),
+                ("image_format", models.CharField(max_length=3)),
+                ("force_new", models.BooleanField(default=False)),
+                (
+                    "status",
+                    models.CharField(
+                        choices=[
+                            ("pending", "В очереди"),
+                            ("running", "Выполняется"),
+                            ("done", "Завершен"),
+                            ("failed", "Ошибка"),
+                        ],
+                        default="pending",
+                        max_length=10,
+                    ),
+                ),
+                ("total_count", models.PositiveIntegerField(blank=True, null=True)),
+                ("processed_count", models.PositiveIntegerField(default=0)),
+                ("result", models.FileField(blank=True, upload_to="qr_bulk/")),
+                ("error", models.TextField(blank=True)),
+                ("created_at", models.DateTimeField(auto_now_add=True)),
+                ("updated_at", models.DateTimeField(auto_now=True)),
+                ("finished_at", models.DateTimeField(blank=True, null=True)),
+            ],
+            options={
+                "verbose_name": "Массовая генерация QR-кодов",
+                "verbose_name_plural": "Массовые генерации QR-кодов",
+                "ordering": ["-created_at"],
+            },
+        ),
+    ]
@@ -8,12 +8,85 @@ class ProductQR(models.Model):
     product_id = models.CharField(max_length=50)
     member_id = models.CharField(max_length=50, blank=True, null=True)
     product_data = models.JSONField(default=dict)
+    refreshed_at = models.DateTimeField(blank=True, null=True)
     created_at = models.DateTimeField(auto_now_add=True)
 
     class Meta:
         ordering = ["-created_at"]
         verbose_name = "QR-код товара"
         verbose_name_plural = "QR-коды товаров"
+        indexes = [
+            models.Index(
+                fields=["member_id", "product_id", "-created_at"],
+                name="product_qr_product_idx",
+            ),
+            models.Index(fields=["-created_at"], name="product_qr_created_idx"),
+        ]
 
     def __str__(self):
         return f"QR for product {self.product_id}"
+
+
+class ProductQRImage(models.Model):
+    FORMAT_PNG = "png"
+    FORMAT_SVG = "svg"
+    FORMAT_CHOICES = [
+        (FORMAT_PNG, "PNG"),
+        (FORMAT_SVG, "SVG"),
+    ]
+
+    qr = models.ForeignKey(ProductQR, on_delete=models.CASCADE, related_name="images")
+    format = models.CharField(max_length=3, choices=FORMAT_CHOICES)
+    content = models.BinaryField()
+    etag = models.CharField(max_length=64)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        verbose_name = "Изображение QR-кода"
+        verbose_name_plural = "Изображения QR-кодов"
+        constraints = [
+            models.UniqueConstraint(fields=["qr", "format"], name="product_qr_image_unique"),
+        ]
+
+    def __str__(self):
+        return f"{self.format.upper()} for {self.qr_id}"
+
+
+class ProductQRBulkJob(models.Model):
+    STATUS_PENDING = "pending"
+    STATUS_RUNNING = "running"
+    STATUS_DONE = "done"
+    STATUS_FAILED = "failed"
+    STATUS_CHOICES = [
+        (STATUS_PENDING, "В очереди"),
+        (STATUS_RUNNING, "Выполняется"),
+        (STATUS_DONE, "Завершен"),
+        (STATUS_FAILED, "Ошибка"),
+    ]
+
+    member_id = models.CharField(max_length=50)
+    product_ids = models.JSONField(default=list)
+    section_id = models.CharField(max_length=20, blank=True)
+    output = models.CharField(max_length=3)
+    image_format = models.CharField(max_length=3)
+    force_new = models.BooleanField(default=False)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=STATUS_PENDING)
+    total_count = models.PositiveIntegerField(null=True, blank=True)
+    processed_count = models.PositiveIntegerField(default=0)
+    result = models.FileField(upload_to="qr_bulk/", blank=True)
+    error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        ordering = ["-created_at"]
+        verbose_name = "Массовая генерация QR-кодов"
+        verbose_name_plural = "Массовые генерации QR-кодов"
+
+    def __str__(self):
+        return f"Bulk QR {self.pk} ({self.status})"
+
+    @property
+    def is_finished(self):
+        return self.status in (self.STATUS_DONE, self.STATUS_FAILED)
@@ -0,0 +1,156 @@
+import logging
+import os
+import time
+from urllib.parse import parse_qsl, urlencode, urlsplit
+
+import requests
+from django.conf import settings
+from django.core.cache import caches
+from django.template.loader import render_to_string
+from django.utils import timezone
+
+from apps.core.background import run_in_background
+from .images import get_image_version
+from .models import ProductQR
+from .services import compact_product_data
+
+logger = logging.getLogger(__name__)
+
+PAGE_CACHE_PREFIX = "product_qr:page:"
+
+
+def extract_product_image_url(product):
+    # crm.product.get отдает картинки объектом {id, showUrl, downloadUrl}
+    # (в старых версиях — строкой), свойства-файлы — списком таких объектов.
+    for key in ("PREVIEW_PICTURE", "DETAIL_PICTURE"):
+        url = resolve_portal_file_url(product.get(key))
+        if url:
+            return url
+
+    for key, value in product.items():
+        if key.startswith("PROPERTY_") and isinstance(value, list) and len(value) > 0:
+            if isinstance(value[0], dict) and "value" in value[0]:
+                url = resolve_portal_file_url(value[0]["value"])
+                if url:
+                    return url
+
+    return None
+
+
+def resolve_portal_file_url(file_data):
+    if isinstance(file_data, dict):
+        file_data = file_data.get("downloadUrl") or file_data.get("showUrl")
+    if not isinstance(file_data, str) or not file_data:
+        return None
+
+    parsed = urlsplit(file_data)
+    if parsed.scheme:
+        return file_data
+
+    # Относительные REST-ссылки содержат auth токена пользователя, который
+    # сгенерировал QR-код, и через час перестают работать. Такие ссылки
+    # скачиваются через webhook приложения, а auth из них убирается, чтобы
+    # адрес (и версия миниатюр) не менялся при обновлении снимка.
+    query = urlencode([(k, v) for k, v in parse_qsl(parsed.query) if k != "auth"])
+    webhook_url = os.getenv("BITRIX_WEBHOOK_URL")
+    if webhook_url and parsed.path.startswith("/rest/") and not parsed.path.startswith(
+        urlsplit(webhook_url).path
+    ):
+        method = parsed.path.removeprefix("/rest/")
+        return f"{webhook_url.rstrip('/')}/{method}" + (f"?{query}" if query else "")
+
+    domain = settings.APP_SETTINGS.portal_domain
+    return f"https://{domain}{parsed.path}" + (f"?{query}" if query else "")
+
+
+def call_bitrix_webhook(method, params=None):
+    webhook_url = os.getenv("BITRIX_WEBHOOK_URL")
+    if not webhook_url:
+        raise ValueError("BITRIX_WEBHOOK_URL not configured")
+
+    url = f"{webhook_url}{method}"
+    response = requests.post(url, json=params or {}, timeout=10)
+    response.raise_for_status()
+
+    data = response.json()
+    if "error" in data:
+        raise ValueError(data.get("error_description", "Bitrix API error"))
+
+    return data
+
+
+def get_page_cache():
+    return caches[settings.QR_PAGE_CACHE_ALIAS]
+
+
+def get_product_page(qr_uuid):
+    # Публичная страница отдается из кеша. Устаревшая (старше QR_PAGE_CACHE_TTL)
+    # страница отдается как есть, а снимок товара и страница обновляются
+    # в фоне, не более одного обновления на QR-код. Запросы сканирований
+    # до портала не доходят.
+    entry = get_page_cache().get(f"{PAGE_CACHE_PREFIX}{qr_uuid}")
+    if entry is not None:
+        html, rendered_at = entry
+        if time.time() - rendered_at > settings.QR_PAGE_CACHE_TTL:
+            refresh_product_page_in_background(qr_uuid)
+        return html
+
+    qr_record = ProductQR.objects.filter(uuid=qr_uuid).first()
+    if qr_record is None:
+        return None
+    html = cache_product_page(qr_record)
+    if is_snapshot_stale(qr_record):
+        refresh_product_page_in_background(qr_uuid)
+    return html
+
+
+def is_snapshot_stale(qr_record):
+    if not qr_record.product_data or qr_record.refreshed_at is None:
+        return True
+    age = (timezone.now() - qr_record.refreshed_at).total_seconds()
+    return age > settings.QR_SNAPSHOT_MAX_AGE
+
+
+def cache_product_page(qr_record):
+    product = qr_record.product_data or {}
+    image_url = extract_product_image_url(product)
+    html = render_to_string(
+        "product_qr/view.html",
+        {
+            "product": product,
+            "image_version": get_image_version(image_url) if image_url else None,
+            "qr_uuid": str(qr_record.uuid),
+        },
+    )
+    get_page_cache().set(
+        f"{PAGE_CACHE_PREFIX}{qr_record.uuid}",
+        (html, time.time()),
+        settings.QR_PAGE_CACHE_TTL + settings.QR_PAGE_STALE_TTL,
+    )
+    return html
+
+
+def refresh_product_page_in_background(qr_uuid):
+    return run_in_background(f"qr-page:{qr_uuid}", refresh_product_page, qr_uuid)
+
+
+def refresh_product_page(qr_uuid):
+    qr_record = ProductQR.objects.filter(uuid=qr_uuid).first()
+    if qr_record is None:
+        get_page_cache().delete(f"{PAGE_CACHE_PREFIX}{qr_uuid}")
+        return
+
+    if is_snapshot_stale(qr_record):
+        try:
+            product_response = call_bitrix_webhook("crm.product.get", {"id": qr_record.product_id})
+        except Exception as e:
+            # Страница перекешируется со старым снимком: следующая попытка
+            # будет не раньше чем через QR_PAGE_CACHE_TTL.
+            logger.error(f"Не удалось обновить товар {qr_record.product_id} для QR {qr_uuid}: {e}")
+        else:
+            if "result" in product_response:
+                qr_record.product_data = compact_product_data(product_response["result"])
+            qr_record.refreshed_at = timezone.now()
+            qr_record.save(update_fields=["product_data", "refreshed_at"])
+
+    cache_product_page(qr_record)
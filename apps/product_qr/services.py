@@ -1,22 +1,113 @@
-import base64
+import hashlib
 from io import BytesIO
 
 import qrcode
+import qrcode.image.svg
 from django.conf import settings
+from django.utils import timezone
 
-from .models import ProductQR
+from apps.core.bitrix import get_member_id
+from .models import ProductQR, ProductQRImage
 
 QR_VERSION = 1
 QR_BOX_SIZE = 10
 QR_BORDER = 4
 QR_IMAGE_FORMAT = "PNG"
 
+# Поля снимка товара, которые нужны публичной странице; остальное
+# удаляется из старых снимков командой compact_qr_snapshots.
+SNAPSHOT_FIELDS = {
+    "ID",
+    "NAME",
+    "PRICE",
+    "CURRENCY_ID",
+    "DESCRIPTION",
+    "PREVIEW_PICTURE",
+    "DETAIL_PICTURE",
+}
+
+QR_CONTENT_TYPES = {
+    ProductQRImage.FORMAT_PNG: "image/png",
+    ProductQRImage.FORMAT_SVG: "image/svg+xml",
+}
+
+
+def get_public_url(qr_uuid):
+    return f"https://{settings.APP_SETTINGS.app_domain}/qr/view/{qr_uuid}/"
+
+
+def render_qr_image(data, image_format=ProductQRImage.FORMAT_PNG):
+    qr = qrcode.QRCode(
+        version=QR_VERSION,
+        error_correction=qrcode.constants.ERROR_CORRECT_L,
+        box_size=QR_BOX_SIZE,
+        border=QR_BORDER,
+    )
+    qr.add_data(data)
+    qr.make(fit=True)
+
+    buffer = BytesIO()
+    if image_format == ProductQRImage.FORMAT_SVG:
+        img = qr.make_image(image_factory=qrcode.image.svg.SvgPathImage)
+        img.save(buffer)
+    else:
+        img = qr.make_image(fill_color="black", back_color="white")
+        img.save(buffer, format=QR_IMAGE_FORMAT)
+    return buffer.getvalue()
+
+
+def compact_product_data(product):
+    compacted = {}
+    for key, value in product.items():
+        if key in SNAPSHOT_FIELDS:
+            compacted[key] = value
+        elif key.startswith("PROPERTY_") and is_file_property(value):
+            compacted[key] = value
+    return compacted
+
+
+def is_file_property(value):
+    return (
+        isinstance(value, list)
+        and len(value) > 0
+        and isinstance(value[0], dict)
+        and isinstance(value[0].get("value"), dict)
+        and "downloadUrl" in value[0]["value"]
+    )
+
+
+def find_product_qr(member_id, product_ids):
+    # Последний QR-код каждого товара портала (индекс product_qr_product_idx).
+    latest = {}
+    for qr_record in ProductQR.objects.filter(
+        member_id=member_id, product_id__in=product_ids
+    ).order_by("product_id", "-created_at"):
+        latest.setdefault(qr_record.product_id, qr_record)
+    return latest
+
+
+def get_qr_image(qr_record, image_format):
+    # Изображение рендерится при первом запросе и хранится в БД: содержимое
+    # QR-кода (публичная ссылка) для UUID не меняется.
+    image = ProductQRImage.objects.filter(qr=qr_record, format=image_format).first()
+    if image is None:
+        content = render_qr_image(get_public_url(qr_record.uuid), image_format)
+        image, _ = ProductQRImage.objects.get_or_create(
+            qr=qr_record,
+            format=image_format,
+            defaults={
+                "content": content,
+                "etag": hashlib.sha256(content).hexdigest()[:32],
+            },
+        )
+    return image
+
 
 class ProductQRService:
     def __init__(self, bitrix_user_token):
         self.but = bitrix_user_token
 
-    def generate_qr_code(self, product_id):
+    def generate_qr_code(self, product_id, force_new=False):
         if not product_id.isdigit():
             raise ValueError("ID товара должен быть числом")
 
@@ -30,31 +121,32 @@ class ProductQRService:
 
         product = product_response["result"]
 
-        member_id = getattr(self.but, "member_id", None)
-        qr_record = ProductQR.objects.create(
-            product_id=product_id, member_id=member_id, product_data=product
-        )
-
-        public_url = f"https://{settings.APP_SETTINGS.app_domain}/qr/view/{qr_record.uuid}/"
-
-        qr = qrcode.QRCode(
-            version=QR_VERSION,
-            error_correction=qrcode.constants.ERROR_CORRECT_L,
-            box_size=QR_BOX_SIZE,
-            border=QR_BORDER,
-        )
-        qr.add_data(public_url)
-        qr.make(fit=True)
-
-        img = qr.make_image(fill_color="black", back_color="white")
-
-        buffer = BytesIO()
-        img.save(buffer, format=QR_IMAGE_FORMAT)
-        img_str = base64.b64encode(buffer.getvalue()).decode()
+        # Для товара, у которого уже есть QR-код, возвращается существующий
+        # код (напечатанные этикетки остаются рабочими); снимок переписывается,
+        # только если товар изменился. Новый код создается только по force_new.
+        member_id = get_member_id(self.but)
+        qr_record = None
+        if not force_new:
+            qr_record = find_product_qr(member_id, [product_id]).get(product_id)
+
+        created = qr_record is None
+        if created:
+            qr_record = ProductQR.objects.create(
+                product_id=product_id,
+                member_id=member_id,
+                product_data=product,
+                refreshed_at=timezone.now(),
+            )
+        elif qr_record.product_data != product:
+            qr_record.product_data = product
+            qr_record.refreshed_at = timezone.now()
+            qr_record.save(update_fields=["product_data", "refreshed_at"])
+        else:
+            ProductQR.objects.filter(pk=qr_record.pk).update(refreshed_at=timezone.now())
 
         return {
             "product": product,
-            "qr_image": img_str,
-            "public_url": public_url,
+            "public_url": get_public_url(qr_record.uuid),
             "uuid": str(qr_record.uuid),
+            "created": created,
         }
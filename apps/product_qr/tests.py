@@ -0,0 +1,313 @@
+import os
+import tempfile
+import threading
+import zipfile
+import zlib
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from io import BytesIO
+from types import SimpleNamespace
+from unittest import mock
+
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+from PIL import Image, PdfParser
+
+from . import images
+from .bulk import (
+    SHEET_PAGE_SIZE,
+    SHEET_SIZE,
+    ProductQRBulkService,
+    iter_pdf,
+    iter_zip,
+    parse_product_ids,
+)
+from .jobs import STALE_JOB_TIMEOUT, ProductQRBulkJobService
+from .models import ProductQR, ProductQRBulkJob
+from .public import extract_product_image_url
+
+PORTAL_SETTINGS = SimpleNamespace(portal_domain="test.bitrix24.ru", app_domain="app.example.com")
+WEBHOOK_URL = "https://test.bitrix24.ru/rest/1/secret/"
+
+
+class ParseProductIdsTests(SimpleTestCase):
+    def test_splits_and_deduplicates(self):
+        self.assertEqual(parse_product_ids("1, 2;3\n2  4"), ["1", "2", "3", "4"])
+
+    def test_empty(self):
+        self.assertEqual(parse_product_ids(""), [])
+        self.assertEqual(parse_product_ids(None), [])
+
+    def test_rejects_non_numeric(self):
+        with self.assertRaisesMessage(ValueError, "abc"):
+            parse_product_ids("1, abc")
+
+
+class BulkOutputTests(SimpleTestCase):
+    def test_zip_stream(self):
+        files = [(f"qr_product_{n}.png", bytes([n]) * 100) for n in range(3)]
+        chunks = list(iter_zip(iter(files)))
+
+        self.assertGreater(len(chunks), 3)
+        archive = zipfile.ZipFile(BytesIO(b"".join(chunks)))
+        self.assertEqual(archive.namelist(), [name for name, _ in files])
+        self.assertEqual(archive.read("qr_product_2.png"), bytes([2]) * 100)
+
+    def test_pdf_stream(self):
+        sheets = []
+        for n in range(3):
+            sheet = Image.new("1", SHEET_SIZE, 1)
+            sheet.paste(0, (n * 100, 0, n * 100 + 50, 50))
+            sheets.append(sheet)
+
+        pdf = PdfParser.PdfParser(buf=b"".join(iter_pdf(iter(sheets))))
+
+        self.assertEqual(len(pdf.pages), 3)
+        page = pdf.read_indirect(pdf.pages[2])
+        self.assertEqual([float(size) for size in page[b"MediaBox"][2:]], list(SHEET_PAGE_SIZE))
+        image = pdf.read_indirect(page[b"Resources"][b"XObject"][b"Im0"])
+        decoded = Image.frombytes("1", SHEET_SIZE, zlib.decompress(image.buf))
+        self.assertEqual(decoded.tobytes(), sheets[2].tobytes())
+
+
+@override_settings(APP_SETTINGS=PORTAL_SETTINGS, QR_BULK_WORKERS=1)
+class ProductQRBulkJobTests(TestCase):
+    def setUp(self):
+        media = tempfile.TemporaryDirectory()
+        self.addCleanup(media.cleanup)
+        settings_override = override_settings(MEDIA_ROOT=media.name)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        self.service = ProductQRBulkJobService(None, member_id="test-bulk-job")
+
+    def run_job(self, products, output="zip"):
+        job = self.service.create_job([p["ID"] for p in products], "", output, "png", False)
+        with mock.patch.object(ProductQRBulkService, "get_products", return_value=products):
+            self.service.process(job.pk)
+        job.refresh_from_db()
+        return job
+
+    def test_result_is_saved_for_download(self):
+        products = [{"ID": str(n), "NAME": f"Товар {n}"} for n in range(1, 4)]
+        job = self.run_job(products)
+
+        self.assertEqual(job.status, ProductQRBulkJob.STATUS_DONE)
+        self.assertEqual((job.total_count, job.processed_count), (3, 3))
+        with job.result.open("rb") as file:
+            names = zipfile.ZipFile(file).namelist()
+        self.assertEqual(names, ["qr_product_1.png", "qr_product_2.png", "qr_product_3.png"])
+        self.assertEqual(ProductQR.objects.filter(member_id="test-bulk-job").count(), 3)
+
+    def test_job_runs_once(self):
+        job = self.run_job([{"ID": "1"}])
+        with mock.patch.object(ProductQRBulkService, "get_products") as get_products:
+            self.assertIsNone(self.service.process(job.pk))
+        get_products.assert_not_called()
+
+    def test_error_is_reported(self):
+        job = self.service.create_job(["1"], "", "pdf", "png", False)
+        with self.assertLogs("apps.product_qr.jobs", "ERROR"):
+            with mock.patch.object(
+                ProductQRBulkService, "get_products", side_effect=ValueError("Товары не найдены: 1")
+            ):
+                self.service.process(job.pk)
+
+        progress = self.service.get_progress(self.service.get_job(job.pk))
+        self.assertEqual(progress["status"], ProductQRBulkJob.STATUS_FAILED)
+        self.assertEqual(progress["error"], "Товары не найдены: 1")
+
+    def test_interrupted_job_is_failed(self):
+        job = self.service.create_job(["1"], "", "zip", "png", False)
+        ProductQRBulkJob.objects.filter(pk=job.pk).update(
+            status=ProductQRBulkJob.STATUS_RUNNING,
+            updated_at=timezone.now() - STALE_JOB_TIMEOUT - STALE_JOB_TIMEOUT,
+        )
+        self.assertEqual(self.service.get_job(job.pk).status, ProductQRBulkJob.STATUS_FAILED)
+
+
+@override_settings(APP_SETTINGS=PORTAL_SETTINGS)
+@mock.patch.dict(os.environ, {"BITRIX_WEBHOOK_URL": WEBHOOK_URL})
+class ExtractProductImageUrlTests(SimpleTestCase):
+    def test_picture_object_uses_download_url_through_webhook(self):
+        product = {
+            "PREVIEW_PICTURE": {
+                "id": 12,
+                "showUrl": "/bitrix/components/bitrix/crm.product.file/download.php?fileId=12",
+                "downloadUrl": "/rest/catalog.product.download?fields[fileId]=12&auth=expired",
+            }
+        }
+        self.assertEqual(
+            extract_product_image_url(product),
+            f"{WEBHOOK_URL}catalog.product.download?fields%5BfileId%5D=12",
+        )
+
+    def test_show_url_is_resolved_on_portal(self):
+        product = {"DETAIL_PICTURE": {"showUrl": "/upload/iblock/1/photo.jpg"}}
+        self.assertEqual(
+            extract_product_image_url(product), "https://test.bitrix24.ru/upload/iblock/1/photo.jpg"
+        )
+
+    def test_absolute_string_is_kept(self):
+        product = {"PREVIEW_PICTURE": "https://cdn.example.com/photo.jpg"}
+        self.assertEqual(extract_product_image_url(product), "https://cdn.example.com/photo.jpg")
+
+    def test_file_property(self):
+        product = {
+            "PREVIEW_PICTURE": None,
+            "PROPERTY_44": [{"valueId": "1", "value": {"id": 5, "downloadUrl": "/upload/photo.png"}}],
+        }
+        self.assertEqual(extract_product_image_url(product), "https://test.bitrix24.ru/upload/photo.png")
+
+    def test_non_string_values_are_skipped(self):
+        product = {"PREVIEW_PICTURE": 12, "DETAIL_PICTURE": {"id": 13}, "PROPERTY_1": [{"value": 7}]}
+        self.assertIsNone(extract_product_image_url(product))
+
+
+@override_settings(APP_SETTINGS=PORTAL_SETTINGS)
+class QRImageViewTests(TestCase):
+    def test_not_modified_only_for_same_etag(self):
+        qr_record = ProductQR.objects.create(product_id="1", member_id="test-qr-image")
+        url = reverse("product_qr:qr_image_png", args=[qr_record.uuid])
+        response = self.client.get(url)
+        etag = response["ETag"]
+        self.assertEqual(response["Content-Type"], "image/png")
+
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=f'"other", {etag}').status_code, 304)
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH="*").status_code, 304)
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=f'"{etag[1:-2]}"').status_code, 200)
+
+
+class FakePortalHandler(BaseHTTPRequestHandler):
+    # Файловый сервер портала: /rest/<user>/<key>/<method> отдает оригинал
+    # картинки, код ответа и размер задаются тестом через server.
+    def do_GET(self):
+        self.server.requests.append(self.path)
+        if self.server.status != 200:
+            self.send_error(self.server.status)
+            return
+        self.send_response(200)
+        self.send_header("Content-Type", "image/png")
+        self.end_headers()
+        self.wfile.write(self.server.content)
+
+    def log_message(self, format, *args):
+        pass
+
+
+@override_settings(APP_SETTINGS=PORTAL_SETTINGS)
+class ProductImageViewTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.server = ThreadingHTTPServer(("127.0.0.1", 0), FakePortalHandler)
+        cls.server.requests = []
+        cls.server_thread = threading.Thread(target=cls.server.serve_forever, daemon=True)
+        cls.server_thread.start()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.shutdown()
+        cls.server.server_close()
+        super().tearDownClass()
+
+    def setUp(self):
+        self.server.requests.clear()
+        self.server.status = 200
+        content = BytesIO()
+        Image.new("RGB", (2000, 1000), "red").save(content, format="PNG")
+        self.server.content = content.getvalue()
+
+        self.webhook_url = f"http://127.0.0.1:{self.server.server_port}/rest/1/SECRETKEY123/"
+        env = mock.patch.dict(os.environ, {"BITRIX_WEBHOOK_URL": self.webhook_url})
+        env.start()
+        self.addCleanup(env.stop)
+
+        self.cache_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.cache_dir.cleanup)
+        settings_override = override_settings(
+            QR_IMAGE_CACHE_DIR=self.cache_dir.name,
+            QR_IMAGE_CACHE_MAX_BYTES=10 * 1024 * 1024,
+            QR_IMAGE_MAX_SOURCE_BYTES=1024 * 1024,
+        )
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+        self.qr_record = self.create_qr("1")
+
+    def create_qr(self, file_id):
+        return ProductQR.objects.create(
+            product_id=file_id,
+            member_id="test-images",
+            product_data={
+                "ID": file_id,
+                "PREVIEW_PICTURE": {
+                    "id": file_id,
+                    "downloadUrl": f"/rest/crm.product.file?fileId={file_id}&auth=expired",
+                },
+            },
+        )
+
+    def get(self, size, image_format, qr_record=None, **headers):
+        url = reverse("product_qr:product_image", args=[(qr_record or self.qr_record).uuid, size, image_format])
+        return self.client.get(url, **headers)
+
+    def assert_no_secret(self, response, logs=()):
+        self.assertNotIn("Location", response)
+        self.assertNotIn(b"SECRETKEY123", response.content)
+        self.assertFalse([line for line in logs if "SECRETKEY123" in line])
+
+    def test_downloads_original_once_through_webhook(self):
+        response = self.get("m", "webp")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response["Content-Type"], "image/webp")
+        self.assertEqual(Image.open(BytesIO(b"".join(response.streaming_content))).size, (640, 320))
+
+        self.assertEqual(self.get("s", "jpg").status_code, 200)
+        self.assertEqual(self.server.requests, ["/rest/1/SECRETKEY123/crm.product.file?fileId=1"])
+
+    def test_etag_depends_on_size_and_format(self):
+        webp = self.get("s", "webp")["ETag"]
+        jpg = self.get("s", "jpg")["ETag"]
+        self.assertNotEqual(webp, jpg)
+
+        response = self.get("s", "webp", HTTP_IF_NONE_MATCH=webp)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(self.get("s", "webp", HTTP_IF_NONE_MATCH=jpg).status_code, 200)
+        self.assertEqual(self.get("s", "webp", HTTP_IF_NONE_MATCH=f"{jpg}, W/{webp}").status_code, 304)
+        self.assertEqual(self.get("s", "webp", HTTP_IF_NONE_MATCH=webp.replace("-s-", "-xs-")).status_code, 200)
+
+    def test_portal_error_does_not_expose_webhook(self):
+        self.server.status = 500
+        with self.assertLogs("apps.product_qr", "ERROR") as logs:
+            response = self.get("m", "webp")
+        self.assertEqual(response.status_code, 502)
+        self.assert_no_secret(response, logs.output)
+        self.assertEqual(images._locks, {})
+
+    def test_source_larger_than_limit_is_rejected(self):
+        self.server.content = b"x" * (1024 * 1024 + 1)
+        with self.assertLogs("apps.product_qr", "ERROR") as logs:
+            response = self.get("m", "webp")
+        self.assertEqual(response.status_code, 502)
+        self.assert_no_secret(response, logs.output)
+        self.assertIn("больше", logs.output[0])
+
+    def test_evicted_thumbnail_is_rebuilt(self):
+        self.assertEqual(self.get("m", "webp").status_code, 200)
+        for entry in os.scandir(self.cache_dir.name):
+            os.remove(entry.path)
+
+        self.assertEqual(self.get("m", "webp").status_code, 200)
+        self.assertEqual(len(self.server.requests), 2)
+
+    def test_least_recently_used_thumbnails_are_evicted(self):
+        self.get("s", "webp")
+        old = images.get_thumbnail_path(
+            extract_product_image_url(self.qr_record.product_data), "s", "webp"
+        )
+        os.utime(old, (1, 1))
+        total = sum(entry.stat().st_size for entry in os.scandir(self.cache_dir.name))
+
+        with override_settings(QR_IMAGE_CACHE_MAX_BYTES=total):
+            self.assertEqual(self.get("s", "webp", qr_record=self.create_qr("2")).status_code, 200)
+        self.assertFalse(old.exists())
@@ -6,5 +6,15 @@ app_name = "product_qr"
 
 urlpatterns = [
     path("", views.index, name="index"),
+    path("bulk/", views.bulk, name="bulk"),
+    path("bulk/<int:job_id>/status/", views.bulk_status, name="bulk_status"),
+    path("bulk/<int:job_id>/download/", views.bulk_download, name="bulk_download"),
     path("view/<uuid:uuid>/", views.view_product, name="view_product"),
+    path("<uuid:uuid>.png", views.qr_image, {"image_format": "png"}, name="qr_image_png"),
+    path("<uuid:uuid>.svg", views.qr_image, {"image_format": "svg"}, name="qr_image_svg"),
+    path(
+        "view/<uuid:uuid>/image/<str:size>.<str:image_format>",
+        views.product_image,
+        name="product_image",
+    ),
 ]
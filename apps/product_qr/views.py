@@ -1,51 +1,28 @@
 import logging
-import os
 
-import requests
 from django.conf import settings
-from django.http import HttpResponse
+from django.http import (
+    FileResponse,
+    Http404,
+    HttpResponse,
+    HttpResponseNotModified,
+    JsonResponse,
+)
 from django.shortcuts import get_object_or_404, render
 
 from apps.core.decorators import smart_auth
+from apps.core.http import etag_matches
 
-from .models import ProductQR
-from .services import ProductQRService
+from .bulk import OUTPUT_FILES, OUTPUT_PDF, OUTPUT_ZIP, parse_product_ids
+from .images import THUMBNAIL_FORMATS, THUMBNAIL_SIZES, get_image_version, get_thumbnail
+from .jobs import ProductQRBulkJobService
+from .models import ProductQR, ProductQRBulkJob, ProductQRImage
+from .public import extract_product_image_url, get_product_page
+from .services import QR_CONTENT_TYPES, ProductQRService, get_qr_image
 
 logger = logging.getLogger(__name__)
 
-
-def extract_product_image_url(product):
-    if product.get("PREVIEW_PICTURE"):
-        return product.get("PREVIEW_PICTURE")
-
-    if product.get("DETAIL_PICTURE"):
-        return product.get("DETAIL_PICTURE")
-
-    for key, value in product.items():
-        if key.startswith("PROPERTY_") and isinstance(value, list) and len(value) > 0:
-            if isinstance(value[0], dict) and "value" in value[0]:
-                file_data = value[0]["value"]
-                if isinstance(file_data, dict) and "downloadUrl" in file_data:
-                    domain = settings.APP_SETTINGS.portal_domain
-                    return f"https://{domain}{file_data['downloadUrl']}"
-
-    return None
-
-
-def call_bitrix_webhook(method, params=None):
-    webhook_url = os.getenv("BITRIX_WEBHOOK_URL")
-    if not webhook_url:
-        raise ValueError("BITRIX_WEBHOOK_URL not configured")
-
-    url = f"{webhook_url}{method}"
-    response = requests.post(url, json=params or {}, timeout=10)
-    response.raise_for_status()
-
-    data = response.json()
-    if "error" in data:
-        raise ValueError(data.get("error_description", "Bitrix API error"))
-
-    return data
+QR_IMAGE_MAX_AGE = 365 * 24 * 60 * 60
 
 
 @smart_auth
@@ -56,7 +33,8 @@ def index(request):
         if product_id:
             try:
                 service = ProductQRService(request.bitrix_user_token)
-                context = service.generate_qr_code(product_id)
+                force_new = request.POST.get("force_new") == "1"
+                context = service.generate_qr_code(product_id, force_new=force_new)
                 return render(request, "product_qr/generated.html", context)
             except Exception as e:
                 logger.error("Error generating QR: %s", str(e))
@@ -66,27 +44,142 @@ def index(request):
     return render(request, "product_qr/index.html")
 
 
-def view_product(request, uuid):
-    qr_record = get_object_or_404(ProductQR, uuid=uuid)
+@smart_auth
+def bulk(request):
+    context = {}
+    service = ProductQRBulkJobService(request.bitrix_user_token)
 
-    try:
-        product = qr_record.product_data if qr_record.product_data else {}
+    if request.method == "POST":
+        output = request.POST.get("output", OUTPUT_ZIP)
+        image_format = request.POST.get("image_format", ProductQRImage.FORMAT_PNG)
+        section_id = request.POST.get("section_id", "").strip()
+        context = {
+            "product_ids": request.POST.get("product_ids", ""),
+            "section_id": section_id,
+            "output": output,
+            "image_format": image_format,
+            "force_new": request.POST.get("force_new") == "1",
+        }
 
-        if not product:
-            product_response = call_bitrix_webhook(
-                "crm.product.get", {"id": qr_record.product_id}
+        try:
+            if output not in (OUTPUT_ZIP, OUTPUT_PDF):
+                raise ValueError("Неизвестный формат результата")
+            if image_format not in (ProductQRImage.FORMAT_PNG, ProductQRImage.FORMAT_SVG):
+                raise ValueError("Неизвестный формат изображений")
+            if section_id and not section_id.isdigit():
+                raise ValueError("ID раздела должен быть числом")
+
+            product_ids = parse_product_ids(context["product_ids"])
+            if not product_ids and not section_id:
+                raise ValueError("Укажите ID товаров или раздел каталога")
+            if len(product_ids) > settings.QR_BULK_MAX_PRODUCTS:
+                raise ValueError(
+                    f"Слишком много товаров: {len(product_ids)}, максимум {settings.QR_BULK_MAX_PRODUCTS}"
+                )
+
+            # Товары загружаются и QR-коды рисуются в фоне: ответ с номером
+            # задачи уходит сразу, страница опрашивает прогресс и затем
+            # предлагает скачать результат.
+            job = service.create_job(
+                product_ids, section_id, output, image_format, context["force_new"]
             )
-            if "result" in product_response:
-                product = product_response["result"]
+            service.process_in_background(job)
+            context["job"] = job
+        except Exception as e:
+            logger.error(f"Ошибка массовой генерации QR-кодов: {e}")
+            context["error"] = str(e)
 
-        image_url = extract_product_image_url(product)
+    elif request.GET.get("job", "").isdigit():
+        context["job"] = service.get_job(request.GET["job"])
 
-        context = {
-            "product": product,
-            "image_url": image_url,
-            "qr_uuid": str(qr_record.uuid),
-        }
-        return render(request, "product_qr/view.html", context)
+    return render(request, "product_qr/bulk.html", context)
+
+
+@smart_auth
+def bulk_status(request, job_id):
+    try:
+        service = ProductQRBulkJobService(request.bitrix_user_token)
+        job = service.get_job(job_id)
+        if job is None:
+            return JsonResponse({"error": "Задача генерации не найдена"}, status=404)
+        return JsonResponse(service.get_progress(job))
+    except Exception as e:
+        logger.error(f"Ошибка получения прогресса генерации {job_id}: {e}")
+        return JsonResponse({"error": str(e)}, status=500)
+
+
+@smart_auth
+def bulk_download(request, job_id):
+    service = ProductQRBulkJobService(request.bitrix_user_token)
+    job = service.get_job(job_id)
+    if job is None or job.status != ProductQRBulkJob.STATUS_DONE or not job.result:
+        raise Http404("Результат генерации не найден")
+
+    file_name, content_type = OUTPUT_FILES[job.output]
+    return FileResponse(
+        job.result.open("rb"), as_attachment=True, filename=file_name, content_type=content_type
+    )
+
+
+def view_product(request, uuid):
+    try:
+        html = get_product_page(uuid)
     except Exception as e:
         logger.error("Error viewing product: %s", str(e))
         return HttpResponse("Ошибка получения данных товара", status=500)
+
+    if html is None:
+        raise Http404("QR-код не найден")
+    return HttpResponse(
+        html, headers={"Cache-Control": f"public, max-age={settings.QR_PAGE_CACHE_TTL}"}
+    )
+
+
+def qr_image(request, uuid, image_format):
+    # Публичная картинка QR-кода: содержимое для UUID неизменно, поэтому
+    # браузеры и прокси кешируют ее без перепроверки.
+    qr_record = get_object_or_404(ProductQR, uuid=uuid)
+    image = get_qr_image(qr_record, image_format)
+
+    headers = {
+        "ETag": f'"{image.etag}"',
+        "Cache-Control": f"public, max-age={QR_IMAGE_MAX_AGE}, immutable",
+    }
+    if etag_matches(request, headers["ETag"]):
+        return HttpResponseNotModified(headers=headers)
+    return HttpResponse(
+        bytes(image.content), content_type=QR_CONTENT_TYPES[image_format], headers=headers
+    )
+
+
+def product_image(request, uuid, size, image_format):
+    # Прокси картинки товара: миниатюры хранятся на диске приложения, портал
+    # отдает оригинал один раз. Адрес страницы содержит версию картинки (?v=),
+    # поэтому ответ кешируется браузером без перепроверки.
+    if size not in THUMBNAIL_SIZES or image_format not in THUMBNAIL_FORMATS:
+        raise Http404("Неизвестный размер или формат картинки")
+
+    qr_record = get_object_or_404(ProductQR, uuid=uuid)
+    source_url = extract_product_image_url(qr_record.product_data or {})
+    if not source_url:
+        raise Http404("У товара нет картинки")
+
+    headers = {
+        "ETag": f'"{get_image_version(source_url)}-{size}-{image_format}"',
+        "Cache-Control": f"public, max-age={QR_IMAGE_MAX_AGE}, immutable",
+    }
+    if etag_matches(request, headers["ETag"]):
+        return HttpResponseNotModified(headers=headers)
+
+    try:
+        file = get_thumbnail(source_url, size, image_format)
+    except Exception as e:
+        # Адрес оригинала клиенту не отдается: ссылка на файл через webhook
+        # содержит его ключ.
+        logger.error(f"Ошибка подготовки картинки товара {qr_record.product_id}: {e}")
+        return HttpResponse("Картинка товара недоступна", status=502)
+
+    response = FileResponse(file, content_type=THUMBNAIL_FORMATS[image_format][1])
+    for name, value in headers.items():
+        response[name] = value
+    return response
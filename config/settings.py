@@ -21,6 +21,65 @@ ALLOWED_HOSTS = os.getenv("ALLOWED_HOSTS", "localhost,127.0.0.1").split(",")
 CUSTOM_FIELD_NAME = os.getenv("CUSTOM_FIELD_NAME", "UF_CRM_1759500436")
 DEFAULT_STAGE = os.getenv("DEFAULT_STAGE", "NEW")
 DEFAULT_CURRENCY = os.getenv("DEFAULT_CURRENCY", "RUB")
+DEAL_SYNC_INTERVAL = int(os.getenv("DEAL_SYNC_INTERVAL", "60"))
+DEAL_OUTBOX_MAX_ATTEMPTS = int(os.getenv("DEAL_OUTBOX_MAX_ATTEMPTS", "5"))
+
+# Код страны для номеров без него при поиске дубликатов контактов
+PHONE_DEFAULT_COUNTRY_CODE = os.getenv("PHONE_DEFAULT_COUNTRY_CODE", "7")
+
+# Статистика звонков: интервал догрузки (сек), глубина первой загрузки и
+# срок хранения почасовых итогов (дни)
+CALL_SYNC_INTERVAL = int(os.getenv("CALL_SYNC_INTERVAL", "60"))
+CALL_STATS_BACKFILL_DAYS = int(os.getenv("CALL_STATS_BACKFILL_DAYS", "30"))
+CALL_ROLLUP_RETENTION_DAYS = int(os.getenv("CALL_ROLLUP_RETENTION_DAYS", "90"))
+
+# Структура компании в памяти процесса: срок жизни (сек) и число порталов
+ORG_MODEL_TTL = int(os.getenv("ORG_MODEL_TTL", "600"))
+ORG_MODEL_MAX_PORTALS = int(os.getenv("ORG_MODEL_MAX_PORTALS", "50"))
+
+# Справочник компаний портала: интервал догрузки изменений (сек) и общий
+# лимит записей в памяти процесса для всех порталов
+COMPANY_DIRECTORY_REFRESH_INTERVAL = int(os.getenv("COMPANY_DIRECTORY_REFRESH_INTERVAL", "300"))
+COMPANY_DIRECTORY_MAX_ENTRIES = int(os.getenv("COMPANY_DIRECTORY_MAX_ENTRIES", "500000"))
+# member_id портала для команд управления, работающих через webhook
+# (пусто — берется из записи портала с доменом webhook)
+BITRIX_MEMBER_ID = os.getenv("BITRIX_MEMBER_ID", "")
+# application_token исходящего вебхука Bitrix24 (пусто — события не принимаются)
+BITRIX_APPLICATION_TOKEN = os.getenv("BITRIX_APPLICATION_TOKEN", "")
+
+# Массовая генерация QR-кодов: лимит товаров за раз, число процессов
+# рендеринга и TTF-шрифт с кириллицей для подписей на PDF-листе
+QR_BULK_MAX_PRODUCTS = int(os.getenv("QR_BULK_MAX_PRODUCTS", "5000"))
+QR_BULK_WORKERS = int(os.getenv("QR_BULK_WORKERS", "2"))
+QR_BULK_RESULT_TTL_HOURS = int(os.getenv("QR_BULK_RESULT_TTL_HOURS", "24"))
+QR_LABEL_FONT = os.getenv("QR_LABEL_FONT", "")
+# Снимки товаров старше этого числа дней сжимает compact_qr_snapshots
+QR_SNAPSHOT_RETENTION_DAYS = int(os.getenv("QR_SNAPSHOT_RETENTION_DAYS", "30"))
+# Публичная страница товара: свежесть в кеше (сек), сколько еще отдавать
+# устаревшую страницу во время фонового обновления (сек), возраст снимка
+# товара, после которого он перечитывается из портала (сек)
+QR_PAGE_CACHE_ALIAS = os.getenv("QR_PAGE_CACHE_ALIAS", "default")
+QR_PAGE_CACHE_TTL = int(os.getenv("QR_PAGE_CACHE_TTL", "300"))
+QR_PAGE_STALE_TTL = int(os.getenv("QR_PAGE_STALE_TTL", "86400"))
+QR_SNAPSHOT_MAX_AGE = int(os.getenv("QR_SNAPSHOT_MAX_AGE", "3600"))
+
+# Кеш геокодера: срок жизни найденных и ненайденных адресов
+GEOCODE_CACHE_TTL_DAYS = int(os.getenv("GEOCODE_CACHE_TTL_DAYS", "90"))
+GEOCODE_NEGATIVE_TTL_HOURS = int(os.getenv("GEOCODE_NEGATIVE_TTL_HOURS", "24"))
+GEOCODER_RATE_LIMIT = float(os.getenv("GEOCODER_RATE_LIMIT", "20"))
+GEOCODER_CONCURRENCY = int(os.getenv("GEOCODER_CONCURRENCY", "8"))
+# Как часто (в секундах) пересобирать набор точек карты компаний
+MAP_DATASET_MAX_AGE = int(os.getenv("MAP_DATASET_MAX_AGE", "3600"))
+
+# Ограничения REST API Bitrix24: запросов в секунду и параллельных batch-запросов
+BITRIX_RATE_LIMIT = float(os.getenv("BITRIX_RATE_LIMIT", "2"))
+BITRIX_BATCH_CONCURRENCY = int(os.getenv("BITRIX_BATCH_CONCURRENCY", "2"))
+
+# Кеш метаданных портала: memory | django | database
+METADATA_CACHE_BACKEND = os.getenv("METADATA_CACHE_BACKEND", "memory")
+METADATA_CACHE_TTL = int(os.getenv("METADATA_CACHE_TTL", "3600"))
+METADATA_CACHE_MAX_ENTRIES = int(os.getenv("METADATA_CACHE_MAX_ENTRIES", "500"))
+METADATA_CACHE_ALIAS = os.getenv("METADATA_CACHE_ALIAS", "default")
 
 CSRF_TRUSTED_ORIGINS = []
 if os.getenv("DOMAIN"):
@@ -36,6 +95,7 @@ INSTALLED_APPS = [
     "django.contrib.messages",
     "django.contrib.staticfiles",
     "integration_utils.bitrix24",
+    "apps.core",
     "apps.home",
     "apps.deals",
     "apps.product_qr",
@@ -112,6 +172,15 @@ USE_TZ = True
 STATIC_URL = "static/"
 STATICFILES_DIRS = [BASE_DIR / "static"]
 
+# Загруженные файлы импорта хранятся до окончания обработки
+MEDIA_ROOT = os.getenv("MEDIA_ROOT", BASE_DIR / "media")
+
+# Миниатюры картинок товаров для публичной страницы: каталог, общий лимит
+# размера кеша и максимальный размер скачиваемого оригинала (байты)
+QR_IMAGE_CACHE_DIR = os.getenv("QR_IMAGE_CACHE_DIR", Path(MEDIA_ROOT) / "product_images")
+QR_IMAGE_CACHE_MAX_BYTES = int(os.getenv("QR_IMAGE_CACHE_MAX_BYTES", str(512 * 1024 * 1024)))
+QR_IMAGE_MAX_SOURCE_BYTES = int(os.getenv("QR_IMAGE_MAX_SOURCE_BYTES", str(20 * 1024 * 1024)))
+
 DEFAULT_AUTO_FIELD = "django.db.models.BigAutoField"
 
 X_FRAME_OPTIONS = "ALLOWALL"
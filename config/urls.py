@@ -9,4 +9,5 @@ urlpatterns = [
     path("employees/", include("apps.employees.urls")),
     path("map/", include("apps.companies_map.urls")),
     path("contacts/", include("apps.contact_manager.urls")),
+    path("events/", include("apps.core.urls")),
 ]